@@ -0,0 +1,132 @@
+"""
+Deferred access statistics.
+Searches record which memories they returned in an in-process buffer instead
+of issuing an UPDATE per read. A background thread folds the buffer into
+``semantic_memories`` in one transaction every ``flush_interval_sec`` seconds
+or as soon as ``max_pending`` memories are waiting, so a crash loses at most
+that much access bookkeeping and reads never take the write lock.
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class AccessStatsBuffer:
+    """Coalesces ``access_count`` / ``last_accessed_at`` updates per memory id."""
+
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        flush_interval_sec: float = 5.0,
+        max_pending: int = 1000,
+    ):
+        self._connect = connect
+        self.flush_interval_sec = max(0.05, float(flush_interval_sec))
+        self.max_pending = max(1, int(max_pending))
+        # memory_id -> (hits not yet written, latest access time)
+        self._pending: Dict[str, Tuple[int, str]] = {}
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._stop = Event()
+        self._wake = Event()
+        self._worker: Optional[Thread] = None
+        self.stats = {"recorded": 0, "flushes": 0, "flushed_rows": 0, "failed_flushes": 0, "last_flush_ms": 0.0}
+
+    def record(self, memory_ids: Iterable[str], accessed_at: Optional[str] = None) -> None:
+        accessed_at = accessed_at or datetime.now().isoformat()
+        with self._lock:
+            for memory_id in memory_ids:
+                count, _ = self._pending.get(memory_id, (0, accessed_at))
+                self._pending[memory_id] = (count + 1, accessed_at)
+                self.stats["recorded"] += 1
+            full = len(self._pending) >= self.max_pending
+        self.start()
+        if full:
+            self._wake.set()
+
+    def pending(self, memory_ids: Iterable[str]) -> Dict[str, int]:
+        """Hits recorded for ``memory_ids`` that are not in the database yet."""
+        with self._lock:
+            return {memory_id: self._pending[memory_id][0] for memory_id in memory_ids if memory_id in self._pending}
+
+    def flush(self) -> int:
+        """Write everything buffered in one transaction. Returns rows updated."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            started = time.perf_counter()
+            conn = None
+            try:
+                conn = self._connect()
+                conn.executemany(
+                    """
+                    UPDATE semantic_memories
+                    SET access_count = access_count + ?,
+                        last_accessed_at = ?
+                    WHERE id = ?
+                    """,
+                    [(count, accessed_at, memory_id) for memory_id, (count, accessed_at) in batch.items()],
+                )
+                conn.commit()
+            except Exception:
+                # 写失败时把计数并回缓冲区，下一轮重试
+                with self._lock:
+                    for memory_id, (count, accessed_at) in batch.items():
+                        newer_count, newer_at = self._pending.get(memory_id, (0, accessed_at))
+                        self._pending[memory_id] = (count + newer_count, max(accessed_at, newer_at))
+                    self.stats["failed_flushes"] += 1
+                raise
+            finally:
+                if conn is not None:
+                    conn.close()
+            with self._lock:
+                self.stats["flushes"] += 1
+                self.stats["flushed_rows"] += len(batch)
+                self.stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            return len(batch)
+
+    def start(self) -> None:
+        """Start the background flush thread (idempotent)."""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._stop.is_set() or (self._worker is not None and self._worker.is_alive()):
+                return
+            self._worker = Thread(target=self._run, name="memory-access-stats", daemon=True)
+            self._worker.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(timeout=self.flush_interval_sec)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Access stats flush failed, will retry: {e}")
+
+    def close(self) -> None:
+        """Stop the thread and write what is left."""
+        self._stop.set()
+        self._wake.set()
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+            self._worker = None
+        self.flush()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["pending"] = len(self._pending)
+        stats["flush_interval_sec"] = self.flush_interval_sec
+        stats["max_pending"] = self.max_pending
+        return stats
@@ -243,22 +243,31 @@ class ClaudeAgent:
             "delta_ms": delta_ms,
         })
 
-    async def _get_system_prompt(self, user_id: str, memory_context: str = "", skill_context: str = "", search_context: str = "") -> str:
-        """构建系统提示词"""
-
-        # 从重要记忆中直接提取 AI 助手名字和用户名字（使用 list_memories 按类型查找，更快更可靠）
-        import re
-        assistant_name = "CKS Lite 的智能助手"
-        user_name = None
+    # 上下文优先注入的重要记忆类型，以及用来识别助手/用户名字的类型
+    PRIORITY_MEMORY_TYPES = ["user_config", "user_info", "personal", "user_preference", "important_info"]
+    IDENTITY_MEMORY_TYPES = ["user_config", "personal", "user_preference", "important_info"]
+    IDENTITY_PER_TYPE = 10
 
+    async def _load_priority_memories(self, user_id: str) -> Dict:
+        """
+        本轮共享的重要记忆：一次窗口查询取回各类型最新记忆，并提取助手/用户名字。
+        _build_memory_context 和 _get_system_prompt 都用这份结果，不再各自逐类型查询。
+        """
+        per_type_limit = max(1, int(os.getenv("MEMORY_IMPORTANT_PER_TYPE", "2")))
         try:
-            # 加载所有重要记忆类型（非对话记忆）
-            key_memories = []
-            for mtype in ["user_config", "personal", "user_preference", "important_info"]:
-                mems = await self.memory_manager.list_memories(user_id=user_id, memory_type=mtype, limit=10)
-                key_memories.extend(mems)
+            by_type = await self.memory_manager.list_memories_by_types(
+                user_id=user_id,
+                memory_types=list(dict.fromkeys(self.PRIORITY_MEMORY_TYPES + self.IDENTITY_MEMORY_TYPES)),
+                per_type_limit=max(per_type_limit, self.IDENTITY_PER_TYPE),
+            )
+        except Exception as e:
+            logger.warning(f"加载重要记忆失败: {e}")
+            by_type = {}
 
-            for mem in key_memories:
+        assistant_name = "CKS Lite 的智能助手"
+        user_name = None
+        for mtype in self.IDENTITY_MEMORY_TYPES:
+            for mem in by_type.get(mtype, [])[:self.IDENTITY_PER_TYPE]:
                 content = mem.get("content", "")
 
                 # 提取助手名字
@@ -266,7 +275,6 @@ class ClaudeAgent:
                     match = re.search(r"AI助手的名字是\s*(\w+)", content)
                     if match:
                         assistant_name = match.group(1)
-                        logger.info(f"✅ 助手名字: {assistant_name}")
 
                 # 提取用户名字
                 if not user_name:
@@ -274,11 +282,35 @@ class ClaudeAgent:
                         match = re.search(pattern, content)
                         if match:
                             user_name = match.group(1)
-                            logger.info(f"✅ 用户名字: {user_name}")
                             break
 
-        except Exception as e:
-            logger.warning(f"读取用户/助手名字失败: {e}")
+        important = []
+        seen_ids = set()
+        for mtype in self.PRIORITY_MEMORY_TYPES:
+            for mem in by_type.get(mtype, [])[:per_type_limit]:
+                if mem["id"] in seen_ids:
+                    continue
+                seen_ids.add(mem["id"])
+                important.append(mem)
+
+        return {"important": important, "assistant_name": assistant_name, "user_name": user_name}
+
+    async def _get_system_prompt(
+        self,
+        user_id: str,
+        memory_context: str = "",
+        skill_context: str = "",
+        search_context: str = "",
+        priority: Optional[Dict] = None,
+    ) -> str:
+        """构建系统提示词"""
+
+        # 助手名字和用户名字来自本轮已加载的重要记忆
+        if priority is None:
+            priority = await self._load_priority_memories(user_id)
+        assistant_name = priority["assistant_name"]
+        user_name = priority["user_name"]
+        logger.info(f"✅ 助手名字: {assistant_name}, 用户名字: {user_name or '-'}")
 
         # 构建可用 Skills 列表
         skills_list = []
@@ -707,23 +739,20 @@ JSON 格式：
         Best-effort pre-compaction memory flush.
         Mirrors OpenClaw's "flush before compaction" idea in a lightweight form.
         """
-        saved_count = 0
         # Always save a compact marker so we can resume continuity after trimming history.
         marker_content = (
             f"会话接近压缩阈值，执行记忆刷新。"
             f" session={session_id}, estimated_chars={estimated_chars}, user_message={user_message[:200]}"
         )
-        await self.memory_manager.save_memory(
-            user_id=user_id,
-            content=marker_content,
-            memory_type="important_info",
-            metadata={
+        items: List[Dict] = [{
+            "content": marker_content,
+            "memory_type": "important_info",
+            "metadata": {
                 "source": "pre_compaction_flush",
                 "session_id": session_id,
                 "estimated_chars": estimated_chars,
             },
-        )
-        saved_count += 1
+        }]
 
         # Try structured extraction from recent turns.
         if self.memory_extractor.should_extract(user_message):
@@ -741,71 +770,65 @@ JSON 格式：
                 conversation_context=conversation_context,
             )
             for mem in extracted[:3]:
-                await self.memory_manager.save_memory(
-                    user_id=user_id,
-                    content=mem["content"],
-                    memory_type=mem["memory_type"],
-                    metadata={
+                items.append({
+                    "content": mem["content"],
+                    "memory_type": mem["memory_type"],
+                    "metadata": {
                         "source": "pre_compaction_flush",
                         "session_id": session_id,
                         "importance": mem.get("importance", 7),
                     },
-                )
-                saved_count += 1
+                })
 
-        return {"saved_count": saved_count, "estimated_chars": estimated_chars}
+        await self.memory_manager.save_memories_bulk(user_id=user_id, items=items)
+        return {"saved_count": len(items), "estimated_chars": estimated_chars}
 
     async def _build_memory_context(
         self,
         user_id: str,
         message: str,
+        priority_task: Optional["asyncio.Future"] = None,
     ) -> tuple[str, List[Dict], Dict[str, int]]:
         """
         Build memory context with priority memories + two-stage recall.
         Inspired by OpenClaw's search->get memory flow.
+        ``priority_task`` is the turn's shared _load_priority_memories task; the
+        snippet search runs concurrently with it.
         """
         memory_context = ""
         memory_used: List[Dict] = []
         seen_ids = set()
-        important_memories: List[Dict] = []
         related_memories: List[Dict] = []
 
-        important_types = ["user_config", "user_info", "personal", "user_preference", "important_info"]
-        per_type_limit = max(1, int(os.getenv("MEMORY_IMPORTANT_PER_TYPE", "2")))
         query_top_k = max(1, min(int(os.getenv("MEMORY_TOP_K", "5")), 20))
         detail_limit = max(1, min(int(os.getenv("MEMORY_DETAIL_TOP_K", "4")), query_top_k))
         context_char_limit = max(800, int(os.getenv("MEMORY_CONTEXT_CHAR_LIMIT", "2800")))
 
-        for mtype in important_types:
-            try:
-                type_mems = await self.memory_manager.list_memories(
-                    user_id=user_id,
-                    memory_type=mtype,
-                    limit=per_type_limit,
-                )
-                for mem in type_mems:
-                    if mem["id"] in seen_ids:
-                        continue
-                    seen_ids.add(mem["id"])
-                    important_memories.append(mem)
-            except Exception as e:
-                logger.warning(f"加载 {mtype} 记忆失败: {e}")
-
-        try:
-            snippets = await self.memory_manager.search_memory_snippets(
+        if priority_task is None:
+            priority_task = asyncio.ensure_future(self._load_priority_memories(user_id))
+        # 检索阶段直接带回完整记忆，省掉逐条 get_memory_detail
+        priority, snippets = await asyncio.gather(
+            priority_task,
+            self.memory_manager.search_memory_snippets(
                 user_id=user_id,
                 query=message,
                 top_k=query_top_k,
                 use_hybrid=True,
-            )
+                with_detail=True,
+            ),
+            return_exceptions=True,
+        )
+        important_memories: List[Dict] = [] if isinstance(priority, BaseException) else priority["important"]
+        seen_ids.update(mem["id"] for mem in important_memories)
+
+        try:
+            if isinstance(snippets, BaseException):
+                raise snippets
             for snippet in snippets[:detail_limit]:
                 memory_id = snippet.get("id")
                 if not memory_id or memory_id in seen_ids:
                     continue
-                detail = await self.memory_manager.get_memory_detail(
-                    user_id=user_id,
-                    memory_id=memory_id,
-                )
+                detail = snippet.get("memory")
                 if not detail:
                     continue
                 seen_ids.add(memory_id)
@@ -885,10 +908,14 @@ JSON 格式：
         memory_context = ""
         memory_used = []
 
+        # 本轮共享的重要记忆（系统提示词里的名字 + 记忆上下文）
+        priority_task = asyncio.ensure_future(self._load_priority_memories(user_id))
+
         if use_memory:
             memory_context, memory_used, memory_stats = await self._build_memory_context(
                 user_id=user_id,
                 message=message,
+                priority_task=priority_task,
             )
             if memory_used:
                 logger.info(
@@ -950,7 +977,9 @@ JSON 格式：
 
         # 5. 调用 Claude API
         try:
-            system_prompt = await self._get_system_prompt(user_id, memory_context, skill_context, search_context)
+            system_prompt = await self._get_system_prompt(
+                user_id, memory_context, skill_context, search_context, priority=await priority_task
+            )
             if self._is_time_sensitive_query(message):
                 system_prompt += (
                     "\n\n## 时效信息强约束\n"
@@ -1120,16 +1149,20 @@ JSON 格式：
 
         tools.append({
             "name": "memory_get",
-            "description": "根据 memory_search 返回的 memory_id 获取完整记忆内容。",
+            "description": "根据 memory_search 返回的 memory_id 获取完整记忆内容；需要多条时用 memory_ids 一次取回。",
             "input_schema": {
                 "type": "object",
                 "properties": {
                     "memory_id": {
                         "type": "string",
                         "description": "记忆ID"
+                    },
+                    "memory_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "多个记忆ID（可选，最多20个）"
                     }
-                },
-                "required": ["memory_id"]
+                }
             }
         })
 
@@ -2055,6 +2088,20 @@ JSON 格式：
 
     async def _execute_memory_get(self, user_id: str, params: Dict) -> Dict:
         """内置工具：两段式记忆检索（get）"""
+        memory_ids = params.get("memory_ids")
+        if isinstance(memory_ids, list) and memory_ids:
+            memory_ids = [str(memory_id).strip() for memory_id in memory_ids if str(memory_id).strip()][:20]
+            try:
+                memories = await self.memory_manager.get_memory_details(user_id=user_id, memory_ids=memory_ids)
+                return {
+                    "success": True,
+                    "message": f"获取 {len(memories)}/{len(memory_ids)} 条记忆",
+                    "data": {"memories": memories}
+                }
+            except Exception as e:
+                logger.error(f"memory_get 执行失败: {e}")
+                return {"success": False, "error": str(e)}
+
         memory_id = (params.get("memory_id") or "").strip()
         if not memory_id:
             return {"success": False, "error": "memory_id 不能为空"}
@@ -2235,10 +2282,14 @@ JSON 格式：
         memory_context = ""
         memory_used = []
 
+        # 本轮共享的重要记忆（系统提示词里的名字 + 记忆上下文）
+        priority_task = asyncio.ensure_future(self._load_priority_memories(user_id))
+
         if use_memory:
             memory_context, memory_used, memory_stats = await self._build_memory_context(
                 user_id=user_id,
                 message=message,
+                priority_task=priority_task,
             )
             if memory_used:
                 logger.info(
@@ -2399,7 +2450,9 @@ JSON 格式：
 
         # 5. 调用 API（支持 Tool Use）
         assistant_message = ""
-        system_prompt = await self._get_system_prompt(user_id, memory_context, skill_context, search_context)
+        system_prompt = await self._get_system_prompt(
+            user_id, memory_context, skill_context, search_context, priority=await priority_task
+        )
         if self._is_time_sensitive_query(message):
             system_prompt += (
                 "\n\n## 时效信息强约束\n"
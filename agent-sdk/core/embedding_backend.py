@@ -0,0 +1,233 @@
+"""
+Embedding backends.
+MemoryManager only calls ``encode`` and ``get_sentence_embedding_dimension``
+on its embedding model, so the model behind those two methods can be swapped:
+
+- ``SentenceTransformerBackend`` wraps the PyTorch SentenceTransformer model
+  (the default).
+- ``OnnxEmbeddingBackend`` runs the same transformer exported to ONNX under
+  ONNX Runtime on the CPU provider. With ``quantize=True`` the weights are
+  converted to int8 with dynamic quantization.
+
+The exported and quantized graphs are cached on disk, so the export cost is
+paid once per model.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+try:
+    import onnxruntime as ort
+    from transformers import AutoTokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+BACKEND_SENTENCE_TRANSFORMERS = "sentence-transformers"
+BACKEND_ONNX = "onnx"
+EMBEDDING_BACKENDS = (BACKEND_SENTENCE_TRANSFORMERS, BACKEND_ONNX)
+
+# ONNX 导出时的输入顺序，需和 BERT 类模型 forward 的位置参数一致
+_MODEL_INPUTS = ("input_ids", "attention_mask", "token_type_ids")
+
+
+def hub_model_id(model_name: str) -> str:
+    """Short sentence-transformers names (``all-MiniLM-L6-v2``) live under the ``sentence-transformers/`` org."""
+    if "/" in model_name or Path(model_name).exists():
+        return model_name
+    return f"sentence-transformers/{model_name}"
+
+
+def mean_pool(token_embeddings: np.ndarray, attention_mask: np.ndarray, normalize: bool = True) -> np.ndarray:
+    """Mask-weighted mean over the sequence axis, optionally L2-normalized (what all-MiniLM-L6-v2 does)."""
+    mask = attention_mask[..., None].astype("float32")
+    summed = (token_embeddings * mask).sum(axis=1)
+    pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+    if normalize:
+        pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+    return pooled.astype("float32")
+
+
+def export_onnx(model_name: str, model_dir: Path, opset: int = 14) -> Path:
+    """Export the Hugging Face transformer to ``model_dir/model.onnx`` (once) and save its tokenizer next to it."""
+    path = Path(model_dir) / "model.onnx"
+    if path.exists():
+        return path
+    import torch
+    from transformers import AutoModel
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    source = hub_model_id(model_name)
+    logger.info(f"导出 ONNX 嵌入模型: {source} -> {path}")
+    tokenizer = AutoTokenizer.from_pretrained(source)
+    model = AutoModel.from_pretrained(source).eval()
+    sample = tokenizer(["warmup"], return_tensors="pt")
+    input_names = [name for name in _MODEL_INPUTS if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    tmp = path.with_name(path.name + ".tmp")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            str(tmp),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    tokenizer.save_pretrained(str(path.parent))
+    os.replace(tmp, path)
+    return path
+
+
+def quantize_onnx(path: Path) -> Path:
+    """int8 dynamic quantization of ``path`` into ``model.int8.onnx`` next to it (once)."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    out = Path(path).with_name("model.int8.onnx")
+    if not out.exists():
+        logger.info(f"int8 动态量化 ONNX 嵌入模型: {out}")
+        tmp = out.with_name(out.name + ".tmp")
+        quantize_dynamic(str(path), str(tmp), weight_type=QuantType.QInt8)
+        os.replace(tmp, out)
+    return out
+
+
+class SentenceTransformerBackend:
+    """The PyTorch SentenceTransformer model with a fixed batch size and thread count."""
+
+    name = BACKEND_SENTENCE_TRANSFORMERS
+
+    def __init__(self, model, batch_size: int = 64, threads: int = 0):
+        self.model = model
+        self.batch_size = max(1, int(batch_size))
+        self.threads = max(0, int(threads))
+        if self.threads:
+            try:
+                import torch
+                torch.set_num_threads(self.threads)
+            except ImportError:
+                pass
+
+    @property
+    def cache_tag(self) -> str:
+        return ""
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: Union[str, Sequence[str]], batch_size: Optional[int] = None, **kwargs) -> np.ndarray:
+        kwargs.setdefault("show_progress_bar", False)
+        return self.model.encode(texts, batch_size=batch_size or self.batch_size, **kwargs)
+
+    def describe(self) -> Dict:
+        return {"backend": self.name, "quantized": False, "batch_size": self.batch_size, "threads": self.threads}
+
+
+class OnnxEmbeddingBackend:
+    """The transformer exported to ONNX, run on ONNX Runtime's CPU provider with mean pooling."""
+
+    name = BACKEND_ONNX
+
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: Path,
+        quantize: bool = False,
+        batch_size: int = 64,
+        threads: int = 0,
+        max_length: int = 256,
+        normalize: bool = True,
+    ):
+        if not ONNX_AVAILABLE:
+            raise RuntimeError("the ONNX embedding backend requires onnxruntime and transformers")
+        self.model_name = model_name
+        self.model_dir = Path(cache_dir) / re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.quantize = bool(quantize)
+        self.batch_size = max(1, int(batch_size))
+        self.threads = max(0, int(threads))
+        self.max_length = max(8, int(max_length))
+        self.normalize = normalize
+
+        model_path = export_onnx(model_name, self.model_dir)
+        if self.quantize:
+            model_path = quantize_onnx(model_path)
+        self.model_path = model_path
+        self.tokenizer = AutoTokenizer.from_pretrained(str(self.model_dir))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self._input_names = [item.name for item in self.session.get_inputs()]
+        self._dim = int(self._encode_batch(["warmup"]).shape[1])
+
+    @property
+    def cache_tag(self) -> str:
+        # 量化后的向量和原模型不完全一致，嵌入缓存必须分开存
+        return "onnx-int8" if self.quantize else "onnx"
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._dim
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        features = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np",
+        )
+        feeds = {name: features[name].astype("int64") for name in self._input_names if name in features}
+        if "token_type_ids" in self._input_names and "token_type_ids" not in feeds:
+            feeds["token_type_ids"] = np.zeros_like(feeds["input_ids"])
+        token_embeddings = self.session.run(None, feeds)[0]
+        return mean_pool(token_embeddings, features["attention_mask"], normalize=self.normalize)
+
+    def encode(self, texts: Union[str, Sequence[str]], batch_size: Optional[int] = None, **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        items = [texts] if single else list(texts)
+        if not items:
+            return np.zeros((0, self._dim), dtype="float32")
+        batch_size = max(1, int(batch_size or self.batch_size))
+        # 按长度排序后分批，同一批内补齐的 padding 最少
+        order = sorted(range(len(items)), key=lambda i: len(items[i]))
+        out = np.zeros((len(items), self._dim), dtype="float32")
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            out[chunk] = self._encode_batch([items[i] for i in chunk])
+        return out[0] if single else out
+
+    def describe(self) -> Dict:
+        return {
+            "backend": self.name,
+            "quantized": self.quantize,
+            "batch_size": self.batch_size,
+            "threads": self.threads,
+            "model_path": str(self.model_path),
+        }
+
+
+def create_embedding_backend(
+    backend: str,
+    model_name: str,
+    cache_dir: Path,
+    quantize: bool = False,
+    batch_size: int = 64,
+    threads: int = 0,
+):
+    """Build a backend from plain (picklable) settings, e.g. inside a worker process."""
+    if backend == BACKEND_ONNX:
+        return OnnxEmbeddingBackend(
+            model_name, cache_dir, quantize=quantize, batch_size=batch_size, threads=threads,
+        )
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformerBackend(SentenceTransformer(model_name), batch_size=batch_size, threads=threads)
@@ -0,0 +1,191 @@
+"""
+Content-hash embedding cache.
+Vectors are keyed by (model name, sha256 of the normalized text) and kept in
+an in-process LRU backed by a SQLite table, so repeated queries and re-saved
+content skip the embedding model entirely.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import sqlite3
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from core import sqlite_storage
+
+
+def normalize_embedding_text(text: str) -> str:
+    """NFC + trimmed, whitespace-collapsed text. Case is preserved for cased models."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-level (LRU + SQLite) cache of float32 embedding vectors."""
+
+    def __init__(self, db_path: Path, max_entries: int = 4096, max_db_entries: int = 200000):
+        self.db_path = Path(db_path)
+        self.max_entries = max(0, int(max_entries))
+        self.max_db_entries = max(0, int(max_db_entries))
+        self._lru: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = Lock()
+        self._writes_since_prune = 0
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite_storage.connect(self.db_path, row_factory=None)
+
+    def _init_db(self) -> None:
+        conn = self._connect()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                model_name TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (model_name, text_hash)
+            ) WITHOUT ROWID
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_cache_created ON embedding_cache(created_at)")
+        conn.commit()
+        conn.close()
+
+    def _remember(self, key: Tuple[str, str], vector: np.ndarray) -> None:
+        if not self.max_entries:
+            return
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def get_many(self, model_name: str, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Look up vectors by text hash; returns only the hits."""
+        found: Dict[str, np.ndarray] = {}
+        missing: List[str] = []
+        with self._lock:
+            for text_hash in hashes:
+                key = (model_name, text_hash)
+                vector = self._lru.get(key)
+                if vector is None:
+                    missing.append(text_hash)
+                    continue
+                self._lru.move_to_end(key)
+                found[text_hash] = vector
+                self.stats["memory_hits"] += 1
+
+        if missing:
+            unique = list(dict.fromkeys(missing))
+            conn = self._connect()
+            try:
+                for start in range(0, len(unique), 500):
+                    chunk = unique[start:start + 500]
+                    placeholders = ",".join("?" for _ in chunk)
+                    rows = conn.execute(
+                        f"SELECT text_hash, vector FROM embedding_cache "
+                        f"WHERE model_name = ? AND text_hash IN ({placeholders})",
+                        [model_name, *chunk],
+                    ).fetchall()
+                    for text_hash, blob in rows:
+                        found[text_hash] = np.frombuffer(blob, dtype="float32").copy()
+            finally:
+                conn.close()
+            with self._lock:
+                for text_hash in missing:
+                    if text_hash in found:
+                        self.stats["db_hits"] += 1
+                        self._remember((model_name, text_hash), found[text_hash])
+                    else:
+                        self.stats["misses"] += 1
+        return found
+
+    def put_many(self, model_name: str, items: Dict[str, np.ndarray]) -> None:
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text_hash, vector in items.items():
+                vector = np.asarray(vector, dtype="float32").reshape(-1)
+                self._remember((model_name, text_hash), vector)
+                rows.append((model_name, text_hash, int(vector.shape[0]), vector.tobytes(), now))
+            self._writes_since_prune += len(rows)
+            prune = self.max_db_entries and self._writes_since_prune >= 1000
+            if prune:
+                self._writes_since_prune = 0
+
+        conn = self._connect()
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (model_name, text_hash, dim, vector, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            if prune:
+                # Keep the table bounded; oldest entries go first.
+                conn.execute(
+                    """
+                    DELETE FROM embedding_cache WHERE created_at < (
+                        SELECT created_at FROM embedding_cache ORDER BY created_at DESC LIMIT 1 OFFSET ?
+                    )
+                    """,
+                    (self.max_db_entries,),
+                )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def encode(
+        self,
+        model_name: str,
+        texts: Sequence[str],
+        encoder: Callable[[List[str]], np.ndarray],
+        batch_size: int = 64,
+    ) -> np.ndarray:
+        """
+        Return a ``(len(texts), dim)`` float32 matrix, calling ``encoder`` only
+        for distinct normalized texts that are not cached yet.
+        """
+        normalized = [normalize_embedding_text(text) for text in texts]
+        hashes = [content_hash(text) for text in normalized]
+        vectors = self.get_many(model_name, hashes)
+
+        pending: Dict[str, str] = {}
+        for text, text_hash in zip(normalized, hashes):
+            if text_hash not in vectors:
+                pending.setdefault(text_hash, text)
+        if pending:
+            pending_hashes = list(pending)
+            batch_size = max(1, int(batch_size))
+            encoded: Dict[str, np.ndarray] = {}
+            for start in range(0, len(pending_hashes), batch_size):
+                chunk = pending_hashes[start:start + batch_size]
+                matrix = np.asarray(encoder([pending[h] for h in chunk]), dtype="float32")
+                for text_hash, vector in zip(chunk, matrix.reshape(len(chunk), -1)):
+                    encoded[text_hash] = vector
+            self.put_many(model_name, encoded)
+            vectors.update(encoded)
+
+        return np.vstack([vectors[text_hash] for text_hash in hashes]).astype("float32", copy=False)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._lru)
+        lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["db_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
@@ -14,6 +14,8 @@ from threading import RLock
 from typing import Any, Dict, List, Optional
 from uuid import uuid4
 
+from core import sqlite_storage
+
 
 def _utc_now() -> str:
     return datetime.now(timezone.utc).isoformat()
@@ -62,9 +64,7 @@ class ExecutionApprovalStore:
         self._init_db()
 
     def _connect(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
-        return conn
+        return sqlite_storage.connect(self.db_path)
 
     def _init_db(self) -> None:
         with self._lock:
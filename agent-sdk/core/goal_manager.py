@@ -11,6 +11,8 @@ from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+from core import sqlite_storage
+
 
 class GoalManager:
     DEFAULT_ORGANIZATION_ID = "default-org"
@@ -21,9 +23,7 @@ class GoalManager:
         self._init_db()
 
     def _get_conn(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(str(self.db_path))
-        conn.row_factory = sqlite3.Row
-        return conn
+        return sqlite_storage.connect(self.db_path)
 
     def _init_db(self):
         with self._lock:
@@ -9,11 +9,14 @@ import json
 import sqlite3
 import numpy as np
 import re
-from threading import Lock
+import shutil
+import time
+import functools
+from threading import Event, Lock, Thread
 from difflib import SequenceMatcher
 from pathlib import Path
-from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from datetime import datetime, timedelta
+from typing import Callable, List, Dict, Optional, Tuple
 import logging
 import sys
 
@@ -21,14 +24,21 @@ import sys
 sys.path.insert(0, str(Path(__file__).parent.parent / "services"))
 
 try:
-    from hybrid_search import HybridSearchService
+    from hybrid_search import (
+        HybridSearchService,
+        PersistentBM25Index,
+        bm25_rank_to_score,
+        build_fts_query,
+        short_fts_terms,
+    )
     HYBRID_SEARCH_AVAILABLE = True
 except ImportError:
     HYBRID_SEARCH_AVAILABLE = False
+    bm25_rank_to_score = build_fts_query = short_fts_terms = None
     logging.warning("混合搜索服务不可用")
 
 try:
-    from markdown_memory import MarkdownMemory
+    from markdown_memory import MarkdownMemory, MarkdownMirrorWriter
     MARKDOWN_MEMORY_AVAILABLE = True
 except ImportError:
     MARKDOWN_MEMORY_AVAILABLE = False
@@ -48,41 +58,142 @@ except ImportError:
     EMBEDDING_AVAILABLE = False
     logging.warning("sentence-transformers 未安装，嵌入生成功能将不可用")
 
+from core import sqlite_storage
+from core.access_stats import AccessStatsBuffer
+from core.embedding_backend import (
+    BACKEND_ONNX,
+    BACKEND_SENTENCE_TRANSFORMERS,
+    EMBEDDING_BACKENDS,
+    OnnxEmbeddingBackend,
+    SentenceTransformerBackend,
+    create_embedding_backend,
+)
+from core.embedding_cache import EmbeddingCache
+from core.memory_executor import MemoryExecutor
+from core.memory_fts import (
+    FTS_TERMS_TABLE,
+    ensure_fts_schema,
+    fts_tokenizer,
+    rebuild_fts,
+    search_fts,
+    terms_query,
+)
+from core.near_duplicate import FINGERPRINT_SCHEME, InMemoryLSH, NearDuplicateIndex, jaccard_floor
+from core.recall_cache import RecallCache
+from core.reembed import EmbeddingProcessPool
+from core.vector_index import IndexTierPolicy, VectorIndexStore
+
 logger = logging.getLogger(__name__)
 
+# 事实签名规则（_extract_fact_signature）变化时递增，memory_facts 会被清空并按用户重建
+FACT_SCHEME = "v1"
+
 
 class MemoryManager:
     """长记忆管理器"""
 
     def __init__(self, data_dir: Path, embedding_model: str = "all-MiniLM-L6-v2"):
         self.data_dir = data_dir
+        # 阻塞的 SQLite / 编码 / 向量计算放到独立线程池，避免卡住事件循环
+        self._executor = MemoryExecutor()
         self.db_path = data_dir / "memories.db"
+        # 旧版全局索引，仅用于迁移到按用户划分的索引
         self.index_path = data_dir / "memory_index.faiss"
+        self.index_dir = data_dir / "vector_indexes"
+        # 重新编码任务写入的影子索引目录，完成后整体换入 index_dir
+        self.reembed_dir = data_dir / "vector_indexes.reembed"
+        self._reembed_shadow: Optional[VectorIndexStore] = None
+        self._reembed_progress: Optional[Dict] = None
+        self._reembed_lock = Lock()
+        self._reembed_stop = Event()
+        # 实时向量写入与影子索引换入互斥，换入后不会有写入落到旧目录
+        self._vector_write_lock = Lock()
+        # 现有向量索引由另一套模型/维度生成（需要 reembed_memories 重建）
+        self.vector_index_stale = False
         self.embedding_model_name = embedding_model
         self.lazy_embedding_load = os.getenv("MEMORY_LAZY_EMBEDDING_LOAD", "1").strip().lower() in {"1", "true", "yes", "on"}
         self._embedding_lock = Lock()
+        # 嵌入后端：sentence-transformers（默认，PyTorch）或 onnx（ONNX Runtime，可选 int8 动态量化）
+        self.embedding_backend = os.getenv("MEMORY_EMBEDDING_BACKEND", BACKEND_SENTENCE_TRANSFORMERS).strip().lower()
+        if self.embedding_backend not in EMBEDDING_BACKENDS:
+            logger.warning(f"未知的嵌入后端 {self.embedding_backend}，改用 {BACKEND_SENTENCE_TRANSFORMERS}")
+            self.embedding_backend = BACKEND_SENTENCE_TRANSFORMERS
+        self.embedding_quantize = os.getenv("MEMORY_EMBEDDING_QUANTIZE", "").strip().lower() in {"1", "true", "int8"}
+        self.embedding_batch_size = max(1, int(os.getenv("MEMORY_EMBEDDING_BATCH_SIZE", "64")))
+        self.embedding_threads = max(0, int(os.getenv("MEMORY_EMBEDDING_THREADS", "0")))
+        # 嵌入缓存按 (模型, 后端变体) 区分：量化模型的向量不能和原模型混用
+        self.embedding_cache_name = embedding_model
+        if self.embedding_backend == BACKEND_ONNX:
+            self.embedding_cache_name += "#onnx-int8" if self.embedding_quantize else "#onnx"
+        # 启动后在后台线程加载并预热模型；预热完成前检索只走关键词召回，不等模型
+        self.embedding_warmup = os.getenv("MEMORY_EMBEDDING_WARMUP", "1").strip().lower() in {"1", "true", "yes", "on"}
+        self._warmup_lock = Lock()
+        self._warmup_thread: Optional[Thread] = None
+        self._warmup_progress: Optional[Callable[[str], None]] = None
+        # 加载失败后按指数退避重试（基数秒，最多 32 倍），退避期内检索不再反复起加载线程
+        self.embedding_retry_sec = max(0.0, float(os.getenv("MEMORY_EMBEDDING_RETRY_SEC", "30")))
+        self._embedding_retry_at = 0.0
+        self._embedding_status: Dict = {
+            "state": "cold" if EMBEDDING_AVAILABLE else "unavailable",
+            "load_ms": None,
+            "warmup_ms": None,
+            "ready_at": None,
+            "error": None,
+            "failures": 0,
+            "failed_at": None,
+            "retry_at": None,
+        }
+        # 本进程内已校验过倒排索引完整性的用户
+        self._keyword_index_synced: set = set()
+        # 近重复指纹索引（MinHash/LSH）；缺指纹的旧行由后台任务补齐，补齐前查重只比对已有指纹的行
+        self.near_duplicates = NearDuplicateIndex()
+        self._fingerprint_backfill_thread: Optional[Thread] = None
+        self._fingerprint_backfill_stop = Event()
+        self._fingerprint_backfill: Dict = {"state": "idle", "processed": 0, "added": 0, "last_rowid": 0}
+        # 本进程内已确认事实索引已补齐的用户
+        self._fact_index_synced: set = set()
+        # user_id -> 最近一次 compact_memories 的进度
+        self._compaction_progress: Dict[str, Dict] = {}
+        # 召回结果缓存：按用户代数失效，任何写入/删除都会使该用户的缓存作废
+        self.recall_cache = RecallCache(max_entries=int(os.getenv("MEMORY_RECALL_CACHE_SIZE", "512")))
 
         # 初始化数据库
         self._init_database()
 
+        # 访问统计先记在内存里，由后台线程定期合并成一个事务写回（检索不再产生写锁）
+        self.access_stats = AccessStatsBuffer(
+            self._get_connection,
+            flush_interval_sec=float(os.getenv("MEMORY_ACCESS_FLUSH_INTERVAL", "5")),
+            max_pending=int(os.getenv("MEMORY_ACCESS_FLUSH_MAX_PENDING", "1000")),
+        )
+        self.start_fingerprint_backfill()
+
+        # 嵌入缓存：(模型名, 规范化文本 sha256) -> 向量，LRU + SQLite 两级
+        self.embedding_cache = EmbeddingCache(
+            self.db_path,
+            max_entries=int(os.getenv("MEMORY_EMBEDDING_CACHE_SIZE", "4096")),
+            max_db_entries=int(os.getenv("MEMORY_EMBEDDING_CACHE_DB_MAX", "200000")),
+        )
+
         # 初始化嵌入模型
         self.embedding_model = None
         self.embedding_dim = 384  # default for all-MiniLM-L6-v2
         if EMBEDDING_AVAILABLE and not self.lazy_embedding_load:
             try:
                 logger.info(f"加载嵌入模型: {embedding_model}")
-                self.embedding_model = SentenceTransformer(embedding_model)
+                self.embedding_model = self._create_embedding_model()
                 self.embedding_dim = self.embedding_model.get_sentence_embedding_dimension()
+                self._set_embedding_state("ready", ready_at=datetime.now().isoformat())
                 logger.info(f"嵌入维度: {self.embedding_dim}")
             except Exception as e:
                 logger.error(f"加载嵌入模型失败: {e}")
         elif self.lazy_embedding_load and EMBEDDING_AVAILABLE:
             logger.info("嵌入模型将按需懒加载，优先提升后端启动速度")
 
-        # 初始化 FAISS 索引
-        self.index = None
+        # 初始化 FAISS 索引（按用户划分，ID = 记忆 rowid）
+        self.vector_store: Optional[VectorIndexStore] = None
         if FAISS_AVAILABLE and self.embedding_model:
-            self._init_faiss_index()
+            self._init_vector_store()
 
         # 初始化混合搜索服务
         self.hybrid_search = None
@@ -100,33 +211,152 @@ class MemoryManager:
 
         # 初始化 Markdown 记忆系统
         self.markdown_memory = None
+        # Markdown 镜像默认由后台线程异步追加，保存以 SQLite/向量提交为准，不再占用请求耗时
+        self.markdown_writer = None
         if MARKDOWN_MEMORY_AVAILABLE:
             try:
                 workspace_dir = data_dir / "workspace"
-                self.markdown_memory = MarkdownMemory(workspace_dir)
+                self.markdown_memory = MarkdownMemory(
+                    workspace_dir,
+                    segment_max_bytes=int(os.getenv("MEMORY_MARKDOWN_SEGMENT_BYTES", str(4 * 1024 * 1024))),
+                )
                 logger.info(f"Markdown 记忆系统初始化: {workspace_dir}")
+                if os.getenv("MEMORY_MARKDOWN_ASYNC", "1").strip().lower() in {"1", "true", "yes", "on"}:
+                    self.markdown_writer = MarkdownMirrorWriter(
+                        self.markdown_memory,
+                        max_queue=int(os.getenv("MEMORY_MARKDOWN_QUEUE_SIZE", "2048")),
+                        fsync_interval_sec=float(os.getenv("MEMORY_MARKDOWN_FSYNC_INTERVAL", "1.0")),
+                    )
             except Exception as e:
                 logger.error(f"Markdown 记忆系统初始化失败: {e}")
 
-    def _ensure_embedding_ready(self):
+    def _ensure_embedding_ready(self, wait: bool = True) -> bool:
+        """
+        确保嵌入模型可用，返回模型是否就绪
+
+        wait=False 用于检索路径：模型未就绪时只在后台启动预热并立即返回，
+        调用方退化为关键词召回，而不是等待模型加载
+        """
         if not EMBEDDING_AVAILABLE or self.embedding_model is not None:
-            return
+            return self.embedding_model is not None
+        if self._embedding_backing_off():
+            return False
+        if not wait:
+            self.start_embedding_warmup()
+            return False
+        # 预热线程持有 _embedding_lock 时，这里会等它完成而不是重复加载
+        self._load_embedding_model()
+        return self.embedding_model is not None
+
+    def start_embedding_warmup(self, on_progress: Optional[Callable[[str], None]] = None) -> bool:
+        """
+        在后台线程加载嵌入模型并跑一次编码预热（幂等）
+
+        Args:
+            on_progress: 每次状态变化（loading / warming / ready / failed）时回调
+
+        Returns:
+            本次是否启动了新的预热线程（上次加载失败且仍在退避期内时不启动）
+        """
+        if not EMBEDDING_AVAILABLE or self.embedding_model is not None or self._embedding_backing_off():
+            return False
+        # 不能拿 _embedding_lock：加载期间它一直被预热线程持有
+        with self._warmup_lock:
+            if on_progress is not None:
+                self._warmup_progress = on_progress
+            if self._warmup_thread is not None and self._warmup_thread.is_alive():
+                return False
+            self._warmup_thread = Thread(target=self._load_embedding_model, name="memory-embedding-warmup", daemon=True)
+            self._warmup_thread.start()
+        return True
+
+    def _embedding_backing_off(self) -> bool:
+        return self._embedding_status["state"] == "failed" and time.monotonic() < self._embedding_retry_at
+
+    def _set_embedding_state(self, state: str, **fields):
+        self._embedding_status.update(state=state, **fields)
+        callback = self._warmup_progress
+        if callback is not None:
+            try:
+                callback(state)
+            except Exception as e:
+                logger.warning(f"嵌入模型预热进度回调失败: {e}")
+
+    def _load_embedding_model(self):
         with self._embedding_lock:
             if self.embedding_model is not None:
                 return
             try:
                 logger.info(f"懒加载嵌入模型: {self.embedding_model_name}")
-                self.embedding_model = SentenceTransformer(self.embedding_model_name)
-                self.embedding_dim = self.embedding_model.get_sentence_embedding_dimension()
-                if FAISS_AVAILABLE and self.index is None:
-                    self._init_faiss_index()
+                self._set_embedding_state("loading", error=None)
+                started = time.perf_counter()
+                model = self._create_embedding_model()
+                loaded = time.perf_counter()
+                self._set_embedding_state("warming", load_ms=round((loaded - started) * 1000, 1))
+                # 先跑一次编码，把首个请求要付的冷启动开销（算子初始化、分词器缓存）提前消化掉
+                model.encode(["warmup"])
+                self.embedding_dim = model.get_sentence_embedding_dimension()
+                if FAISS_AVAILABLE and self.vector_store is None:
+                    self._init_vector_store()
+                # 预热完成后才对检索可见，未就绪期间检索路径看到的一直是 None
+                self.embedding_model = model
+                # 此前的结果只有关键词召回，模型就绪后全部作废
+                self.recall_cache.bump()
+                self._set_embedding_state(
+                    "ready",
+                    warmup_ms=round((time.perf_counter() - loaded) * 1000, 1),
+                    ready_at=datetime.now().isoformat(),
+                    failures=0,
+                    retry_at=None,
+                )
                 logger.info(f"嵌入模型准备完成，维度: {self.embedding_dim}")
             except Exception as e:
-                logger.error(f"懒加载嵌入模型失败: {e}")
+                failures = self._embedding_status["failures"] + 1
+                delay = self.embedding_retry_sec * min(2 ** (failures - 1), 32)
+                self._embedding_retry_at = time.monotonic() + delay
+                now = datetime.now()
+                self._set_embedding_state(
+                    "failed",
+                    error=str(e),
+                    failures=failures,
+                    failed_at=now.isoformat(),
+                    retry_at=(now + timedelta(seconds=delay)).isoformat(),
+                )
+                logger.error(f"懒加载嵌入模型失败（第 {failures} 次，{delay:.0f}s 后重试）: {e}")
+
+    def _create_embedding_model(self):
+        """按 MEMORY_EMBEDDING_BACKEND 构造嵌入后端（阻塞：可能要下载、导出或量化模型）"""
+        if self.embedding_backend == BACKEND_ONNX:
+            return OnnxEmbeddingBackend(
+                self.embedding_model_name,
+                self.data_dir / "embedding_models",
+                quantize=self.embedding_quantize,
+                batch_size=self.embedding_batch_size,
+                threads=self.embedding_threads,
+            )
+        return SentenceTransformerBackend(
+            SentenceTransformer(self.embedding_model_name),
+            batch_size=self.embedding_batch_size,
+            threads=self.embedding_threads,
+        )
+
+    def get_embedding_status(self) -> Dict:
+        """嵌入模型加载/预热状态，供 /health 和启动剖析使用"""
+        status = dict(self._embedding_status)
+        status["ready"] = self.embedding_model is not None
+        status["model"] = self.embedding_model_name
+        describe = getattr(self.embedding_model, "describe", None)
+        status.update(describe() if describe else {
+            "backend": self.embedding_backend,
+            "quantized": self.embedding_backend == BACKEND_ONNX and self.embedding_quantize,
+            "batch_size": self.embedding_batch_size,
+            "threads": self.embedding_threads,
+        })
+        return status
 
     def _init_database(self):
         """初始化数据库"""
-        conn = sqlite3.connect(self.db_path)
+        conn = sqlite_storage.connect(self.db_path, row_factory=None)
         cursor = conn.cursor()
 
         # 语义记忆表
@@ -160,6 +390,93 @@ class MemoryManager:
             CREATE INDEX IF NOT EXISTS idx_memories_created
             ON semantic_memories(created_at DESC)
         """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_memories_user_created
+            ON semantic_memories(user_id, created_at DESC)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_memories_user_embedding
+            ON semantic_memories(user_id, embedding_index)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_memories_user_type_created
+            ON semantic_memories(user_id, memory_type, created_at DESC)
+        """)
+
+        # 从 metadata JSON 派生的可索引列（冲突状态 / 过期时间 / 事实签名）
+        self._ensure_metadata_columns(cursor)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_memories_user_conflict
+            ON semantic_memories(user_id, conflict_status)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_memories_user_type_expires
+            ON semantic_memories(user_id, memory_type, expires_at)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_memories_user_conflict_key
+            ON semantic_memories(user_id, conflict_key)
+        """)
+
+        # 持久化 BM25 倒排索引
+        if HYBRID_SEARCH_AVAILABLE:
+            PersistentBM25Index.ensure_schema(cursor)
+
+        # 存储层元信息（向量 ID 方案等）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS memory_meta (
+                meta_key TEXT PRIMARY KEY,
+                meta_value TEXT
+            )
+        """)
+        # 重新编码任务已写入影子索引的行，换入时只给这些行设置 embedding_index
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS memory_reembed_rows (
+                row_id INTEGER PRIMARY KEY
+            )
+        """)
+
+        # 近重复指纹索引；指纹算法变化时清空，由后台任务 _backfill_fingerprints 补齐
+        NearDuplicateIndex.ensure_schema(cursor)
+        cursor.execute("SELECT meta_value FROM memory_meta WHERE meta_key = 'fingerprint_scheme'")
+        scheme_row = cursor.fetchone()
+        if not scheme_row or scheme_row[0] != FINGERPRINT_SCHEME:
+            cursor.execute("DELETE FROM memory_lsh_buckets")
+            cursor.execute("DELETE FROM memory_fingerprints")
+            cursor.execute("DELETE FROM memory_meta WHERE meta_key = ?", (self._FINGERPRINT_BACKFILL_KEY,))
+            cursor.execute(
+                "INSERT OR REPLACE INTO memory_meta (meta_key, meta_value) VALUES ('fingerprint_scheme', ?)",
+                (FINGERPRINT_SCHEME,),
+            )
+
+        # 事实签名索引：冲突检测按 (user_id, memory_type, fact_key) 单次查找
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS memory_facts (
+                memory_id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                memory_type TEXT NOT NULL,
+                fact_key TEXT NOT NULL,
+                fact_value TEXT NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_memory_facts_key
+            ON memory_facts(user_id, memory_type, fact_key)
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS memory_facts_ad AFTER DELETE ON semantic_memories BEGIN
+                DELETE FROM memory_facts WHERE memory_id = old.id;
+            END
+        """)
+        cursor.execute("SELECT meta_value FROM memory_meta WHERE meta_key = 'fact_scheme'")
+        scheme_row = cursor.fetchone()
+        if not scheme_row or scheme_row[0] != FACT_SCHEME:
+            cursor.execute("DELETE FROM memory_facts")
+            cursor.execute("DELETE FROM memory_meta WHERE meta_key LIKE 'fact_index:%'")
+            cursor.execute(
+                "INSERT OR REPLACE INTO memory_meta (meta_key, meta_value) VALUES ('fact_scheme', ?)",
+                (FACT_SCHEME,),
+            )
 
         # 用户偏好表
         cursor.execute("""
@@ -174,38 +491,180 @@ class MemoryManager:
             )
         """)
 
-        # 全文搜索（FTS5）
-        cursor.execute("""
-            CREATE VIRTUAL TABLE IF NOT EXISTS semantic_memories_fts
-            USING fts5(
-                id UNINDEXED,
-                content,
-                content='semantic_memories',
-                content_rowid='rowid'
-            )
-        """)
+        # 全文搜索（FTS5，触发器同步；分词器或结构变化时自动重建）
+        if ensure_fts_schema(cursor):
+            logger.info(f"全文索引已重建 (tokenizer={fts_tokenizer()})")
 
         conn.commit()
         conn.close()
 
         logger.info(f"数据库初始化完成: {self.db_path}")
 
-    def _init_faiss_index(self):
-        """初始化 FAISS 索引"""
-        if self.index_path.exists():
-            # 加载已有索引
-            self.index = faiss.read_index(str(self.index_path))
-            logger.info(f"加载 FAISS 索引: {self.index.ntotal} 条记忆")
+    # 列名 -> metadata 中的 JSON 路径
+    _METADATA_COLUMNS = {
+        "conflict_status": "$.conflict_status",
+        "conflict_key": "$.conflict_key",
+        "expires_at": "$.freshness.expires_at",
+    }
+
+    @classmethod
+    def _ensure_metadata_columns(cls, cursor: sqlite3.Cursor):
+        """
+        以 VIRTUAL 生成列的形式补齐派生列：旧库只需 ALTER TABLE，写入路径无需改动，
+        metadata 非法 JSON 时列值为 NULL
+        """
+        cursor.execute("PRAGMA table_xinfo(semantic_memories)")
+        existing = {row[1] for row in cursor.fetchall()}
+        for column, path in cls._METADATA_COLUMNS.items():
+            if column in existing:
+                continue
+            cursor.execute(
+                f"""
+                ALTER TABLE semantic_memories ADD COLUMN {column} TEXT
+                GENERATED ALWAYS AS (
+                    CASE WHEN json_valid(metadata) THEN json_extract(metadata, '{path}') END
+                ) VIRTUAL
+                """
+            )
+
+    def _new_vector_store(self, index_dir: Path) -> VectorIndexStore:
+        return VectorIndexStore(
+            index_dir,
+            self.embedding_dim,
+            snapshot_every=int(os.getenv("MEMORY_VECTOR_SNAPSHOT_EVERY", "256")),
+            snapshot_interval_sec=float(os.getenv("MEMORY_VECTOR_SNAPSHOT_INTERVAL_SEC", "60")),
+            fsync=os.getenv("MEMORY_VECTOR_JOURNAL_FSYNC", "1").strip().lower() in {"1", "true", "yes", "on"},
+            # 按向量数自动切换索引类型：Flat → IVF → IVF-fp16/PQ
+            tiering=IndexTierPolicy(
+                flat_max=int(os.getenv("MEMORY_VECTOR_FLAT_MAX", "20000")),
+                ivf_max=int(os.getenv("MEMORY_VECTOR_IVF_MAX", "250000")),
+                large_tier=os.getenv("MEMORY_VECTOR_LARGE_TIER", "ivf_fp16"),
+                nprobe=int(os.getenv("MEMORY_VECTOR_NPROBE", "16")),
+                pq_bytes=int(os.getenv("MEMORY_VECTOR_PQ_BYTES", "0")) or None,
+            ),
+        )
+
+    def _vector_profile(self) -> Dict:
+        """生成当前向量所用的模型（含后端变体）和维度"""
+        return {"model": self.embedding_cache_name, "dim": int(self.embedding_dim)}
+
+    def _get_meta(self, cursor: sqlite3.Cursor, key: str) -> Optional[Dict]:
+        cursor.execute("SELECT meta_value FROM memory_meta WHERE meta_key = ?", (key,))
+        row = cursor.fetchone()
+        return json.loads(row["meta_value"]) if row else None
+
+    def _set_meta(self, cursor: sqlite3.Cursor, key: str, value: Optional[Dict]):
+        if value is None:
+            cursor.execute("DELETE FROM memory_meta WHERE meta_key = ?", (key,))
         else:
-            # 创建新索引
-            self.index = faiss.IndexFlatL2(self.embedding_dim)
-            logger.info("创建新的 FAISS 索引")
+            cursor.execute(
+                "INSERT OR REPLACE INTO memory_meta (meta_key, meta_value) VALUES (?, ?)",
+                (key, json.dumps(value)),
+            )
+
+    def _init_vector_store(self):
+        """初始化按用户划分的 FAISS 索引，并迁移旧版全局索引"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        checkpoint = self._get_meta(cursor, self._REEMBED_CHECKPOINT_KEY)
+        if checkpoint and checkpoint.get("phase") == "swap":
+            # 上次换入影子索引时中断：目录改名是幂等的，直接补完
+            self._swap_in_reembed_dir()
+            self._finish_reembed(cursor, checkpoint["profile"])
+            conn.commit()
+        profile = self._get_meta(cursor, "vector_profile")
+        if profile is None:
+            self._set_meta(cursor, "vector_profile", self._vector_profile())
+            conn.commit()
+        conn.close()
+
+        self.vector_index_stale = profile is not None and profile != self._vector_profile()
+        if self.vector_index_stale:
+            logger.warning(
+                f"向量索引由 {profile} 生成，与当前 {self._vector_profile()} 不一致，"
+                "需要运行 reembed_memories 重新编码"
+            )
+            if profile.get("dim") != int(self.embedding_dim):
+                # 维度不同的旧索引无法检索，重建完成前只走关键词召回
+                return
+
+        self.vector_store = self._new_vector_store(self.index_dir)
+        self.vector_store.start()
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT meta_value FROM memory_meta WHERE meta_key = 'vector_id_scheme'")
+        row = cursor.fetchone()
+        conn.close()
+        if row and row["meta_value"] == "rowid":
+            logger.info(f"FAISS 索引目录: {self.index_dir}")
+            return
+        self._migrate_legacy_index()
+
+    def _migrate_legacy_index(self):
+        """
+        把旧版全局 IndexFlatL2（embedding_index = 位置下标）迁移为
+        每用户 IndexIDMap2（embedding_index = rowid）。
+        """
+        legacy = None
+        if self.index_path.exists():
+            try:
+                legacy = faiss.read_index(str(self.index_path))
+            except Exception as e:
+                logger.error(f"读取旧版 FAISS 索引失败: {e}")
+
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT rowid, user_id, embedding_index
+            FROM semantic_memories
+            WHERE embedding_index IS NOT NULL
+            """
+        )
+        rows = cursor.fetchall()
+
+        by_user: Dict[str, Tuple[List[int], List[np.ndarray]]] = {}
+        migrated_rowids: List[int] = []
+        for row in rows:
+            position = int(row["embedding_index"])
+            if legacy is None or position < 0 or position >= legacy.ntotal:
+                continue
+            try:
+                vector = legacy.reconstruct(position)
+            except Exception:
+                continue
+            ids, vectors = by_user.setdefault(row["user_id"], ([], []))
+            ids.append(int(row["rowid"]))
+            vectors.append(vector)
+            migrated_rowids.append(int(row["rowid"]))
+
+        for user_id, (ids, vectors) in by_user.items():
+            self.vector_store.replace(user_id, ids, np.vstack(vectors))
+
+        # 无法迁移的旧位置下标已失效，置空后可由 rebuild_vector_index 重新编码
+        cursor.execute("UPDATE semantic_memories SET embedding_index = NULL")
+        cursor.executemany(
+            "UPDATE semantic_memories SET embedding_index = rowid WHERE rowid = ?",
+            [(rowid,) for rowid in migrated_rowids],
+        )
+        cursor.execute(
+            """
+            INSERT INTO memory_meta (meta_key, meta_value) VALUES ('vector_id_scheme', 'rowid')
+            ON CONFLICT(meta_key) DO UPDATE SET meta_value = excluded.meta_value
+            """
+        )
+        conn.commit()
+        conn.close()
+
+        if self.index_path.exists():
+            self.index_path.replace(self.index_path.with_suffix(".faiss.legacy"))
+        logger.info(
+            f"FAISS 索引迁移完成: {len(migrated_rowids)} 条向量, {len(by_user)} 个用户"
+        )
 
     def _get_connection(self):
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """获取数据库连接（来自共享连接池，close() 归还连接）"""
+        return sqlite_storage.connect(self.db_path)
 
     @staticmethod
     def _normalize_text(text: str) -> str:
@@ -224,6 +683,23 @@ class MemoryManager:
             return 1.0
         return float(SequenceMatcher(None, left_norm, right_norm).ratio())
 
+    @staticmethod
+    def _similar_at_least(left: str, right: str, threshold: float) -> bool:
+        """等价于 _text_similarity(left, right) >= threshold，先用廉价上界排除"""
+        left_norm = MemoryManager._normalize_text(left)
+        right_norm = MemoryManager._normalize_text(right)
+        if not left_norm or not right_norm:
+            return 0.0 >= threshold
+        if left_norm == right_norm:
+            return True
+        if MemoryManager._length_bound(len(left_norm), len(right_norm)) < threshold:
+            return False
+        matcher = SequenceMatcher(None, left_norm, right_norm)
+        return (
+            matcher.quick_ratio() >= threshold
+            and matcher.ratio() >= threshold
+        )
+
     @staticmethod
     def _estimate_importance(memory_type: str, content: str, metadata: Optional[Dict]) -> int:
         """Estimate memory importance on save (1-10)."""
@@ -348,19 +824,22 @@ class MemoryManager:
 
     @staticmethod
     def _memory_staleness(memory_type: str, created_at: Optional[str], metadata: Optional[Dict]) -> Tuple[bool, float]:
-        metadata = metadata or {}
-        freshness = metadata.get("freshness")
+        freshness = (metadata or {}).get("freshness")
+        expires_at = freshness.get("expires_at") if isinstance(freshness, dict) else None
+        return MemoryManager._staleness(memory_type, created_at, expires_at)
+
+    @staticmethod
+    def _staleness(memory_type: str, created_at: Optional[str], expires_at: Optional[str]) -> Tuple[bool, float]:
+        """过期判定：expires_at 已过，或创建时间超过该类型的 TTL（与 _count_stale 的 SQL 条件一致）"""
         now = datetime.now()
 
-        if isinstance(freshness, dict):
-            expires_at = freshness.get("expires_at")
-            if expires_at:
-                try:
-                    expires_dt = datetime.fromisoformat(str(expires_at).replace("Z", "+00:00"))
-                    if now > expires_dt.replace(tzinfo=None) if expires_dt.tzinfo else now > expires_dt:
-                        return True, 0.22
-                except Exception:
-                    pass
+        if expires_at:
+            try:
+                expires_dt = datetime.fromisoformat(str(expires_at).replace("Z", "+00:00"))
+                if now > expires_dt.replace(tzinfo=None) if expires_dt.tzinfo else now > expires_dt:
+                    return True, 0.22
+            except Exception:
+                pass
 
         ttl_days = MemoryManager._ttl_days_for_type(memory_type)
         if created_at:
@@ -375,67 +854,245 @@ class MemoryManager:
 
         return False, 0.0
 
+    def _ensure_fact_index(self, conn: sqlite3.Connection, user_id: str):
+        """首次为某用户做冲突检测时，从已有记忆补齐 memory_facts（旧数据只需解析一次）"""
+        if user_id in self._fact_index_synced:
+            return
+        cursor = conn.cursor()
+        marker = f"fact_index:{user_id}"
+        cursor.execute("SELECT meta_value FROM memory_meta WHERE meta_key = ?", (marker,))
+        if not cursor.fetchone():
+            cursor.execute(
+                "SELECT id, memory_type, content FROM semantic_memories WHERE user_id = ?",
+                (user_id,),
+            )
+            facts = []
+            for row in cursor.fetchall():
+                signature = self._extract_fact_signature(row["content"] or "")
+                if signature:
+                    facts.append((row["id"], user_id, row["memory_type"] or "", signature[0], signature[1]))
+            cursor.executemany(
+                """
+                INSERT OR REPLACE INTO memory_facts (memory_id, user_id, memory_type, fact_key, fact_value)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                facts,
+            )
+            cursor.execute(
+                "INSERT OR REPLACE INTO memory_meta (meta_key, meta_value) VALUES (?, ?)",
+                (marker, FACT_SCHEME),
+            )
+            conn.commit()
+            logger.info(f"补齐事实签名索引: {user_id} ({len(facts)} 条)")
+        self._fact_index_synced.add(user_id)
+
     def _find_conflicting_memory(
-        self, user_id: str, content: str, memory_type: str
+        self,
+        user_id: str,
+        content: str,
+        memory_type: str,
+        signature: Optional[Tuple[str, str]] = None,
     ) -> Optional[Tuple[str, Dict, str]]:
-        signature = self._extract_fact_signature(content)
+        """按事实键在 memory_facts 中查找同键不同值的最新记忆（覆盖全部历史）"""
+        signature = signature or self._extract_fact_signature(content)
         if not signature:
             return None
         fact_key, fact_value = signature
 
         conn = self._get_connection()
+        self._ensure_fact_index(conn, user_id)
         cursor = conn.cursor()
         cursor.execute(
             """
-            SELECT id, content, metadata
-            FROM semantic_memories
-            WHERE user_id = ? AND memory_type = ?
-            ORDER BY created_at DESC
-            LIMIT 200
+            SELECT m.id, m.content, m.metadata
+            FROM memory_facts f
+            JOIN semantic_memories m ON m.id = f.memory_id
+            WHERE f.user_id = ? AND f.memory_type = ? AND f.fact_key = ? AND f.fact_value != ?
+            ORDER BY m.created_at DESC
+            LIMIT 1
             """,
-            (user_id, memory_type),
+            (user_id, memory_type, fact_key, fact_value),
         )
-        rows = cursor.fetchall()
+        row = cursor.fetchone()
         conn.close()
+        if not row:
+            return None
+        return row["id"], self._parse_metadata(row["metadata"]), row["content"]
 
-        for row in rows:
-            other_signature = self._extract_fact_signature(row["content"] or "")
-            if not other_signature:
-                continue
-            other_key, other_value = other_signature
-            if other_key == fact_key and other_value != fact_value:
-                return row["id"], self._parse_metadata(row["metadata"]), row["content"]
-        return None
+    @staticmethod
+    def _duplicate_threshold() -> float:
+        try:
+            return float(os.getenv("MEMORY_DUPLICATE_THRESHOLD", "0.96"))
+        except ValueError:
+            return 0.96
 
-    def _find_duplicate_memory(self, user_id: str, content: str, memory_type: str) -> Optional[Tuple[str, str]]:
-        norm = self._normalize_text(content)
-        if not norm:
-            return None
+    @staticmethod
+    def _duplicate_budget() -> Tuple[int, float]:
+        """(最多校验的候选数, 校验时间预算秒)"""
+        try:
+            max_candidates = max(1, int(os.getenv("MEMORY_DUPLICATE_MAX_CANDIDATES", "32")))
+        except ValueError:
+            max_candidates = 32
         try:
-            duplicate_threshold = float(os.getenv("MEMORY_DUPLICATE_THRESHOLD", "0.96"))
+            budget = max(0.001, float(os.getenv("MEMORY_DUPLICATE_BUDGET_MS", "50")) / 1000.0)
         except ValueError:
-            duplicate_threshold = 0.96
+            budget = 0.05
+        return max_candidates, budget
+
+    @staticmethod
+    def _length_bound(left_len: int, right_len: int) -> float:
+        """SequenceMatcher.ratio() 的上界：2 * min / (len_a + len_b)"""
+        total = left_len + right_len
+        return (2.0 * min(left_len, right_len) / total) if total else 0.0
+
+    _FINGERPRINT_BACKFILL_KEY = "fingerprint_backfill"
+
+    def start_fingerprint_backfill(self) -> bool:
+        """
+        在后台线程给缺指纹的记忆补齐近重复指纹（升级或指纹算法变化后跑一次，按 rowid 检查点续跑）
 
+        Returns:
+            本次是否启动了新的补齐线程
+        """
+        conn = self._get_connection()
+        state = self._get_meta(conn.cursor(), self._FINGERPRINT_BACKFILL_KEY)
+        conn.close()
+        if state and state.get("done"):
+            self._fingerprint_backfill["state"] = "done"
+            return False
+        if self._fingerprint_backfill_thread is not None and self._fingerprint_backfill_thread.is_alive():
+            return False
+        self._fingerprint_backfill_stop.clear()
+        self._fingerprint_backfill_thread = Thread(
+            target=self._backfill_fingerprints, name="memory-fingerprint-backfill", daemon=True
+        )
+        self._fingerprint_backfill_thread.start()
+        return True
+
+    def _backfill_fingerprints(self, chunk_size: int = 200) -> Dict:
+        """
+        按 rowid 分块补齐缺失的指纹，最后清理孤儿指纹。
+        指纹在事务外计算；写入前在 BEGIN IMMEDIATE 内重新核对行仍存在、内容未变且仍缺指纹。
+        """
+        progress = self._fingerprint_backfill
         conn = self._get_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT id, content, metadata
-            FROM semantic_memories
-            WHERE user_id = ? AND memory_type = ?
-            ORDER BY created_at DESC
-            LIMIT 200
-            """,
-            (user_id, memory_type),
+        try:
+            state = self._get_meta(cursor, self._FINGERPRINT_BACKFILL_KEY) or {}
+            if state.get("done"):
+                progress["state"] = "done"
+                return dict(progress)
+            last_rowid = int(state.get("last_rowid", 0))
+            progress.update(state="running", last_rowid=last_rowid)
+            while not self._fingerprint_backfill_stop.is_set():
+                cursor.execute(
+                    "SELECT rowid, id, content FROM semantic_memories WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, chunk_size),
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                fingerprints = {
+                    row["id"]: (row["content"], self.near_duplicates.fingerprint(row["content"] or ""))
+                    for row in rows
+                }
+                ids = list(fingerprints)
+                placeholders = ",".join("?" for _ in ids)
+
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(
+                    f"""
+                    SELECT m.id, m.user_id, m.memory_type, m.content FROM semantic_memories m
+                    LEFT JOIN memory_fingerprints f ON f.memory_id = m.id
+                    WHERE m.id IN ({placeholders}) AND f.memory_id IS NULL
+                    """,
+                    ids,
+                )
+                added = 0
+                for row in cursor.fetchall():
+                    content, fingerprint = fingerprints[row["id"]]
+                    if row["content"] != content or fingerprint is None:
+                        continue
+                    self.near_duplicates.add(
+                        cursor, row["user_id"], row["id"], row["memory_type"] or "", content or "", fingerprint
+                    )
+                    added += 1
+                last_rowid = int(rows[-1]["rowid"])
+                self._set_meta(cursor, self._FINGERPRINT_BACKFILL_KEY, {"last_rowid": last_rowid})
+                conn.commit()
+                progress.update(
+                    processed=progress["processed"] + len(rows),
+                    added=progress["added"] + added,
+                    last_rowid=last_rowid,
+                )
+
+            if self._fingerprint_backfill_stop.is_set():
+                progress["state"] = "interrupted"
+                return dict(progress)
+
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(
+                """
+                SELECT f.memory_id FROM memory_fingerprints f
+                LEFT JOIN semantic_memories m ON m.id = f.memory_id
+                WHERE m.id IS NULL
+                """
+            )
+            self.near_duplicates.remove(cursor, [row["memory_id"] for row in cursor.fetchall()])
+            self._set_meta(cursor, self._FINGERPRINT_BACKFILL_KEY, {"done": True})
+            conn.commit()
+            progress["state"] = "done"
+            logger.info(f"近重复指纹补齐完成: 检查 {progress['processed']} 条，补齐 {progress['added']} 条")
+        except Exception as e:
+            conn.rollback()
+            progress.update(state="failed", error=str(e))
+            logger.error(f"补齐近重复指纹失败: {e}")
+        finally:
+            conn.close()
+        return dict(progress)
+
+    def _find_duplicate_memory(
+        self,
+        user_id: str,
+        content: str,
+        memory_type: str,
+        fingerprint=None,
+    ) -> Optional[Tuple[str, str]]:
+        """
+        经 LSH 桶取少量候选，再用 _text_similarity 校验，
+        校验条数和耗时都有上限，与语料规模无关。
+        """
+        fingerprint = fingerprint or self.near_duplicates.fingerprint(content)
+        if fingerprint is None:
+            return None
+        duplicate_threshold = self._duplicate_threshold()
+        max_candidates, budget = self._duplicate_budget()
+
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        candidates = self.near_duplicates.candidates(
+            cursor, user_id, memory_type, fingerprint, limit=max_candidates
         )
-        rows = cursor.fetchall()
+        rows_by_id = {}
+        if candidates:
+            placeholders = ",".join("?" for _ in candidates)
+            cursor.execute(
+                f"SELECT id, content, metadata FROM semantic_memories WHERE id IN ({placeholders})",
+                [memory_id for memory_id, _ in candidates],
+            )
+            rows_by_id = {row["id"]: row for row in cursor.fetchall()}
         conn.close()
 
-        for row in rows:
-            existing_content = row["content"] or ""
-            similarity = self._text_similarity(existing_content, content)
-            if similarity >= duplicate_threshold:
+        deadline = time.monotonic() + budget
+        for memory_id, _ in candidates:
+            row = rows_by_id.get(memory_id)
+            if row is None:
+                continue
+            if self._similar_at_least(row["content"] or "", content, duplicate_threshold):
                 return row["id"], row["metadata"]
+            if time.monotonic() > deadline:
+                logger.debug(f"Duplicate verification budget exhausted for {user_id}")
+                break
         return None
 
     @staticmethod
@@ -451,17 +1108,23 @@ class MemoryManager:
                 access_count = max(0, int(row.get("access_count", 0)))
             except Exception:
                 access_count = 0
-            metadata = MemoryManager._parse_metadata(row.get("metadata"))
-            stale, stale_penalty = MemoryManager._memory_staleness(
-                row.get("memory_type", ""), row.get("created_at"), metadata
-            )
-            conflict_penalty = 0.12 if metadata.get("conflict_status") == "pending_review" else 0.0
+            if "expires_at" in row:
+                # 来自索引列，无需再解析 metadata JSON
+                expires_at = row.pop("expires_at")
+                conflict_status = row.get("conflict_status")
+            else:
+                metadata = MemoryManager._parse_metadata(row.get("metadata"))
+                freshness = metadata.get("freshness")
+                expires_at = freshness.get("expires_at") if isinstance(freshness, dict) else None
+                conflict_status = metadata.get("conflict_status")
+            stale, stale_penalty = MemoryManager._staleness(row.get("memory_type", ""), row.get("created_at"), expires_at)
+            conflict_penalty = 0.12 if conflict_status == "pending_review" else 0.0
 
             importance_boost = (importance / 10.0) * 0.15
             recency_boost = MemoryManager._recency_score(row.get("created_at")) * 0.15
             access_boost = min(0.05, np.log1p(access_count) * 0.01)
             row["stale"] = stale
-            row["conflict_status"] = metadata.get("conflict_status")
+            row["conflict_status"] = conflict_status
             row["final_score"] = base + importance_boost + recency_boost + access_boost - stale_penalty - conflict_penalty
             reranked.append(row)
 
@@ -476,142 +1139,384 @@ class MemoryManager:
         metadata: Optional[Dict] = None
     ) -> str:
         """Save a memory with deduplication and importance scoring."""
-        import uuid
-        self._ensure_embedding_ready()
+        return await self._executor.run_io(self._save_memory_sync, user_id, content, memory_type, metadata)
 
-        now_dt = datetime.now()
-        metadata = metadata if isinstance(metadata, dict) else {}
-        metadata = self._apply_freshness_metadata(memory_type, metadata, now_dt)
+    def _save_memory_sync(
+        self,
+        user_id: str,
+        content: str,
+        memory_type: str = "conversation",
+        metadata: Optional[Dict] = None
+    ) -> str:
+        memory_ids = self._save_memories_bulk_sync(
+            user_id,
+            [{"content": content, "memory_type": memory_type, "metadata": metadata}],
+        )
+        return memory_ids[0]
 
-        duplicate = self._find_duplicate_memory(user_id, content, memory_type)
-        if duplicate:
-            memory_id, existing_meta_raw = duplicate
-            merged_meta = self._parse_metadata(existing_meta_raw)
-            merged_meta.update(metadata)
-            merged_meta = self._apply_freshness_metadata(memory_type, merged_meta, now_dt)
-            merged_meta["last_seen_at"] = now_dt.isoformat()
-            merged_meta["duplicate_hits"] = int(merged_meta.get("duplicate_hits", 0)) + 1
+    @staticmethod
+    def _merge_duplicate_metadata(existing: Dict, incoming: Dict, memory_type: str, now_dt: datetime) -> Dict:
+        merged_meta = dict(existing or {})
+        merged_meta.update(incoming)
+        merged_meta = MemoryManager._apply_freshness_metadata(memory_type, merged_meta, now_dt)
+        merged_meta["last_seen_at"] = now_dt.isoformat()
+        merged_meta["duplicate_hits"] = int(merged_meta.get("duplicate_hits", 0)) + 1
+        return merged_meta
 
-            importance = self._estimate_importance(memory_type, content, merged_meta)
-            now = now_dt.isoformat()
+    @staticmethod
+    def _mark_conflict(metadata: Dict, other_id: str, memory_type: str, now_dt: Optional[datetime] = None) -> Dict:
+        marked = dict(metadata or {})
+        marked["conflict_status"] = "pending_review"
+        marked["conflict_with"] = sorted(set(list(marked.get("conflict_with", [])) + [other_id]))
+        if now_dt is not None:
+            marked = MemoryManager._apply_freshness_metadata(memory_type, marked, now_dt)
+        return marked
+
+    def _embed_texts(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """经嵌入缓存生成向量，只对未命中的文本调用模型"""
+        model = self.embedding_model
+        return self.embedding_cache.encode(
+            self.embedding_cache_name,
+            texts,
+            lambda batch: self._executor.cpu_call(model.encode, batch),
+            batch_size=batch_size or self.embedding_batch_size,
+        )
 
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                UPDATE semantic_memories
-                SET metadata = ?,
-                    importance = ?,
-                    last_accessed_at = ?,
-                    updated_at = ?
-                WHERE id = ?
-                """,
-                (json.dumps(merged_meta) if merged_meta else None, importance, now, now, memory_id),
-            )
-            conn.commit()
-            conn.close()
+    def _embed_query(self, text: str) -> np.ndarray:
+        return self._embed_texts([text])[0]
 
-            logger.info(f"Duplicate memory hit; updated existing record: {memory_id} (user: {user_id})")
-            return memory_id
+    def _encode_batched(self, texts: List[str], batch_size: int) -> Optional[np.ndarray]:
+        """批量生成嵌入向量，失败时返回 None"""
+        if not texts or not self.embedding_model or not (self.vector_store or self._reembed_shadow):
+            return None
+        try:
+            return self._embed_texts(texts, batch_size=batch_size)
+        except Exception as e:
+            logger.error(f"Failed to generate embedding vector: {e}")
+            return None
 
-        memory_id = f"mem_{uuid.uuid4().hex[:12]}"
-        conflict = self._find_conflicting_memory(user_id, content, memory_type)
-        if conflict:
-            conflict_id, existing_conflict_meta, _ = conflict
-            metadata["conflict_status"] = "pending_review"
-            metadata["conflict_with"] = sorted(
-                set(list(metadata.get("conflict_with", [])) + [conflict_id])
-            )
-            signature = self._extract_fact_signature(content)
-            if signature:
-                metadata["conflict_key"] = signature[0]
-
-            existing_conflict_meta = dict(existing_conflict_meta or {})
-            existing_conflict_meta["conflict_status"] = "pending_review"
-            linked = set(existing_conflict_meta.get("conflict_with", []))
-            linked.add(memory_id)
-            existing_conflict_meta["conflict_with"] = sorted(linked)
-            existing_conflict_meta = self._apply_freshness_metadata(
-                memory_type, existing_conflict_meta, now_dt
-            )
+    async def save_memories_bulk(
+        self,
+        user_id: str,
+        items: List[Dict],
+        batch_size: int = 64,
+        sync_markdown: bool = True,
+    ) -> List[str]:
+        """
+        批量保存记忆
 
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                UPDATE semantic_memories
-                SET metadata = ?, updated_at = ?
-                WHERE id = ?
-                """,
-                (json.dumps(existing_conflict_meta), now_dt.isoformat(), conflict_id),
-            )
-            conn.commit()
-            conn.close()
+        去重与冲突检测同时覆盖本批次和已有记忆；嵌入按批编码；
+        所有行、全文索引和倒排索引在一个事务内写入，向量索引只落盘一次。
 
-        importance = self._estimate_importance(memory_type, content, metadata)
+        Args:
+            user_id: 用户 ID
+            items: [{"content": str, "memory_type": str, "metadata": dict}, ...]
+            batch_size: 每批编码条数
+            sync_markdown: 是否同步写入 Markdown 记忆文件（从 Markdown 导入时关闭）
 
-        embedding_index = None
-        if self.embedding_model and self.index:
-            try:
-                embedding = self.embedding_model.encode(content)
-                embedding = np.array([embedding]).astype('float32')
-                self.index.add(embedding)
-                embedding_index = self.index.ntotal - 1
-                faiss.write_index(self.index, str(self.index_path))
-            except Exception as e:
-                logger.error(f"Failed to generate embedding vector: {e}")
+        Returns:
+            与 items 一一对应的记忆 ID（重复项返回被合并的记忆 ID）
+        """
+        return await self._executor.run_io(
+            self._save_memories_bulk_sync, user_id, items, batch_size, sync_markdown,
+        )
+
+    def _save_memories_bulk_sync(
+        self,
+        user_id: str,
+        items: List[Dict],
+        batch_size: int = 64,
+        sync_markdown: bool = True,
+    ) -> List[str]:
+        import uuid
+        self._ensure_embedding_ready()
 
+        now_dt = datetime.now()
         now = now_dt.isoformat()
+        result_ids: List[Optional[str]] = [None] * len(items)
+        new_entries: List[Dict] = []
+        # memory_id -> {"metadata": dict, "importance": Optional[int]}
+        existing_updates: Dict[str, Dict] = {}
+        existing_meta_cache: Dict[str, Dict] = {}
+
+        def existing_meta(memory_id: str, raw) -> Dict:
+            if memory_id in existing_updates:
+                return existing_updates[memory_id]["metadata"]
+            if memory_id not in existing_meta_cache:
+                existing_meta_cache[memory_id] = self._parse_metadata(raw)
+            return existing_meta_cache[memory_id]
+
+        duplicate_threshold = self._duplicate_threshold()
+        max_candidates, _ = self._duplicate_budget()
+        batch_lsh = InMemoryLSH()
+        for position, item in enumerate(items):
+            content = item.get("content") or ""
+            memory_type = item.get("memory_type") or "conversation"
+            metadata = item.get("metadata") if isinstance(item.get("metadata"), dict) else {}
+            metadata = self._apply_freshness_metadata(memory_type, metadata, now_dt)
+            fingerprint = self.near_duplicates.fingerprint(content)
+
+            batch_duplicate = None
+            if fingerprint is not None:
+                for entry_position in batch_lsh.candidates(memory_type, fingerprint, limit=max_candidates):
+                    entry = new_entries[entry_position]
+                    if self._similar_at_least(entry["content"], content, duplicate_threshold):
+                        batch_duplicate = entry
+                        break
+            if batch_duplicate:
+                batch_duplicate["metadata"] = self._merge_duplicate_metadata(
+                    batch_duplicate["metadata"], metadata, memory_type, now_dt
+                )
+                batch_duplicate["importance"] = self._estimate_importance(
+                    memory_type, content, batch_duplicate["metadata"]
+                )
+                result_ids[position] = batch_duplicate["id"]
+                continue
+
+            duplicate = self._find_duplicate_memory(user_id, content, memory_type, fingerprint)
+            if duplicate:
+                memory_id, existing_meta_raw = duplicate
+                merged_meta = self._merge_duplicate_metadata(
+                    existing_meta(memory_id, existing_meta_raw), metadata, memory_type, now_dt
+                )
+                existing_updates[memory_id] = {
+                    "metadata": merged_meta,
+                    "importance": self._estimate_importance(memory_type, content, merged_meta),
+                }
+                result_ids[position] = memory_id
+                logger.info(f"Duplicate memory hit; updated existing record: {memory_id} (user: {user_id})")
+                continue
+
+            memory_id = f"mem_{uuid.uuid4().hex[:12]}"
+            signature = self._extract_fact_signature(content)
+            conflict_with: List[str] = []
+
+            conflict = self._find_conflicting_memory(user_id, content, memory_type, signature)
+            if conflict:
+                conflict_id, existing_conflict_meta, _ = conflict
+                conflict_with.append(conflict_id)
+                marked = self._mark_conflict(
+                    existing_meta(conflict_id, existing_conflict_meta), memory_id, memory_type, now_dt
+                )
+                marked.setdefault("conflict_key", signature[0])
+                previous = existing_updates.get(conflict_id, {})
+                existing_updates[conflict_id] = {"metadata": marked, "importance": previous.get("importance")}
+
+            if signature:
+                for entry in new_entries:
+                    other = entry["signature"]
+                    if (
+                        entry["memory_type"] == memory_type
+                        and other
+                        and other[0] == signature[0]
+                        and other[1] != signature[1]
+                    ):
+                        conflict_with.append(entry["id"])
+                        entry["metadata"] = self._mark_conflict(entry["metadata"], memory_id, memory_type)
+                        entry["metadata"].setdefault("conflict_key", other[0])
+
+            if conflict_with:
+                for other_id in conflict_with:
+                    metadata = self._mark_conflict(metadata, other_id, memory_type)
+                if signature:
+                    metadata["conflict_key"] = signature[0]
+
+            if fingerprint is not None:
+                batch_lsh.add(len(new_entries), memory_type, fingerprint)
+            new_entries.append({
+                "id": memory_id,
+                "content": content,
+                "memory_type": memory_type,
+                "metadata": metadata,
+                "signature": signature,
+                "fingerprint": fingerprint,
+                "importance": self._estimate_importance(memory_type, content, metadata),
+            })
+            result_ids[position] = memory_id
+
+        embeddings = self._encode_batched([entry["content"] for entry in new_entries], batch_size)
+
         conn = self._get_connection()
         cursor = conn.cursor()
+        for memory_id, update in existing_updates.items():
+            if update.get("importance") is not None:
+                cursor.execute(
+                    """
+                    UPDATE semantic_memories
+                    SET metadata = ?,
+                        importance = ?,
+                        last_accessed_at = ?,
+                        updated_at = ?
+                    WHERE id = ?
+                    """,
+                    (json.dumps(update["metadata"]) if update["metadata"] else None,
+                     update["importance"], now, now, memory_id),
+                )
+            else:
+                cursor.execute(
+                    """
+                    UPDATE semantic_memories
+                    SET metadata = ?, updated_at = ?
+                    WHERE id = ?
+                    """,
+                    (json.dumps(update["metadata"]), now, memory_id),
+                )
 
-        cursor.execute("""
-            INSERT INTO semantic_memories
-            (id, user_id, content, embedding_index, memory_type, importance, metadata, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            memory_id,
-            user_id,
-            content,
-            embedding_index,
-            memory_type,
-            importance,
-            json.dumps(metadata) if metadata else None,
-            now,
-            now,
-        ))
-
-        cursor.execute("""
-            INSERT INTO semantic_memories_fts(id, content)
-            VALUES (?, ?)
-        """, (memory_id, content))
+        vector_rowids: List[int] = []
+        for entry in new_entries:
+            cursor.execute("""
+                INSERT INTO semantic_memories
+                (id, user_id, content, memory_type, importance, metadata, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                entry["id"],
+                user_id,
+                entry["content"],
+                entry["memory_type"],
+                entry["importance"],
+                json.dumps(entry["metadata"]) if entry["metadata"] else None,
+                now,
+                now,
+            ))
+            if embeddings is not None:
+                vector_rowids.append(int(cursor.lastrowid))
+
+            self._index_keywords(cursor, user_id, entry["id"], entry["content"])
+            if entry["signature"]:
+                cursor.execute(
+                    """
+                    INSERT OR REPLACE INTO memory_facts (memory_id, user_id, memory_type, fact_key, fact_value)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (entry["id"], user_id, entry["memory_type"], entry["signature"][0], entry["signature"][1]),
+                )
+            self.near_duplicates.add(
+                cursor, user_id, entry["id"], entry["memory_type"], entry["content"], entry["fingerprint"]
+            )
 
         conn.commit()
         conn.close()
 
-        if self.markdown_memory:
+        if embeddings is not None and vector_rowids:
             try:
-                if memory_type == "conversation":
-                    self.markdown_memory.save_daily_log(
-                        content=content,
-                        log_type="conversation"
-                    )
-                else:
-                    tags = []
-                    if metadata and "tags" in metadata:
-                        tags = metadata["tags"]
-                    self.markdown_memory.save_memory(
-                        content=content,
-                        memory_type=memory_type,
-                        tags=tags
-                    )
-                logger.info("Memory synchronized to Markdown files")
+                self._add_vectors(user_id, vector_rowids, embeddings)
             except Exception as e:
-                logger.error(f"Failed to save Markdown memory: {e}")
+                logger.error(f"Failed to index embedding vector: {e}")
+            else:
+                # 向量写入成功后才标记 embedding_index；失败时保持 NULL，由 rebuild_vector_index 补齐
+                conn = self._get_connection()
+                conn.executemany(
+                    "UPDATE semantic_memories SET embedding_index = rowid WHERE rowid = ?",
+                    [(rowid,) for rowid in vector_rowids],
+                )
+                conn.commit()
+                conn.close()
+        self.recall_cache.bump(user_id)
+
+        if sync_markdown:
+            for entry in new_entries:
+                self._sync_markdown(entry["content"], entry["memory_type"], entry["metadata"])
+
+        for entry in new_entries:
+            logger.info(f"Saved memory: {entry['id']} (user: {user_id})")
+        return result_ids
+
+    def _sync_markdown(self, content: str, memory_type: str, metadata: Optional[Dict]):
+        if not self.markdown_memory:
+            return
+        target = self.markdown_writer or self.markdown_memory
+        try:
+            if memory_type == "conversation":
+                target.save_daily_log(
+                    content=content,
+                    log_type="conversation"
+                )
+            else:
+                tags = []
+                if metadata and "tags" in metadata:
+                    tags = metadata["tags"]
+                target.save_memory(
+                    content=content,
+                    memory_type=memory_type,
+                    tags=tags
+                )
+            logger.debug("Memory synchronized to Markdown files")
+        except Exception as e:
+            logger.error(f"Failed to save Markdown memory: {e}")
 
-        logger.info(f"Saved memory: {memory_id} (user: {user_id})")
-        return memory_id
+    def flush_markdown(self, timeout: float = 5.0) -> bool:
+        """等待异步 Markdown 镜像写完（读取/覆盖 Markdown 文件前调用）"""
+        if not self.markdown_writer:
+            return True
+        return self.markdown_writer.flush(timeout)
 
+    async def flush_markdown_async(self, timeout: float = 5.0) -> bool:
+        """flush_markdown 的异步版本，在 IO 线程池里等待，不阻塞事件循环"""
+        return await self._executor.run_io(self.flush_markdown, timeout)
+
+    async def search_markdown(
+        self, query: str, memory_type: Optional[str] = None, include_archives: bool = True
+    ) -> Dict:
+        """在 IO 线程池里检索 MEMORY.md 分段和压缩归档"""
+        return await self._executor.run_io(self._search_markdown_sync, query, memory_type, include_archives)
+
+    def _search_markdown_sync(self, query: str, memory_type: Optional[str], include_archives: bool) -> Dict:
+        self.flush_markdown()
+        results = self.markdown_memory.search_memories(
+            query, memory_type=memory_type, include_archives=include_archives
+        )
+        return {
+            "results": results,
+            "archive": self.markdown_memory.get_archive_stats() if include_archives else None,
+        }
+
+    async def read_markdown(self) -> Dict:
+        """在 IO 线程池里读取并解析 MEMORY.md"""
+        return await self._executor.run_io(self._read_markdown_sync)
+
+    def _read_markdown_sync(self) -> Dict:
+        self.flush_markdown()
+        return {
+            "content": self.markdown_memory.read_memory(),
+            "memories": self.markdown_memory.parse_memories(),
+            "file_path": str(self.markdown_memory.memory_file),
+        }
+
+    async def compress_markdown_logs(self, days: int = 30) -> Dict:
+        """在 IO 线程池里把旧的每日日志压缩归档"""
+        return await self._executor.run_io(self._compress_markdown_logs_sync, days)
+
+    def _compress_markdown_logs_sync(self, days: int) -> Dict:
+        self.flush_markdown()
+        archived = self.markdown_memory.compress_logs(days=days)
+        return {"archived": archived, "stats": self.markdown_memory.get_archive_stats()}
+
+    async def import_markdown_memories(self, user_id: str, batch_size: int = 64) -> Dict:
+        """把 MEMORY.md 中的条目批量导入记忆库（不回写 Markdown）"""
+        return await self._executor.run_io(self._import_markdown_memories_sync, user_id, batch_size)
+
+    def _import_markdown_memories_sync(self, user_id: str, batch_size: int = 64) -> Dict:
+        if not self.markdown_memory:
+            return {"parsed": 0, "imported": 0}
+        self.flush_markdown()
+        entries = self.markdown_memory.parse_memories()
+        items = [
+            {
+                "content": entry["content"],
+                "memory_type": entry["type"],
+                "metadata": {
+                    "source": "markdown_import",
+                    "markdown_id": entry["id"],
+                    "tags": entry.get("tags", []),
+                },
+            }
+            for entry in entries
+            if (entry.get("content") or "").strip()
+        ]
+        memory_ids = self._save_memories_bulk_sync(
+            user_id, items, batch_size=batch_size, sync_markdown=False
+        )
+        return {"parsed": len(entries), "imported": len(set(memory_ids))}
 
     async def search_memories(
         self,
@@ -635,18 +1540,45 @@ class MemoryManager:
             similarity_threshold: 相似度阈值 (仅向量搜索)
             use_hybrid: 是否使用混合搜索 (False 则仅向量搜索)
         """
-        self._ensure_embedding_ready()
+        return await self._executor.run_io(
+            self._search_memories_sync, user_id, query, top_k, memory_type, similarity_threshold, use_hybrid,
+        )
 
-        # 如果启用了混合搜索服务，使用新的混合搜索
-        if use_hybrid and self.hybrid_search and HYBRID_SEARCH_AVAILABLE:
-            return await self._hybrid_search_v2(
+    def _search_memories_sync(
+        self,
+        user_id: str,
+        query: str,
+        top_k: int = 5,
+        memory_type: Optional[str] = None,
+        similarity_threshold: float = 0.3,  # 降低阈值，提高召回率
+        use_hybrid: bool = True
+    ) -> List[Dict]:
+        # 不等模型：未预热完成时本次只用关键词召回
+        self._ensure_embedding_ready(wait=False)
+
+        hybrid = bool(use_hybrid and self.hybrid_search and HYBRID_SEARCH_AVAILABLE)
+        cache_key = RecallCache.make_key(user_id, query, memory_type, top_k, similarity_threshold, hybrid)
+        cached = self.recall_cache.get(cache_key)
+        if cached is not None:
+            # 命中缓存也要记访问次数，和真实检索保持一致
+            self._update_access_stats([r["id"] for r in cached])
+            return cached
+
+        # 先取代数再检索：检索期间发生写入时，结果不会被缓存
+        generation = self.recall_cache.generation(user_id)
+        started = time.perf_counter()
+        if hybrid:
+            # 如果启用了混合搜索服务，使用新的混合搜索
+            results = self._hybrid_search_v2(
                 user_id, query, top_k, memory_type, similarity_threshold
             )
-
-        # Fallback 到原有实现
-        return await self._search_memories_legacy(
-            user_id, query, top_k, memory_type, similarity_threshold
-        )
+        else:
+            # Fallback 到原有实现
+            results = self._search_memories_legacy(
+                user_id, query, top_k, memory_type, similarity_threshold
+            )
+        self.recall_cache.put(cache_key, results, generation, time.perf_counter() - started)
+        return results
 
     async def search_memory_snippets(
         self,
@@ -654,13 +1586,29 @@ class MemoryManager:
         query: str,
         top_k: int = 5,
         memory_type: Optional[str] = None,
-        use_hybrid: bool = True
+        use_hybrid: bool = True,
+        with_detail: bool = False,
     ) -> List[Dict]:
         """
         Two-stage memory recall - stage 1 (search):
         Return compact snippets and ids; full content should be fetched via get_memory_detail.
+        With ``with_detail`` each snippet also carries the full memory under ``"memory"``,
+        built from the rows the search already loaded, so callers skip stage 2.
         """
-        results = await self.search_memories(
+        return await self._executor.run_io(
+            self._search_memory_snippets_sync, user_id, query, top_k, memory_type, use_hybrid, with_detail,
+        )
+
+    def _search_memory_snippets_sync(
+        self,
+        user_id: str,
+        query: str,
+        top_k: int = 5,
+        memory_type: Optional[str] = None,
+        use_hybrid: bool = True,
+        with_detail: bool = False,
+    ) -> List[Dict]:
+        results = self._search_memories_sync(
             user_id=user_id,
             query=query,
             top_k=top_k,
@@ -679,8 +1627,31 @@ class MemoryManager:
                 "source": row.get("source", "memory"),
                 "created_at": row.get("created_at"),
             })
+        if with_detail:
+            # 检索结果里缺库行的（向量命中但行已不在）再补一次批量查询
+            missing = [row["id"] for row in results if row.get("updated_at") is None]
+            fetched = {detail["id"]: detail for detail in self._get_memory_details_sync(user_id, missing)}
+            for snippet, row in zip(snippets, results):
+                snippet["memory"] = (
+                    fetched.get(row["id"]) if row.get("updated_at") is None else self._memory_detail(row)
+                )
         return snippets
 
+    @staticmethod
+    def _memory_detail(row) -> Dict:
+        """get_memory_detail 的返回结构；row 可以是 sqlite3.Row 或检索结果 dict"""
+        metadata = row["metadata"]
+        return {
+            "id": row["id"],
+            "content": row["content"],
+            "memory_type": row["memory_type"],
+            "importance": row["importance"],
+            "access_count": row["access_count"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "metadata": dict(metadata) if isinstance(metadata, dict) else MemoryManager._parse_metadata(metadata),
+        }
+
     async def get_memory_detail(
         self,
         user_id: str,
@@ -690,29 +1661,124 @@ class MemoryManager:
         Two-stage memory recall - stage 2 (get):
         Fetch full memory detail by id.
         """
+        return await self._executor.run_io(self._get_memory_detail_sync, user_id, memory_id)
+
+    def _get_memory_detail_sync(
+        self,
+        user_id: str,
+        memory_id: str,
+    ) -> Optional[Dict]:
+        details = self._get_memory_details_sync(user_id, [memory_id])
+        return details[0] if details else None
+
+    async def get_memory_details(
+        self,
+        user_id: str,
+        memory_ids: List[str],
+    ) -> List[Dict]:
+        """
+        Batch stage 2: fetch many memories in one query.
+        Results follow the order of ``memory_ids``; unknown ids and other users' memories are skipped.
+        """
+        return await self._executor.run_io(self._get_memory_details_sync, user_id, memory_ids)
+
+    def _get_memory_details_sync(
+        self,
+        user_id: str,
+        memory_ids: List[str],
+    ) -> List[Dict]:
+        wanted = list(dict.fromkeys(memory_id for memory_id in memory_ids if memory_id))
+        if not wanted:
+            return []
         conn = self._get_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM semantic_memories WHERE id = ? AND user_id = ? LIMIT 1",
-            (memory_id, user_id),
-        )
-        row = cursor.fetchone()
+        rows = {}
+        for start in range(0, len(wanted), 500):
+            chunk = wanted[start:start + 500]
+            cursor.execute(
+                f"SELECT * FROM semantic_memories WHERE user_id = ? AND id IN ({','.join('?' * len(chunk))})",
+                [user_id, *chunk],
+            )
+            rows.update((row["id"], row) for row in cursor.fetchall())
         conn.close()
-        if not row:
-            return None
-        metadata = self._parse_metadata(row["metadata"])
-        return {
-            "id": row["id"],
-            "content": row["content"],
-            "memory_type": row["memory_type"],
-            "importance": row["importance"],
-            "access_count": row["access_count"],
-            "created_at": row["created_at"],
-            "updated_at": row["updated_at"],
-            "metadata": metadata,
-        }
+        details = [self._memory_detail(rows[memory_id]) for memory_id in wanted if memory_id in rows]
+        self._overlay_pending_access(details)
+        return details
+
+    def _overlay_pending_access(self, memories: List[Dict]):
+        """加上尚未落盘的访问次数，让读接口看到的 access_count 与同步写入时一致"""
+        pending = self.access_stats.pending(memory["id"] for memory in memories)
+        for memory in memories:
+            memory["access_count"] = (memory.get("access_count") or 0) + pending.get(memory["id"], 0)
+
+    @staticmethod
+    def _candidate_pool_size(top_k: int) -> int:
+        try:
+            pool = int(os.getenv("MEMORY_CANDIDATE_POOL", "50"))
+        except ValueError:
+            pool = 50
+        return max(pool, top_k * 4)
+
+    @staticmethod
+    def _fts_candidates(
+        cursor: sqlite3.Cursor,
+        user_id: str,
+        query: str,
+        memory_type: Optional[str],
+        limit: int,
+    ) -> List[Tuple[int, float]]:
+        """
+        Top-N FTS5 matches (any query token) for one user as ``(rowid, bm25 rank)``, best first.
 
-    async def _hybrid_search_v2(
+        Tokens the trigram index cannot match (两字中文词、"Go" 等) are looked
+        up in the unicode61 terms table.
+        """
+        if build_fts_query is None:
+            return []
+        tokenizer = fts_tokenizer()
+        fts_query = build_fts_query(query, operator="OR", tokenizer=tokenizer)
+        try:
+            hits = search_fts(cursor, fts_query, user_id, memory_type, limit)
+            short_terms = short_fts_terms(query, tokenizer=tokenizer)
+            if short_terms:
+                ranks = dict(hits)
+                short_hits = search_fts(
+                    cursor, terms_query(short_terms), user_id, memory_type, limit, table=FTS_TERMS_TABLE,
+                )
+                for rowid, rank in short_hits:
+                    ranks[rowid] = min(rank, ranks.get(rowid, 0.0))
+                hits = sorted(ranks.items(), key=lambda item: item[1])[:limit]
+            return hits
+        except sqlite3.Error as e:
+            logger.warning(f"FTS candidate query failed: {e}")
+            return []
+
+    @staticmethod
+    def _fetch_candidate_rows(
+        cursor: sqlite3.Cursor,
+        user_id: str,
+        memory_type: Optional[str],
+        vector_ids: List[int],
+        rowids: List[int],
+    ) -> List[sqlite3.Row]:
+        clauses = []
+        params: List = [user_id]
+        if vector_ids:
+            clauses.append(f"embedding_index IN ({','.join(['?'] * len(vector_ids))})")
+            params.extend(vector_ids)
+        if rowids:
+            clauses.append(f"rowid IN ({','.join(['?'] * len(rowids))})")
+            params.extend(rowids)
+        if not clauses:
+            return []
+        sql = f"SELECT rowid, * FROM semantic_memories WHERE user_id = ? AND ({' OR '.join(clauses)})"
+        if memory_type:
+            sql += " AND memory_type = ?"
+            params.append(memory_type)
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+    def _hybrid_search_v2(
         self,
         user_id: str,
         query: str,
@@ -720,47 +1786,56 @@ class MemoryManager:
         memory_type: Optional[str],
         min_score: float
     ) -> List[Dict]:
-        """Hybrid search with LIKE fallback and reranking."""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        """
+        Hybrid search over a bounded candidate set, with reranking.
 
-        sql = "SELECT * FROM semantic_memories WHERE user_id = ?"
-        params = [user_id]
-        if memory_type:
-            sql += " AND memory_type = ?"
-            params.append(memory_type)
+        Candidates = top-N from the user's vector index + top-N FTS5 matches
+        (+ most recent rows when both are thin), so scoring cost no longer
+        grows with the user's whole corpus. FTS5 matches the hybrid scorer
+        drops are still returned, scored from their BM25 rank.
+        """
+        candidate_limit = self._candidate_pool_size(top_k)
 
-        cursor.execute(sql, params)
-        rows = cursor.fetchall()
+        query_embedding = np.zeros(self.embedding_dim)
+        vector_ids: List[int] = []
+        if self.embedding_model:
+            try:
+                query_embedding = self._embed_query(query)
+                if self.vector_store:
+                    vector_ids = [
+                        vector_id
+                        for vector_id, _ in self._executor.cpu_call(
+                            self.vector_store.search, user_id, query_embedding, candidate_limit
+                        )
+                    ]
+            except Exception as e:
+                logger.error(f"Failed to build query embedding: {e}")
 
-        like_sql = "SELECT * FROM semantic_memories WHERE user_id = ? AND content LIKE ?"
-        like_params = [user_id, f"%{query}%"]
-        if memory_type:
-            like_sql += " AND memory_type = ?"
-            like_params.append(memory_type)
-        like_sql += " LIMIT ?"
-        like_params.append(top_k)
+        conn = self._get_connection()
+        cursor = conn.cursor()
 
-        cursor.execute(like_sql, like_params)
-        like_rows = cursor.fetchall()
-        conn.close()
+        fts_hits = self._fts_candidates(cursor, user_id, query, memory_type, candidate_limit)
+        fts_ranks = dict(fts_hits)
+        rows = self._fetch_candidate_rows(cursor, user_id, memory_type, vector_ids, list(fts_ranks))
+        if len(rows) < top_k:
+            recent_sql = "SELECT rowid, * FROM semantic_memories WHERE user_id = ?"
+            recent_params = [user_id]
+            if memory_type:
+                recent_sql += " AND memory_type = ?"
+                recent_params.append(memory_type)
+            recent_sql += " ORDER BY created_at DESC LIMIT ?"
+            recent_params.append(candidate_limit)
+            cursor.execute(recent_sql, recent_params)
+            rows.extend(cursor.fetchall())
 
-        if not rows and not like_rows:
+        if not rows:
+            conn.close()
             return []
 
         seen_ids = set()
         all_rows = []
-        like_ids = set()
         row_map = {}
 
-        for row in like_rows:
-            rid = row["id"]
-            row_map[rid] = row
-            if rid not in seen_ids:
-                seen_ids.add(rid)
-                all_rows.append(row)
-                like_ids.add(rid)
-
         for row in rows:
             rid = row["id"]
             row_map[rid] = row
@@ -768,9 +1843,16 @@ class MemoryManager:
                 seen_ids.add(rid)
                 all_rows.append(row)
 
+        stored_vectors: Dict[int, np.ndarray] = {}
+        if self.vector_store:
+            stored_vectors = self.vector_store.reconstruct_many(
+                user_id,
+                [row["embedding_index"] for row in all_rows if row["embedding_index"] is not None],
+            )
+
         documents = []
-        document_embeddings = []
-        for row in all_rows:
+        document_embeddings = np.zeros((len(all_rows), self.embedding_dim), dtype="float32")
+        for position, row in enumerate(all_rows):
             documents.append({
                 "id": row["id"],
                 "content": row["content"],
@@ -779,23 +1861,11 @@ class MemoryManager:
             })
 
             embedding_index = row["embedding_index"]
-            if embedding_index is not None and self.index:
-                try:
-                    embedding = self.index.reconstruct(int(embedding_index))
-                    document_embeddings.append(embedding)
-                except Exception:
-                    document_embeddings.append(np.zeros(self.embedding_dim))
-            else:
-                document_embeddings.append(np.zeros(self.embedding_dim))
+            embedding = stored_vectors.get(int(embedding_index)) if embedding_index is not None else None
+            if embedding is not None and len(embedding) == self.embedding_dim:
+                document_embeddings[position] = embedding
 
-        query_embedding = np.zeros(self.embedding_dim)
-        if self.embedding_model:
-            try:
-                query_embedding = self.embedding_model.encode(query)
-            except Exception as e:
-                logger.error(f"Failed to build query embedding: {e}")
-
-        self.hybrid_search.build_bm25_index(documents)
+        self._ensure_keyword_index(conn, user_id)
         results = self.hybrid_search.search(
             query=query,
             query_embedding=query_embedding,
@@ -804,7 +1874,10 @@ class MemoryManager:
             top_k=top_k,
             min_score=min_score,
             use_hybrid=True,
+            cursor=cursor,
+            user_id=user_id,
         )
+        conn.close()
 
         output = []
         result_ids = set()
@@ -822,36 +1895,49 @@ class MemoryManager:
                 "created_at": result.created_at,
                 "importance": db_row["importance"] if db_row else 5,
                 "access_count": db_row["access_count"] if db_row else 0,
+                "updated_at": db_row["updated_at"] if db_row else None,
+                "conflict_status": db_row["conflict_status"] if db_row else None,
+                "expires_at": db_row["expires_at"] if db_row else None,
                 "metadata": metadata,
             })
             result_ids.add(result.id)
 
-        for row in like_rows:
+        keyword_rows = sorted(
+            (row for row in all_rows if int(row["rowid"]) in fts_ranks),
+            key=lambda row: fts_ranks[int(row["rowid"])],
+        )
+        keyword_matches = 0
+        for row in keyword_rows:
             if row["id"] not in result_ids and len(output) < top_k:
+                text_score = bm25_rank_to_score(fts_ranks[int(row["rowid"])])
+                keyword_matches += 1
                 output.append({
                     "id": row["id"],
                     "content": row["content"],
                     "memory_type": row["memory_type"],
-                    "score": 0.9,
+                    "score": text_score,
                     "vector_score": 0.0,
-                    "text_score": 1.0,
-                    "source": "direct_match",
+                    "text_score": text_score,
+                    "source": "keyword",
                     "created_at": row["created_at"],
                     "importance": row["importance"],
                     "access_count": row["access_count"],
+                    "updated_at": row["updated_at"],
                     "metadata": self._parse_metadata(row["metadata"]),
+                    "conflict_status": row["conflict_status"],
+                    "expires_at": row["expires_at"],
                 })
 
         output = self._rerank_results(output, top_k)
         self._update_access_stats([r["id"] for r in output])
 
         logger.info(
-            f"Hybrid search V2 finished: {len(output)} results (direct matches: {len(like_ids)})"
+            f"Hybrid search V2 finished: {len(output)} results (keyword-only matches: {keyword_matches})"
         )
         return output
 
 
-    async def _search_memories_legacy(
+    def _search_memories_legacy(
         self,
         user_id: str,
         query: str,
@@ -862,44 +1948,49 @@ class MemoryManager:
         """Legacy memory search implementation kept as fallback."""
 
         vector_results = []
-        if self.embedding_model and self.index and self.index.ntotal > 0:
+        if self.embedding_model and self.vector_store:
             try:
-                query_embedding = self.embedding_model.encode(query)
-                query_embedding = np.array([query_embedding]).astype('float32')
-
-                distances, indices = self.index.search(query_embedding, min(top_k * 2, self.index.ntotal))
-                similarities = 1 / (1 + distances[0])
-
-                conn = self._get_connection()
-                cursor = conn.cursor()
-
-                for idx, similarity in zip(indices[0], similarities):
-                    if similarity < similarity_threshold:
-                        continue
+                query_embedding = self._embed_query(query)
+                hits = self._executor.cpu_call(self.vector_store.search, user_id, query_embedding, top_k * 2)
+                similarity_by_id = {
+                    vector_id: 1 / (1 + distance)
+                    for vector_id, distance in hits
+                    if 1 / (1 + distance) >= similarity_threshold
+                }
 
-                    cursor.execute(
-                        """
+                rows = []
+                if similarity_by_id:
+                    conn = self._get_connection()
+                    cursor = conn.cursor()
+                    placeholders = ",".join(["?"] * len(similarity_by_id))
+                    sql = f"""
                         SELECT * FROM semantic_memories
-                        WHERE user_id = ? AND embedding_index = ?
-                        """,
-                        (user_id, int(idx)),
-                    )
-
-                    row = cursor.fetchone()
-                    if row:
-                        vector_results.append({
-                            "id": row["id"],
-                            "content": row["content"],
-                            "memory_type": row["memory_type"],
-                            "similarity": float(similarity),
-                            "source": "vector",
-                            "created_at": row["created_at"],
-                            "importance": row["importance"],
-                            "access_count": row["access_count"],
-                            "metadata": self._parse_metadata(row["metadata"]),
-                        })
-
-                conn.close()
+                        WHERE user_id = ? AND embedding_index IN ({placeholders})
+                    """
+                    params = [user_id, *similarity_by_id.keys()]
+                    if memory_type:
+                        sql += " AND memory_type = ?"
+                        params.append(memory_type)
+                    cursor.execute(sql, params)
+                    rows = cursor.fetchall()
+                    conn.close()
+
+                for row in rows:
+                    similarity = similarity_by_id[int(row["embedding_index"])]
+                    vector_results.append({
+                        "id": row["id"],
+                        "content": row["content"],
+                        "memory_type": row["memory_type"],
+                        "similarity": float(similarity),
+                        "source": "vector",
+                        "created_at": row["created_at"],
+                        "importance": row["importance"],
+                        "access_count": row["access_count"],
+                        "updated_at": row["updated_at"],
+                        "metadata": self._parse_metadata(row["metadata"]),
+                        "conflict_status": row["conflict_status"],
+                        "expires_at": row["expires_at"],
+                    })
             except Exception as e:
                 logger.error(f"Vector search failed: {e}")
 
@@ -908,34 +1999,26 @@ class MemoryManager:
             conn = self._get_connection()
             cursor = conn.cursor()
 
-            sql = """
-                SELECT m.*, bm25(semantic_memories_fts) as score
-                FROM semantic_memories_fts f
-                JOIN semantic_memories m ON f.id = m.id
-                WHERE f.content MATCH ? AND m.user_id = ?
-            """
-            params = [query, user_id]
-
-            if memory_type:
-                sql += " AND m.memory_type = ?"
-                params.append(memory_type)
-
-            sql += " ORDER BY score DESC LIMIT ?"
-            params.append(top_k)
-
-            cursor.execute(sql, params)
+            fts_ranks = dict(self._fts_candidates(cursor, user_id, query, memory_type, top_k))
+            keyword_rows = sorted(
+                self._fetch_candidate_rows(cursor, user_id, memory_type, [], list(fts_ranks)),
+                key=lambda row: fts_ranks[int(row["rowid"])],
+            )
 
-            for row in cursor.fetchall():
+            for row in keyword_rows:
                 keyword_results.append({
                     "id": row["id"],
                     "content": row["content"],
                     "memory_type": row["memory_type"],
-                    "similarity": float(row["score"]),
+                    "similarity": bm25_rank_to_score(fts_ranks[int(row["rowid"])]),
                     "source": "keyword",
                     "created_at": row["created_at"],
                     "importance": row["importance"],
                     "access_count": row["access_count"],
+                    "updated_at": row["updated_at"],
                     "metadata": self._parse_metadata(row["metadata"]),
+                    "conflict_status": row["conflict_status"],
+                    "expires_at": row["expires_at"],
                 })
 
             conn.close()
@@ -967,23 +2050,145 @@ class MemoryManager:
 
 
     def _update_access_stats(self, memory_ids: List[str]):
-        """更新访问统计"""
+        """记录访问统计（缓冲后批量写回，见 AccessStatsBuffer）"""
         if not memory_ids:
             return
+        self.access_stats.record(memory_ids)
 
-        conn = self._get_connection()
-        cursor = conn.cursor()
+    _COMPACT_COLUMNS = "rowid, id, content, memory_type, importance, access_count, metadata, created_at, embedding_index"
 
-        placeholders = ",".join(["?"] * len(memory_ids))
-        cursor.execute(f"""
-            UPDATE semantic_memories
-            SET access_count = access_count + 1,
-                last_accessed_at = ?
-            WHERE id IN ({placeholders})
-        """, [datetime.now().isoformat()] + memory_ids)
+    def _compaction_stale(self, row: sqlite3.Row, stale_days: int) -> bool:
+        """低价值、过期且足够老的对话类噪声记忆"""
+        row_meta = self._parse_metadata(row["metadata"])
+        stale, _ = self._memory_staleness(row["memory_type"], row["created_at"], row_meta)
+        if not stale:
+            return False
+        try:
+            created_at = datetime.fromisoformat(str(row["created_at"]).replace("Z", "+00:00"))
+            created_naive = created_at.replace(tzinfo=None) if created_at.tzinfo else created_at
+            age_days = max(0.0, (datetime.now() - created_naive).total_seconds() / 86400.0)
+        except Exception:
+            age_days = float(stale_days) + 1
+
+        low_value = int(row["importance"] or 0) <= 4 and int(row["access_count"] or 0) <= 1
+        noisy_type = (row["memory_type"] or "").lower() in {"conversation", "manual"}
+        return noisy_type and low_value and age_days >= stale_days
+
+    @staticmethod
+    def _compaction_older(row: sqlite3.Row, than: Tuple[Optional[str], int]) -> bool:
+        """row 是否排在 than 之后（created_at DESC, rowid DESC，NULL 在最后）"""
+        created, rowid = row["created_at"], int(row["rowid"])
+        than_created, than_rowid = than
+        if created is None or than_created is None:
+            if created is None and than_created is None:
+                return rowid < than_rowid
+            return created is None
+        created = str(created)
+        than_created = str(than_created)
+        return created < than_created or (created == than_created and rowid < than_rowid)
+
+    def _compaction_chunk(
+        self,
+        cursor: sqlite3.Cursor,
+        user_id: str,
+        position: Optional[Tuple[Optional[str], int]],
+        chunk_size: int,
+    ) -> List[sqlite3.Row]:
+        """按 (created_at DESC, rowid DESC) 做 keyset 分页读取一块"""
+        if position is None:
+            cursor.execute(
+                f"""
+                SELECT {self._COMPACT_COLUMNS} FROM semantic_memories
+                WHERE user_id = ?
+                ORDER BY created_at DESC, rowid DESC
+                LIMIT ?
+                """,
+                (user_id, chunk_size),
+            )
+        elif position[0] is None:
+            cursor.execute(
+                f"""
+                SELECT {self._COMPACT_COLUMNS} FROM semantic_memories
+                WHERE user_id = ? AND created_at IS NULL AND rowid < ?
+                ORDER BY rowid DESC
+                LIMIT ?
+                """,
+                (user_id, position[1], chunk_size),
+            )
+        else:
+            cursor.execute(
+                f"""
+                SELECT {self._COMPACT_COLUMNS} FROM semantic_memories
+                WHERE user_id = ?
+                  AND (created_at < ? OR (created_at = ? AND rowid < ?) OR created_at IS NULL)
+                ORDER BY created_at DESC, rowid DESC
+                LIMIT ?
+                """,
+                (user_id, position[0], position[0], position[1], chunk_size),
+            )
+        return cursor.fetchall()
+
+    def _compaction_candidates(
+        self, cursor: sqlite3.Cursor, user_id: str, memory_ids: List[str], min_shared_bands: int = 1
+    ) -> Dict[str, List[str]]:
+        """一次查询取出一块记忆各自的同桶（同类型）候选，至少共享 min_shared_bands 个桶"""
+        if not memory_ids:
+            return {}
+        placeholders = ",".join("?" for _ in memory_ids)
+        cursor.execute(
+            f"""
+            SELECT b1.memory_id AS source_id, b2.memory_id AS candidate_id
+            FROM memory_lsh_buckets b1
+            JOIN memory_lsh_buckets b2
+              ON b2.user_id = b1.user_id
+             AND b2.memory_type = b1.memory_type
+             AND b2.band_key = b1.band_key
+            WHERE b1.user_id = ? AND b1.memory_id IN ({placeholders}) AND b2.memory_id != b1.memory_id
+            GROUP BY b1.memory_id, b2.memory_id
+            HAVING COUNT(*) >= ?
+            """,
+            [user_id, *memory_ids, max(1, int(min_shared_bands))],
+        )
+        candidates: Dict[str, List[str]] = {}
+        for row in cursor.fetchall():
+            candidates.setdefault(row["source_id"], []).append(row["candidate_id"])
+        return candidates
 
+    def _delete_memory_batch(self, conn: sqlite3.Connection, user_id: str, rows: List[sqlite3.Row]) -> int:
+        """在一个事务内删除一批记忆及其索引项，然后移除向量"""
+        if not rows:
+            return 0
+        cursor = conn.cursor()
+        delete_ids = [row["id"] for row in rows]
+        placeholders = ",".join("?" for _ in delete_ids)
+        cursor.execute(f"DELETE FROM semantic_memories WHERE id IN ({placeholders})", delete_ids)
+        self._unindex_keywords(cursor, user_id, delete_ids)
+        self.near_duplicates.remove(cursor, delete_ids)
         conn.commit()
-        conn.close()
+        self._remove_vectors(user_id, [row["embedding_index"] for row in rows])
+        self.recall_cache.bump(user_id)
+        return len(delete_ids)
+
+    @staticmethod
+    def _estimated_jaccard(signatures: Dict[str, np.ndarray], source_id: str, other_ids: List[str]) -> List[float]:
+        """MinHash 估计的 Jaccard（缺少指纹时返回 1.0，交给精确校验）"""
+        source = signatures.get(source_id)
+        if source is None or not other_ids:
+            return [1.0] * len(other_ids)
+        present = [other_id for other_id in other_ids if other_id in signatures]
+        estimates = {}
+        if present:
+            matrix = np.vstack([signatures[other_id] for other_id in present])
+            estimates = dict(zip(present, (matrix == source).mean(axis=1).tolist()))
+        return [estimates.get(other_id, 1.0) for other_id in other_ids]
+
+    def _compaction_checkpoint_key(self, user_id: str) -> str:
+        return f"compact_checkpoint:{user_id}"
+
+    def get_compaction_progress(self, user_id: str) -> Optional[Dict]:
+        """最近一次（或正在进行的）压缩进度"""
+        progress = self._compaction_progress.get(user_id)
+        return dict(progress) if progress else None
 
     async def compact_memories(
         self,
@@ -991,84 +2196,190 @@ class MemoryManager:
         dedupe_threshold: float = 0.985,
         stale_days: int = 120,
         dry_run: bool = False,
+        chunk_size: int = 500,
+        delete_batch_size: int = 200,
+        resume: bool = True,
+        progress_callback: Optional[Callable[[Dict], None]] = None,
     ) -> Dict:
-        """Compact low-value memories to slow long-term memory corrosion."""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT id, content, memory_type, importance, access_count, metadata, created_at
-            FROM semantic_memories
-            WHERE user_id = ?
-            ORDER BY created_at DESC
-            """,
-            (user_id,),
+        """
+        Compact low-value memories to slow long-term memory corrosion.
+
+        按 (created_at DESC, rowid DESC) 分块流式处理：较新的记忆保留，
+        与其同 LSH 桶、同类型且相似度达到阈值的较旧记忆被去重删除；
+        删除按批提交，每块结束写检查点，中断后可从检查点继续。
+        """
+        return await self._executor.run_io(
+            self._compact_memories_sync,
+            user_id,
+            dedupe_threshold,
+            stale_days,
+            dry_run,
+            chunk_size,
+            delete_batch_size,
+            resume,
+            progress_callback,
         )
-        rows = cursor.fetchall()
 
-        if not rows:
-            conn.close()
-            return {
-                "total_before": 0,
-                "deduplicated": 0,
-                "pruned_stale": 0,
-                "total_after": 0,
-                "dry_run": dry_run,
-            }
+    def _compact_memories_sync(
+        self,
+        user_id: str,
+        dedupe_threshold: float = 0.985,
+        stale_days: int = 120,
+        dry_run: bool = False,
+        chunk_size: int = 500,
+        delete_batch_size: int = 200,
+        resume: bool = True,
+        progress_callback: Optional[Callable[[Dict], None]] = None,
+    ) -> Dict:
+        chunk_size = max(1, int(chunk_size))
+        delete_batch_size = max(1, int(delete_batch_size))
+        checkpoint_key = self._compaction_checkpoint_key(user_id)
+        # 低价值判断依赖 access_count，先把缓冲的访问统计落盘
+        self.access_stats.flush()
 
-        dedupe_delete_ids = set()
-        stale_delete_ids = set()
-        kept_rows: List[sqlite3.Row] = []
+        conn = self._get_connection()
+        cursor = conn.cursor()
 
-        for row in rows:
-            row_id = row["id"]
-            if row_id in dedupe_delete_ids:
-                continue
+        cursor.execute("SELECT COUNT(*) AS count FROM semantic_memories WHERE user_id = ?", (user_id,))
+        total_now = int(cursor.fetchone()["count"])
+
+        position: Optional[Tuple[Optional[str], int]] = None
+        counters = {"total_before": total_now, "deduplicated": 0, "pruned_stale": 0, "processed": 0}
+        if not dry_run and resume:
+            cursor.execute("SELECT meta_value FROM memory_meta WHERE meta_key = ?", (checkpoint_key,))
+            row = cursor.fetchone()
+            checkpoint = json.loads(row["meta_value"]) if row else None
+            if (
+                checkpoint
+                and checkpoint.get("dedupe_threshold") == dedupe_threshold
+                and checkpoint.get("stale_days") == stale_days
+            ):
+                position = tuple(checkpoint["position"]) if checkpoint.get("position") else None
+                counters.update({key: checkpoint.get(key, counters[key]) for key in counters})
+                logger.info(f"从检查点继续压缩记忆: {user_id} ({counters['processed']} 条已处理)")
+
+        progress = {
+            "status": "running",
+            "dry_run": dry_run,
+            "total": counters["total_before"],
+            **{key: counters[key] for key in ("processed", "deduplicated", "pruned_stale")},
+            "updated_at": datetime.now().isoformat(),
+        }
+        # 预览（dry_run）不覆盖真实压缩的进度
+        if not dry_run:
+            self._compaction_progress[user_id] = progress
+
+        decided: set = set()
+        pending_delete: List[sqlite3.Row] = []
+        jaccard_min = jaccard_floor(dedupe_threshold, self.near_duplicates.shingle_size)
+        min_bands = self.near_duplicates.min_shared_bands(jaccard_min)
+
+        def flush_deletes(force: bool = False):
+            while pending_delete and (force or len(pending_delete) >= delete_batch_size):
+                batch = pending_delete[:delete_batch_size]
+                del pending_delete[:delete_batch_size]
+                if not dry_run:
+                    self._delete_memory_batch(conn, user_id, batch)
+
+        while True:
+            chunk = self._compaction_chunk(cursor, user_id, position, chunk_size)
+            if not chunk:
+                break
+            live = [row for row in chunk if row["id"] not in decided]
+            candidates = self._compaction_candidates(cursor, user_id, [row["id"] for row in live], min_bands)
+            candidate_ids = sorted({
+                candidate_id
+                for ids in candidates.values()
+                for candidate_id in ids
+                if candidate_id not in decided
+            })
+            candidate_rows: Dict[str, sqlite3.Row] = {}
+            for start in range(0, len(candidate_ids), 500):
+                part = candidate_ids[start:start + 500]
+                placeholders = ",".join("?" for _ in part)
+                cursor.execute(
+                    f"SELECT {self._COMPACT_COLUMNS} FROM semantic_memories WHERE id IN ({placeholders})",
+                    part,
+                )
+                candidate_rows.update({row["id"]: row for row in cursor.fetchall()})
+            signatures = self.near_duplicates.signatures(
+                cursor, [row["id"] for row in live] + list(candidate_rows)
+            )
 
-            # Prune low-value stale conversational noise first.
-            row_meta = self._parse_metadata(row["metadata"])
-            stale, _ = self._memory_staleness(row["memory_type"], row["created_at"], row_meta)
-            if stale:
-                try:
-                    created_at = datetime.fromisoformat(str(row["created_at"]).replace("Z", "+00:00"))
-                    created_naive = created_at.replace(tzinfo=None) if created_at.tzinfo else created_at
-                    age_days = max(0.0, (datetime.now() - created_naive).total_seconds() / 86400.0)
-                except Exception:
-                    age_days = float(stale_days) + 1
-
-                low_value = int(row["importance"] or 0) <= 4 and int(row["access_count"] or 0) <= 1
-                noisy_type = (row["memory_type"] or "").lower() in {"conversation", "manual"}
-                if noisy_type and low_value and age_days >= stale_days:
-                    stale_delete_ids.add(row_id)
+            decided_before = len(decided)
+            for row in live:
+                if row["id"] in decided:
                     continue
-
-            duplicate_of_kept = False
-            for kept in kept_rows:
-                if kept["memory_type"] != row["memory_type"]:
+                decided.add(row["id"])
+                if self._compaction_stale(row, stale_days):
+                    counters["pruned_stale"] += 1
+                    pending_delete.append(row)
                     continue
-                similarity = self._text_similarity(kept["content"] or "", row["content"] or "")
-                if similarity >= dedupe_threshold:
-                    dedupe_delete_ids.add(row_id)
-                    duplicate_of_kept = True
-                    break
-            if not duplicate_of_kept:
-                kept_rows.append(row)
-
-        delete_ids = sorted(dedupe_delete_ids | stale_delete_ids)
-        if delete_ids and not dry_run:
-            placeholders = ",".join(["?"] * len(delete_ids))
-            cursor.execute(f"DELETE FROM semantic_memories WHERE id IN ({placeholders})", delete_ids)
-            cursor.execute(f"DELETE FROM semantic_memories_fts WHERE id IN ({placeholders})", delete_ids)
+                # 保留当前记忆，删除与之重复的较旧记忆
+                kept_position = (row["created_at"], int(row["rowid"]))
+                others = [
+                    candidate_rows[candidate_id]
+                    for candidate_id in candidates.get(row["id"], [])
+                    if candidate_id in candidate_rows
+                    and candidate_id not in decided
+                    and self._compaction_older(candidate_rows[candidate_id], kept_position)
+                ]
+                estimates = self._estimated_jaccard(signatures, row["id"], [other["id"] for other in others])
+                for other, estimate in zip(others, estimates):
+                    if other["id"] in decided or estimate < jaccard_min:
+                        continue
+                    if not self._similar_at_least(row["content"] or "", other["content"] or "", dedupe_threshold):
+                        continue
+                    decided.add(other["id"])
+                    # 过期噪声优先按过期清理计数，与逐条处理时的判定顺序一致
+                    if self._compaction_stale(other, stale_days):
+                        counters["pruned_stale"] += 1
+                    else:
+                        counters["deduplicated"] += 1
+                    pending_delete.append(other)
+                flush_deletes()
+
+            # 已处理 = 本块保留/删除的记忆 + 提前判定为重复的较旧记忆
+            counters["processed"] += len(decided) - decided_before
+            last = chunk[-1]
+            position = (last["created_at"], int(last["rowid"]))
+            if not dry_run:
+                flush_deletes(force=True)
+                cursor.execute(
+                    "INSERT OR REPLACE INTO memory_meta (meta_key, meta_value) VALUES (?, ?)",
+                    (checkpoint_key, json.dumps({
+                        "position": list(position),
+                        "dedupe_threshold": dedupe_threshold,
+                        "stale_days": stale_days,
+                        **counters,
+                    })),
+                )
+                conn.commit()
+
+            progress.update({
+                **{key: counters[key] for key in ("processed", "deduplicated", "pruned_stale")},
+                "updated_at": datetime.now().isoformat(),
+            })
+            if progress_callback:
+                progress_callback(dict(progress))
+
+        flush_deletes(force=True)
+        if not dry_run:
+            cursor.execute("DELETE FROM memory_meta WHERE meta_key = ?", (checkpoint_key,))
             conn.commit()
 
         cursor.execute("SELECT COUNT(*) as count FROM semantic_memories WHERE user_id = ?", (user_id,))
         total_after = int(cursor.fetchone()["count"])
         conn.close()
 
+        progress.update({"status": "completed", "updated_at": datetime.now().isoformat()})
+        if progress_callback:
+            progress_callback(dict(progress))
+
         return {
-            "total_before": len(rows),
-            "deduplicated": len(dedupe_delete_ids),
-            "pruned_stale": len(stale_delete_ids),
+            "total_before": counters["total_before"],
+            "deduplicated": counters["deduplicated"],
+            "pruned_stale": counters["pruned_stale"],
             "total_after": total_after,
             "dry_run": dry_run,
         }
@@ -1081,6 +2392,15 @@ class MemoryManager:
         offset: int = 0
     ) -> List[Dict]:
         """列出记忆"""
+        return await self._executor.run_io(self._list_memories_sync, user_id, memory_type, limit, offset)
+
+    def _list_memories_sync(
+        self,
+        user_id: str,
+        memory_type: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0
+    ) -> List[Dict]:
         conn = self._get_connection()
         cursor = conn.cursor()
 
@@ -1091,32 +2411,81 @@ class MemoryManager:
             sql += " AND memory_type = ?"
             params.append(memory_type)
 
-        sql += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+        sql += " ORDER BY created_at DESC, rowid DESC LIMIT ? OFFSET ?"
         params.extend([limit, offset])
 
         cursor.execute(sql, params)
-
-        memories = []
-        for row in cursor.fetchall():
-            metadata = json.loads(row["metadata"]) if row["metadata"] else None
-            stale, _ = self._memory_staleness(row["memory_type"], row["created_at"], metadata or {})
-            memories.append({
-                "id": row["id"],
-                "content": row["content"],
-                "memory_type": row["memory_type"],
-                "importance": row["importance"],
-                "access_count": row["access_count"],
-                "created_at": row["created_at"],
-                "metadata": metadata,
-                "stale": stale,
-                "conflict_status": (metadata or {}).get("conflict_status")
-            })
+        memories = [self._list_item(row) for row in cursor.fetchall()]
 
         conn.close()
+        self._overlay_pending_access(memories)
         return memories
 
+    def _list_item(self, row: sqlite3.Row) -> Dict:
+        metadata = json.loads(row["metadata"]) if row["metadata"] else None
+        stale, _ = self._memory_staleness(row["memory_type"], row["created_at"], metadata or {})
+        return {
+            "id": row["id"],
+            "content": row["content"],
+            "memory_type": row["memory_type"],
+            "importance": row["importance"],
+            "access_count": row["access_count"],
+            "created_at": row["created_at"],
+            "metadata": metadata,
+            "stale": stale,
+            "conflict_status": (metadata or {}).get("conflict_status")
+        }
+
+    async def list_memories_by_types(
+        self,
+        user_id: str,
+        memory_types: List[str],
+        per_type_limit: int = 10,
+    ) -> Dict[str, List[Dict]]:
+        """每种类型最新的 per_type_limit 条记忆（一次窗口查询），结果与逐类型 list_memories 相同"""
+        return await self._executor.run_io(self._list_memories_by_types_sync, user_id, memory_types, per_type_limit)
+
+    def _list_memories_by_types_sync(
+        self,
+        user_id: str,
+        memory_types: List[str],
+        per_type_limit: int = 10,
+    ) -> Dict[str, List[Dict]]:
+        memory_types = list(dict.fromkeys(memory_types))
+        grouped: Dict[str, List[Dict]] = {memory_type: [] for memory_type in memory_types}
+        if not memory_types or per_type_limit <= 0:
+            return grouped
+
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        placeholders = ",".join("?" for _ in memory_types)
+        cursor.execute(
+            f"""
+            SELECT * FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY memory_type ORDER BY created_at DESC, rowid DESC
+                ) AS type_rank
+                FROM semantic_memories
+                WHERE user_id = ? AND memory_type IN ({placeholders})
+            )
+            WHERE type_rank <= ?
+            ORDER BY memory_type, type_rank
+            """,
+            [user_id, *memory_types, int(per_type_limit)],
+        )
+        for row in cursor.fetchall():
+            grouped[row["memory_type"]].append(self._list_item(row))
+        conn.close()
+
+        for memories in grouped.values():
+            self._overlay_pending_access(memories)
+        return grouped
+
     async def resolve_conflict(self, memory_id: str, action: str = "accept_current") -> Dict:
         """Resolve conflict markers for one memory and its linked conflict set."""
+        return await self._executor.run_io(self._resolve_conflict_sync, memory_id, action)
+
+    def _resolve_conflict_sync(self, memory_id: str, action: str = "accept_current") -> Dict:
         action = (action or "accept_current").strip().lower()
         if action not in {"accept_current", "keep_all"}:
             raise ValueError("Unsupported conflict action")
@@ -1177,6 +2546,7 @@ class MemoryManager:
 
         conn.commit()
         conn.close()
+        self.recall_cache.bump(row["user_id"])
         return {"updated": updated, "action": action}
 
     async def list_conflicts(
@@ -1186,28 +2556,34 @@ class MemoryManager:
         limit: int = 100,
     ) -> List[Dict]:
         """List conflict-marked memories for triage."""
+        return await self._executor.run_io(self._list_conflicts_sync, user_id, status, limit)
+
+    def _list_conflicts_sync(
+        self,
+        user_id: str,
+        status: str = "pending_review",
+        limit: int = 100,
+    ) -> List[Dict]:
         conn = self._get_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT *
-            FROM semantic_memories
-            WHERE user_id = ?
-            ORDER BY updated_at DESC
-            LIMIT ?
-            """,
-            (user_id, limit),
-        )
+        # 走 (user_id, conflict_status) 索引；"all" 表示任意冲突状态
+        sql = "SELECT * FROM semantic_memories WHERE user_id = ?"
+        params: List = [user_id]
+        if status == "all":
+            sql += " AND conflict_status IS NOT NULL"
+        else:
+            sql += " AND conflict_status = ?"
+            params.append(status)
+        sql += " ORDER BY updated_at DESC LIMIT ?"
+        params.append(limit)
+        cursor.execute(sql, params)
         rows = cursor.fetchall()
         conn.close()
 
         output = []
         for row in rows:
             metadata = self._parse_metadata(row["metadata"])
-            conflict_status = metadata.get("conflict_status")
-            if status != "all" and conflict_status != status:
-                continue
-            stale, _ = self._memory_staleness(row["memory_type"], row["created_at"], metadata)
+            stale, _ = self._staleness(row["memory_type"], row["created_at"], row["expires_at"])
             output.append(
                 {
                     "id": row["id"],
@@ -1216,7 +2592,8 @@ class MemoryManager:
                     "created_at": row["created_at"],
                     "updated_at": row["updated_at"],
                     "importance": row["importance"],
-                    "conflict_status": conflict_status,
+                    "conflict_status": row["conflict_status"],
+                    "conflict_key": row["conflict_key"],
                     "conflict_with": metadata.get("conflict_with", []),
                     "stale": stale,
                     "metadata": metadata,
@@ -1224,6 +2601,29 @@ class MemoryManager:
             )
         return output
 
+    def _count_stale(self, cursor: sqlite3.Cursor, user_id: str) -> Dict[str, int]:
+        """
+        按类型统计过期记忆（条件同 _staleness）：expires_at 走 (user_id, memory_type, expires_at)
+        索引，按 TTL 判定的部分走 (user_id, created_at) 索引
+        """
+        now = datetime.now()
+        cursor.execute("SELECT DISTINCT memory_type FROM semantic_memories WHERE user_id = ?", (user_id,))
+        memory_types = [row[0] for row in cursor.fetchall()]
+        counts: Dict[str, int] = {}
+        for memory_type in memory_types:
+            cutoff = datetime.fromtimestamp(now.timestamp() - self._ttl_days_for_type(memory_type) * 86400)
+            cursor.execute(
+                """
+                SELECT COUNT(*) FROM semantic_memories
+                WHERE user_id = ? AND memory_type IS ? AND (expires_at < ? OR created_at < ?)
+                """,
+                (user_id, memory_type, now.isoformat(), cutoff.isoformat()),
+            )
+            count = int(cursor.fetchone()[0])
+            if count:
+                counts[memory_type or ""] = count
+        return counts
+
     async def get_maintenance_report(
         self,
         user_id: str,
@@ -1231,29 +2631,37 @@ class MemoryManager:
         stale_days: int = 120,
     ) -> Dict:
         """Generate anti-corrosion maintenance report without mutating data."""
-        preview = await self.compact_memories(
+        return await self._executor.run_io(
+            self._get_maintenance_report_sync, user_id, dedupe_threshold, stale_days,
+        )
+
+    def _get_maintenance_report_sync(
+        self,
+        user_id: str,
+        dedupe_threshold: float = 0.985,
+        stale_days: int = 120,
+    ) -> Dict:
+        preview = self._compact_memories_sync(
             user_id=user_id,
             dedupe_threshold=dedupe_threshold,
             stale_days=stale_days,
             dry_run=True,
         )
-        conflicts = await self.list_conflicts(user_id=user_id, status="pending_review", limit=500)
-        stale_count = 0
-        total_count = 0
         conn = self._get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT id, memory_type, created_at, metadata FROM semantic_memories WHERE user_id = ?", (user_id,))
-        for row in cursor.fetchall():
-            total_count += 1
-            metadata = self._parse_metadata(row["metadata"])
-            stale, _ = self._memory_staleness(row["memory_type"], row["created_at"], metadata)
-            if stale:
-                stale_count += 1
+        cursor.execute("SELECT COUNT(*) FROM semantic_memories WHERE user_id = ?", (user_id,))
+        total_count = int(cursor.fetchone()[0])
+        cursor.execute(
+            "SELECT COUNT(*) FROM semantic_memories WHERE user_id = ? AND conflict_status = 'pending_review'",
+            (user_id,),
+        )
+        pending_conflicts = int(cursor.fetchone()[0])
+        stale_count = sum(self._count_stale(cursor, user_id).values())
         conn.close()
 
         return {
             "total_memories": total_count,
-            "pending_conflicts": len(conflicts),
+            "pending_conflicts": pending_conflicts,
             "stale_memories": stale_count,
             "dedupe_candidates": preview.get("deduplicated", 0),
             "stale_prune_candidates": preview.get("pruned_stale", 0),
@@ -1271,8 +2679,25 @@ class MemoryManager:
         stale_days: int = 120,
     ) -> Dict:
         """Run maintenance when due by schedule, otherwise return skip status."""
+        return await self._executor.run_io(
+            self._run_scheduled_maintenance_sync,
+            user_id,
+            interval_hours,
+            force,
+            dedupe_threshold,
+            stale_days,
+        )
+
+    def _run_scheduled_maintenance_sync(
+        self,
+        user_id: str,
+        interval_hours: int = 24,
+        force: bool = False,
+        dedupe_threshold: float = 0.985,
+        stale_days: int = 120,
+    ) -> Dict:
         now = datetime.now()
-        last_run_raw = await self.get_user_preference(user_id, "memory_maintenance_last_run")
+        last_run_raw = self._get_user_preference_sync(user_id, "memory_maintenance_last_run")
         last_run = None
         if last_run_raw:
             try:
@@ -1301,13 +2726,13 @@ class MemoryManager:
                 "interval_hours": interval_hours,
             }
 
-        result = await self.compact_memories(
+        result = self._compact_memories_sync(
             user_id=user_id,
             dedupe_threshold=dedupe_threshold,
             stale_days=stale_days,
             dry_run=False,
         )
-        await self.set_user_preference(user_id, "memory_maintenance_last_run", now.isoformat())
+        self._set_user_preference_sync(user_id, "memory_maintenance_last_run", now.isoformat())
         return {
             "ran": True,
             "interval_hours": interval_hours,
@@ -1315,22 +2740,462 @@ class MemoryManager:
             **result,
         }
 
+    def _index_keywords(self, cursor: sqlite3.Cursor, user_id: str, memory_id: str, content: str):
+        """把一条记忆写入持久化 BM25 倒排索引（与记忆写入同一事务）"""
+        if not self.hybrid_search:
+            return
+        try:
+            self.hybrid_search.inverted_index.add_document(cursor, user_id, memory_id, content)
+        except Exception as e:
+            logger.error(f"Failed to update keyword index: {e}")
+
+    def _unindex_keywords(self, cursor: sqlite3.Cursor, user_id: str, memory_ids: List[str]):
+        if not self.hybrid_search or not memory_ids:
+            return
+        try:
+            self.hybrid_search.inverted_index.remove_documents(cursor, user_id, memory_ids)
+        except Exception as e:
+            logger.error(f"Failed to update keyword index: {e}")
+
+    def _ensure_keyword_index(self, conn: sqlite3.Connection, user_id: str):
+        """
+        首次检索某用户时校验倒排索引是否覆盖全部记忆（旧数据或异常后自愈），
+        不一致则为该用户重建一次，之后依赖增量更新。
+        """
+        if not self.hybrid_search or user_id in self._keyword_index_synced:
+            return
+        cursor = conn.cursor()
+        inverted = self.hybrid_search.inverted_index
+        cursor.execute("SELECT COUNT(*) AS count FROM semantic_memories WHERE user_id = ?", (user_id,))
+        expected = int(cursor.fetchone()["count"])
+        if inverted.document_count(cursor, user_id) != expected:
+            inverted.clear_user(cursor, user_id)
+            cursor.execute("SELECT id, content FROM semantic_memories WHERE user_id = ?", (user_id,))
+            for row in cursor.fetchall():
+                inverted.add_document(cursor, user_id, row["id"], row["content"] or "")
+            conn.commit()
+            logger.info(f"重建关键词倒排索引: {user_id} ({expected} 条)")
+        self._keyword_index_synced.add(user_id)
+
+    def _add_vectors(self, user_id: str, ids: List[int], vectors: np.ndarray):
+        """写入用户向量索引；重新编码任务进行中时同步写入影子索引"""
+        with self._vector_write_lock:
+            if self.vector_store:
+                self.vector_store.add(user_id, ids, vectors)
+            if self._reembed_shadow:
+                self._reembed_shadow.add(user_id, ids, vectors)
+
+    def _remove_vectors(self, user_id: str, embedding_indexes: List[Optional[int]]) -> int:
+        """从用户向量索引中移除已删除记忆的向量"""
+        vector_ids = [int(i) for i in embedding_indexes if i is not None]
+        if not vector_ids:
+            return 0
+        try:
+            with self._vector_write_lock:
+                if self._reembed_shadow:
+                    self._reembed_shadow.remove(user_id, vector_ids)
+                return self.vector_store.remove(user_id, vector_ids) if self.vector_store else 0
+        except Exception as e:
+            logger.error(f"Failed to remove vectors for {user_id}: {e}")
+            return 0
+
     async def delete_memory(self, memory_id: str):
         """删除记忆"""
+        return await self._executor.run_io(self._delete_memory_sync, memory_id)
+
+    def _delete_memory_sync(self, memory_id: str):
         conn = self._get_connection()
         cursor = conn.cursor()
 
+        cursor.execute(
+            "SELECT user_id, embedding_index FROM semantic_memories WHERE id = ?",
+            (memory_id,),
+        )
+        row = cursor.fetchone()
+
         # 删除记忆
         cursor.execute("DELETE FROM semantic_memories WHERE id = ?", (memory_id,))
-        cursor.execute("DELETE FROM semantic_memories_fts WHERE id = ?", (memory_id,))
+        if row:
+            self._unindex_keywords(cursor, row["user_id"], [memory_id])
+        self.near_duplicates.remove(cursor, [memory_id])
 
         conn.commit()
         conn.close()
 
+        if row:
+            self._remove_vectors(row["user_id"], [row["embedding_index"]])
+            self.recall_cache.bump(row["user_id"])
+
         logger.info(f"删除记忆: {memory_id}")
 
+    async def clear_memories(self, user_id: str) -> int:
+        """清空某个用户的全部记忆（数据库 + 全文索引 + 向量索引）"""
+        return await self._executor.run_io(self._clear_memories_sync, user_id)
+
+    def _clear_memories_sync(self, user_id: str) -> int:
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM semantic_memories WHERE user_id = ?", (user_id,))
+        deleted = cursor.rowcount
+        if self.hybrid_search:
+            self.hybrid_search.inverted_index.clear_user(cursor, user_id)
+        self.near_duplicates.clear_user(cursor, user_id)
+        conn.commit()
+        conn.close()
+
+        with self._vector_write_lock:
+            if self.vector_store:
+                self.vector_store.drop(user_id)
+            if self._reembed_shadow:
+                self._reembed_shadow.drop(user_id)
+        self.recall_cache.bump(user_id)
+
+        logger.info(f"清空用户记忆: {user_id} ({deleted} 条)")
+        return deleted
+
+    def rebuild_vector_index(self, user_id: Optional[str] = None, batch_size: int = 64) -> Dict:
+        """
+        从 SQLite 重新编码并重建向量索引（离线维护命令使用）
+
+        Args:
+            user_id: 仅重建该用户；为空时重建全部用户
+            batch_size: 每批编码条数
+        """
+        self._ensure_embedding_ready()
+        if self._reembed_lock.locked():
+            raise RuntimeError("a re-embedding job is running")
+        if not self.embedding_model or not self.vector_store:
+            raise RuntimeError(
+                "vector index dimension does not match the embedding model; run reembed_memories"
+                if self.vector_index_stale else "embedding model or FAISS is not available"
+            )
+
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        if user_id:
+            user_ids = [user_id]
+        else:
+            cursor.execute("SELECT DISTINCT user_id FROM semantic_memories")
+            user_ids = [row["user_id"] for row in cursor.fetchall()]
+
+        report = {"users": 0, "vectors": 0}
+        for uid in user_ids:
+            cursor.execute(
+                "SELECT rowid, content FROM semantic_memories WHERE user_id = ? ORDER BY rowid",
+                (uid,),
+            )
+            rows = cursor.fetchall()
+            ids: List[int] = []
+            vectors: List[np.ndarray] = []
+            for start in range(0, len(rows), max(1, batch_size)):
+                batch = rows[start:start + max(1, batch_size)]
+                encoded = self._embed_texts([row["content"] or "" for row in batch], batch_size=len(batch))
+                ids.extend(int(row["rowid"]) for row in batch)
+                vectors.extend(np.asarray(encoded, dtype="float32"))
+
+            self.vector_store.replace(uid, ids, np.vstack(vectors) if vectors else [])
+            cursor.execute(
+                "UPDATE semantic_memories SET embedding_index = rowid WHERE user_id = ?",
+                (uid,),
+            )
+            conn.commit()
+            self.recall_cache.bump(uid)
+            report["users"] += 1
+            report["vectors"] += len(ids)
+            logger.info(f"重建向量索引: {uid} ({len(ids)} 条)")
+
+        if not user_id:
+            self._set_meta(cursor, "vector_profile", self._vector_profile())
+            conn.commit()
+            self.vector_index_stale = False
+        conn.close()
+        return report
+
+    _REEMBED_CHECKPOINT_KEY = "reembed_checkpoint"
+
+    def get_reembed_progress(self) -> Optional[Dict]:
+        """正在进行（或最近一次）的重新编码进度；进程重启后从检查点还原"""
+        progress = self._reembed_progress
+        if progress:
+            return dict(progress)
+        conn = self._get_connection()
+        checkpoint = self._get_meta(conn.cursor(), self._REEMBED_CHECKPOINT_KEY)
+        conn.close()
+        if not checkpoint:
+            return None
+        return {
+            "status": "interrupted",
+            **{key: checkpoint.get(key) for key in ("total", "processed", "last_rowid", "updated_at")},
+        }
+
+    async def reembed_memories(
+        self,
+        workers: Optional[int] = None,
+        chunk_size: int = 2048,
+        batch_size: Optional[int] = None,
+        resume: bool = True,
+        progress_callback: Optional[Callable[[Dict], None]] = None,
+        encoder_factory: Optional[Callable[[], object]] = None,
+    ) -> Dict:
+        """
+        用当前嵌入模型重新编码全部记忆并重建向量索引（换模型/后端/索引类型后使用）
+
+        按 rowid 键集分块流式读取 semantic_memories，workers > 0 时在进程池中批量推理，
+        向量写入影子索引目录；每块结束写检查点，中断后从检查点继续。
+        全部完成后影子索引整体换入，在此之前检索照常使用旧索引。
+
+        Args:
+            workers: 编码进程数，0 表示在当前进程编码；默认取 MEMORY_REEMBED_WORKERS
+            chunk_size: 每次读取并提交检查点的记忆条数
+            batch_size: 每批推理条数，默认取 MEMORY_EMBEDDING_BATCH_SIZE
+            resume: 是否从检查点继续（模型配置变化时检查点自动作废）
+            encoder_factory: 工作进程内构造模型的可 pickle 工厂，默认按当前后端配置构造
+        """
+        return await self._executor.run_io(
+            self._reembed_memories_sync, workers, chunk_size, batch_size, resume, progress_callback, encoder_factory,
+        )
+
+    def _reembed_memories_sync(
+        self,
+        workers: Optional[int] = None,
+        chunk_size: int = 2048,
+        batch_size: Optional[int] = None,
+        resume: bool = True,
+        progress_callback: Optional[Callable[[Dict], None]] = None,
+        encoder_factory: Optional[Callable[[], object]] = None,
+    ) -> Dict:
+        if not FAISS_AVAILABLE:
+            raise RuntimeError("FAISS is not available")
+        if not self._reembed_lock.acquire(blocking=False):
+            raise RuntimeError("a re-embedding job is already running")
+        try:
+            return self._run_reembed(workers, chunk_size, batch_size, resume, progress_callback, encoder_factory)
+        finally:
+            self._reembed_lock.release()
+
+    def _run_reembed(
+        self,
+        workers: Optional[int],
+        chunk_size: int,
+        batch_size: Optional[int],
+        resume: bool,
+        progress_callback: Optional[Callable[[Dict], None]],
+        encoder_factory: Optional[Callable[[], object]],
+    ) -> Dict:
+        self._ensure_embedding_ready()
+        if not self.embedding_model:
+            raise RuntimeError("embedding model is not available")
+        if workers is None:
+            workers = int(os.getenv("MEMORY_REEMBED_WORKERS", "2"))
+        workers = max(0, int(workers))
+        chunk_size = max(1, int(chunk_size))
+        batch_size = max(1, int(batch_size or self.embedding_batch_size))
+        profile = self._vector_profile()
+        self._reembed_stop.clear()
+
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        checkpoint = self._get_meta(cursor, self._REEMBED_CHECKPOINT_KEY) if resume else None
+        if checkpoint and checkpoint.get("profile") == profile and self.reembed_dir.exists():
+            last_rowid = int(checkpoint["last_rowid"])
+            processed = int(checkpoint["processed"])
+            logger.info(f"从检查点继续重新编码: rowid > {last_rowid} ({processed} 条已处理)")
+        else:
+            last_rowid, processed = 0, 0
+            shutil.rmtree(self.reembed_dir, ignore_errors=True)
+            cursor.execute("DELETE FROM memory_reembed_rows")
+            conn.commit()
+        cursor.execute("SELECT COUNT(*) AS count FROM semantic_memories WHERE rowid > ?", (last_rowid,))
+        total = processed + int(cursor.fetchone()["count"])
+
+        now = datetime.now().isoformat()
+        progress = {
+            "status": "running",
+            "workers": workers,
+            "total": total,
+            "processed": processed,
+            "last_rowid": last_rowid,
+            "rate_per_sec": 0.0,
+            "eta_sec": None,
+            "started_at": now,
+            "updated_at": now,
+        }
+        self._reembed_progress = progress
+
+        shadow = self._new_vector_store(self.reembed_dir)
+        shadow.start()
+        # 任务期间的实时写入同时落到影子索引，换入后不会丢
+        with self._vector_write_lock:
+            self._reembed_shadow = shadow
+        pool = None
+        try:
+            if workers:
+                if encoder_factory is None:
+                    encoder_factory = functools.partial(
+                        create_embedding_backend,
+                        self.embedding_backend,
+                        self.embedding_model_name,
+                        self.data_dir / "embedding_models",
+                        self.embedding_quantize,
+                        batch_size,
+                        # 每个进程分到的线程数，避免多进程 × 多线程超订 CPU
+                        self.embedding_threads or max(1, (os.cpu_count() or 1) // workers),
+                    )
+                pool = EmbeddingProcessPool(encoder_factory, workers)
+
+            started = time.perf_counter()
+            encoded_this_run = 0
+            while not self._reembed_stop.is_set():
+                cursor.execute(
+                    "SELECT rowid, user_id, content FROM semantic_memories WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, chunk_size),
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                texts = [row["content"] or "" for row in rows]
+                batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+                if pool:
+                    matrix = np.vstack(pool.encode(batches))
+                else:
+                    matrix = np.vstack([self._embed_texts(batch, batch_size=len(batch)) for batch in batches])
+
+                with self._vector_write_lock:
+                    # 编码期间这些行可能已被删除、清空、压缩或改写；删除方提交后才拿锁移除影子向量，
+                    # 所以在锁内重新核对，只写入仍然存在且 user_id / 内容都没变的行
+                    rowids = [int(row["rowid"]) for row in rows]
+                    cursor.execute(
+                        f"SELECT rowid, user_id, content FROM semantic_memories "
+                        f"WHERE rowid IN ({','.join(['?'] * len(rowids))})",
+                        rowids,
+                    )
+                    current = {int(row["rowid"]): (row["user_id"], row["content"]) for row in cursor.fetchall()}
+                    by_user: Dict[str, List[int]] = {}
+                    for position, row in enumerate(rows):
+                        if current.get(int(row["rowid"])) == (row["user_id"], row["content"]):
+                            by_user.setdefault(row["user_id"], []).append(position)
+                    for uid, positions in by_user.items():
+                        shadow.add(uid, [rowids[i] for i in positions], matrix[positions])
+                    # 与检查点同一事务提交，续跑后也知道哪些行已在影子索引里
+                    cursor.executemany(
+                        "INSERT OR IGNORE INTO memory_reembed_rows (row_id) VALUES (?)",
+                        [(rowids[i],) for positions in by_user.values() for i in positions],
+                    )
+
+                last_rowid = int(rows[-1]["rowid"])
+                processed += len(rows)
+                encoded_this_run += len(rows)
+                now = datetime.now().isoformat()
+                self._set_meta(cursor, self._REEMBED_CHECKPOINT_KEY, {
+                    "phase": "encode",
+                    "profile": profile,
+                    "last_rowid": last_rowid,
+                    "processed": processed,
+                    "total": total,
+                    "updated_at": now,
+                })
+                conn.commit()
+
+                rate = encoded_this_run / max(time.perf_counter() - started, 1e-6)
+                progress.update({
+                    "processed": processed,
+                    "total": max(total, processed),
+                    "last_rowid": last_rowid,
+                    "rate_per_sec": round(rate, 1),
+                    "eta_sec": round(max(total - processed, 0) / rate, 1) if rate else None,
+                    "updated_at": now,
+                })
+                if progress_callback:
+                    progress_callback(dict(progress))
+
+            if self._reembed_stop.is_set():
+                progress.update({"status": "interrupted", "updated_at": datetime.now().isoformat()})
+                logger.info(f"重新编码已暂停: rowid > {last_rowid} 待处理，下次从检查点继续")
+                return dict(progress)
+
+            with self._vector_write_lock:
+                shadow.close()
+                self._set_meta(cursor, self._REEMBED_CHECKPOINT_KEY, {
+                    "phase": "swap",
+                    "profile": profile,
+                    "last_rowid": last_rowid,
+                    "processed": processed,
+                    "total": total,
+                    "updated_at": datetime.now().isoformat(),
+                })
+                conn.commit()
+                if self.vector_store:
+                    self.vector_store.close()
+                self._swap_in_reembed_dir()
+                self._reembed_shadow = None
+                self.vector_store = self._new_vector_store(self.index_dir)
+                self.vector_store.start()
+                self._finish_reembed(cursor, profile)
+                conn.commit()
+            self.recall_cache.bump()
+        finally:
+            if pool:
+                pool.close()
+            with self._vector_write_lock:
+                if self._reembed_shadow is shadow:
+                    self._reembed_shadow = None
+                    shadow.close()
+            conn.close()
+
+        progress.update({
+            "status": "completed",
+            "total": processed,
+            "eta_sec": 0.0,
+            "updated_at": datetime.now().isoformat(),
+        })
+        if progress_callback:
+            progress_callback(dict(progress))
+        logger.info(f"重新编码完成: {processed} 条，已换入新向量索引 ({profile['model']}, dim={profile['dim']})")
+        return dict(progress)
+
+    def _swap_in_reembed_dir(self):
+        """影子索引目录换成正式索引目录；旧目录先改名再删除，中断后可重复执行"""
+        if not self.reembed_dir.exists():
+            return
+        retired = self.index_dir.with_name(self.index_dir.name + ".old")
+        shutil.rmtree(retired, ignore_errors=True)
+        if self.index_dir.exists():
+            os.replace(self.index_dir, retired)
+        os.replace(self.reembed_dir, self.index_dir)
+        shutil.rmtree(retired, ignore_errors=True)
+
+    def _finish_reembed(self, cursor: sqlite3.Cursor, profile: Dict):
+        # 只标记确实写入了影子索引的行；任务期间的实时写入已在写入路径上各自标记
+        cursor.execute(
+            "UPDATE semantic_memories SET embedding_index = rowid "
+            "WHERE rowid IN (SELECT row_id FROM memory_reembed_rows)"
+        )
+        cursor.execute("DELETE FROM memory_reembed_rows")
+        cursor.execute("INSERT OR REPLACE INTO memory_meta (meta_key, meta_value) VALUES ('vector_id_scheme', 'rowid')")
+        self._set_meta(cursor, "vector_profile", profile)
+        self._set_meta(cursor, self._REEMBED_CHECKPOINT_KEY, None)
+        self.vector_index_stale = False
+
+    def rebuild_fts_index(self) -> Dict:
+        """
+        从 semantic_memories 重建全文索引（删表重建表和触发器，修复旧库或不一致的索引）
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        rebuild_fts(cursor, recreate=True)
+        conn.commit()
+        self.recall_cache.bump()
+        cursor.execute("SELECT COUNT(*) FROM semantic_memories")
+        documents = int(cursor.fetchone()[0])
+        conn.close()
+        logger.info(f"重建全文索引: {documents} 条 (tokenizer={fts_tokenizer()})")
+        return {"documents": documents, "tokenizer": fts_tokenizer()}
+
     async def get_user_preference(self, user_id: str, pref_key: str) -> Optional[str]:
         """获取用户偏好"""
+        return await self._executor.run_io(self._get_user_preference_sync, user_id, pref_key)
+
+    def _get_user_preference_sync(self, user_id: str, pref_key: str) -> Optional[str]:
         conn = self._get_connection()
         cursor = conn.cursor()
 
@@ -1346,6 +3211,9 @@ class MemoryManager:
 
     async def set_user_preference(self, user_id: str, pref_key: str, pref_value: str):
         """设置用户偏好"""
+        return await self._executor.run_io(self._set_user_preference_sync, user_id, pref_key, pref_value)
+
+    def _set_user_preference_sync(self, user_id: str, pref_key: str, pref_value: str):
         conn = self._get_connection()
         cursor = conn.cursor()
 
@@ -1379,8 +3247,9 @@ class MemoryManager:
         """)
         by_type = {row["memory_type"]: row["count"] for row in cursor.fetchall()}
 
-        # FAISS 索引大小
-        index_size = self.index.ntotal if self.index else 0
+        # FAISS 索引大小（已编入向量索引的记忆数）
+        cursor.execute("SELECT COUNT(*) as count FROM semantic_memories WHERE embedding_index IS NOT NULL")
+        index_size = cursor.fetchone()["count"] if self.vector_store else 0
 
         conn.close()
 
@@ -1388,5 +3257,37 @@ class MemoryManager:
             "total_memories": total_memories,
             "by_type": by_type,
             "index_size": index_size,
+            "vector_index": self.vector_store.get_stats() if self.vector_store else None,
+            "embedding_cache": self.embedding_cache.get_stats(),
+            "recall_cache": self.recall_cache.get_stats(),
+            "embedding": self.get_embedding_status(),
+            "vector_index_stale": self.vector_index_stale,
+            "reembed": self.get_reembed_progress(),
+            "access_stats": self.access_stats.get_stats(),
+            "fingerprint_backfill": dict(self._fingerprint_backfill),
+            "markdown_mirror": self.markdown_writer.get_stats() if self.markdown_writer else None,
+            "markdown_archive": self.markdown_memory.get_archive_stats() if self.markdown_memory else None,
+            "sqlite_pool": sqlite_storage.get_pool(self.db_path).get_stats(),
+            "executor": self._executor.get_stats(),
             "embedding_model": self.embedding_model.get_sentence_embedding_dimension() if self.embedding_model else None
         }
+
+    async def get_stats_async(self) -> Dict:
+        """在 I/O 线程池中收集统计信息"""
+        return await self._executor.run_io(self.get_stats)
+
+    def close(self):
+        """停止后台任务，写回缓冲的访问统计，并把向量日志落盘为快照"""
+        # 重新编码任务在当前块结束后停下，下次从检查点继续；等它退出再关闭索引
+        self._reembed_stop.set()
+        with self._reembed_lock:
+            pass
+        self._fingerprint_backfill_stop.set()
+        if self._fingerprint_backfill_thread is not None:
+            self._fingerprint_backfill_thread.join(timeout=10)
+        self.access_stats.close()
+        if self.markdown_writer:
+            self.markdown_writer.close()
+        if self.vector_store:
+            self.vector_store.close()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,179 @@
+"""
+Bounded executors for blocking memory work.
+SQLite queries run on an I/O thread pool and embedding/vector math on a
+separate CPU pool, so the asyncio loop that serves chat streams never blocks
+on them. Both pools report queue depth, active workers and wait time.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class _PoolMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_queued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            finished = self.completed + self.failed
+            return {
+                "queued": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+                "failed": self.failed,
+                "max_queued": self.max_queued,
+                "avg_wait_ms": round(self.total_wait / finished * 1000, 3) if finished else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "avg_run_ms": round(self.total_run / finished * 1000, 3) if finished else 0.0,
+            }
+
+
+class BoundedPool:
+    """
+    Thread pool with at most ``workers + max_queue`` outstanding tasks.
+    Async callers beyond that wait for a slot instead of piling up work.
+    """
+
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.capacity = self.workers + max(0, int(max_queue))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"memory-{name}")
+        self._slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._slots_lock = threading.Lock()
+        self._local = threading.local()
+        self.metrics = _PoolMetrics()
+
+    def in_worker(self) -> bool:
+        return getattr(self._local, "active", False)
+
+    def _slot(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        with self._slots_lock:
+            slot = self._slots.get(loop)
+            if slot is None:
+                slot = asyncio.Semaphore(self.capacity)
+                self._slots[loop] = slot
+            return slot
+
+    def _wrap(self, fn: Callable[..., T], submitted: float) -> Callable[[], T]:
+        metrics = self.metrics
+
+        def run() -> T:
+            started = time.perf_counter()
+            wait = started - submitted
+            with metrics.lock:
+                metrics.queued -= 1
+                metrics.active += 1
+                metrics.total_wait += wait
+                metrics.max_wait = max(metrics.max_wait, wait)
+            self._local.active = True
+            ok = False
+            try:
+                result = fn()
+                ok = True
+                return result
+            finally:
+                self._local.active = False
+                with metrics.lock:
+                    metrics.active -= 1
+                    metrics.total_run += time.perf_counter() - started
+                    if ok:
+                        metrics.completed += 1
+                    else:
+                        metrics.failed += 1
+
+        return run
+
+    def _enqueue(self) -> float:
+        with self.metrics.lock:
+            self.metrics.queued += 1
+            self.metrics.max_queued = max(self.metrics.max_queued, self.metrics.queued)
+        return time.perf_counter()
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args, **kwargs)
+        async with self._slot(loop):
+            submitted = self._enqueue()
+            return await loop.run_in_executor(self._executor, self._wrap(call, submitted))
+
+    def call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Blocking call from another thread; runs inline if already on this pool."""
+        if self.in_worker():
+            return fn(*args, **kwargs)
+        submitted = self._enqueue()
+        future: Future = self._executor.submit(self._wrap(functools.partial(fn, *args, **kwargs), submitted))
+        return future.result()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "capacity": self.capacity, **self.metrics.snapshot()}
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+class MemoryExecutor:
+    """The I/O and CPU pools used by MemoryManager."""
+
+    def __init__(
+        self,
+        io_workers: Optional[int] = None,
+        cpu_workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+    ):
+        cpu_default = max(1, min(4, (os.cpu_count() or 2) - 1))
+        max_queue = _env_int("MEMORY_EXECUTOR_MAX_QUEUE", 64) if max_queue is None else max_queue
+        self.io = BoundedPool(
+            "io",
+            _env_int("MEMORY_IO_WORKERS", 8) if io_workers is None else io_workers,
+            max_queue,
+        )
+        self.cpu = BoundedPool(
+            "cpu",
+            _env_int("MEMORY_CPU_WORKERS", cpu_default) if cpu_workers is None else cpu_workers,
+            max_queue,
+        )
+
+    async def run_io(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        return await self.io.run(fn, *args, **kwargs)
+
+    async def run_cpu(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        return await self.cpu.run(fn, *args, **kwargs)
+
+    def cpu_call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Run CPU-bound work on the CPU pool from synchronous code."""
+        return self.cpu.call(fn, *args, **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"io": self.io.snapshot(), "cpu": self.cpu.snapshot()}
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.io.shutdown(wait=wait)
+        self.cpu.shutdown(wait=wait)
@@ -0,0 +1,204 @@
+"""
+Full-text index for ``semantic_memories``.
+A contentless FTS5 table kept in sync by triggers, so every insert,
+update and delete on the base table (including bulk deletes) updates the
+index in the same transaction. The trigram tokenizer is used when SQLite
+supports it: it matches substrings, which works for CJK text that has no
+word boundaries. Older SQLite builds fall back to unicode61.
+
+Trigram cannot match tokens shorter than 3 characters (two-character CJK
+words, "Go"), so a second contentless table, ``semantic_memories_terms``,
+indexes the same rows with unicode61 after ``fts_terms`` puts spaces
+around every CJK character: a CJK word becomes a phrase of single
+characters and Latin words stay whole, with Unicode case folding. The same
+triggers keep both tables in sync.
+
+Each row also carries an ``owner`` and a ``kind`` scope token derived from
+``user_id`` and ``memory_type``. Queries put them in the MATCH expression,
+so FTS5 only walks the caller's postings instead of matching every user's
+rows and filtering them after a join. The triggers compute the tokens with
+the ``memory_fts_scope`` / ``memory_fts_terms`` SQL functions, which ``core.sqlite_storage``
+installs on its pooled connections; writes to ``semantic_memories`` must
+go through those connections.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import sqlite3
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from core import sqlite_storage
+
+FTS_TABLE = "semantic_memories_fts"
+FTS_TERMS_TABLE = "semantic_memories_terms"
+# Bumped when the table definition or triggers change so existing databases get rebuilt.
+FTS_SCHEMA_VERSION = 4
+
+_CJK_CHAR = re.compile(r"([\u3400-\u9fff\uf900-\ufaff])")
+
+# 作用域 token 用私有区（U+E000 起）字符：unicode61 视为单个词元，trigram 下正好是一个三字片段
+_SCOPE_BASE = 0xE000
+_SCOPE_SPAN = 6400
+
+
+def fts_scope(value: Optional[str]) -> str:
+    """Three private-use characters derived from ``value``: one FTS5 token under both tokenizers."""
+    digest = hashlib.blake2b((value or "").encode("utf-8"), digest_size=8).digest()
+    number = int.from_bytes(digest, "big")
+    chars = []
+    for _ in range(3):
+        number, index = divmod(number, _SCOPE_SPAN)
+        chars.append(chr(_SCOPE_BASE + index))
+    return "".join(chars)
+
+
+def fts_terms(text: Optional[str]) -> str:
+    """Text for the unicode61 terms table: every CJK character becomes its own token."""
+    return _CJK_CHAR.sub(r" \1 ", text or "")
+
+
+def terms_query(terms: List[str]) -> Optional[str]:
+    """OR query for the terms table; a CJK term becomes a phrase of its characters."""
+    phrases = ['"{}"'.format(" ".join(fts_terms(term).replace('"', "").split())) for term in terms]
+    phrases = [phrase for phrase in dict.fromkeys(phrases) if phrase != '""']
+    return " OR ".join(phrases) or None
+
+
+sqlite_storage.register_function("memory_fts_scope", 1, fts_scope)
+sqlite_storage.register_function("memory_fts_terms", 1, fts_terms)
+
+
+@lru_cache(maxsize=1)
+def fts_tokenizer() -> str:
+    """``trigram`` when this SQLite build has it (3.34+), otherwise ``unicode61``."""
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE probe USING fts5(x, tokenize='trigram')")
+        return "trigram"
+    except sqlite3.Error:
+        return "unicode61"
+    finally:
+        conn.close()
+
+
+def fts_scheme() -> str:
+    return f"{fts_tokenizer()}-v{FTS_SCHEMA_VERSION}"
+
+
+def _create(cursor: sqlite3.Cursor):
+    cursor.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+        USING fts5(owner, kind, content, content='', tokenize='{fts_tokenizer()}')
+    """)
+    cursor.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TERMS_TABLE}
+        USING fts5(owner, kind, terms, content='', tokenize='unicode61')
+    """)
+    scope = "memory_fts_scope({0}.user_id), memory_fts_scope({0}.memory_type)"
+    insert = (
+        f"INSERT INTO {FTS_TABLE}(rowid, owner, kind, content) "
+        f"VALUES ({{0}}.rowid, {scope}, {{0}}.content);\n"
+        f"INSERT INTO {FTS_TERMS_TABLE}(rowid, owner, kind, terms) "
+        f"VALUES ({{0}}.rowid, {scope}, memory_fts_terms({{0}}.content));"
+    )
+    delete = (
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, owner, kind, content) "
+        f"VALUES ('delete', {{0}}.rowid, {scope}, {{0}}.content);\n"
+        f"INSERT INTO {FTS_TERMS_TABLE}({FTS_TERMS_TABLE}, rowid, owner, kind, terms) "
+        f"VALUES ('delete', {{0}}.rowid, {scope}, memory_fts_terms({{0}}.content));"
+    )
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON semantic_memories BEGIN
+            {insert.format("new")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON semantic_memories BEGIN
+            {delete.format("old")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+        AFTER UPDATE OF user_id, memory_type, content ON semantic_memories BEGIN
+            {delete.format("old")}
+            {insert.format("new")}
+        END
+    """)
+
+
+def _drop(cursor: sqlite3.Cursor):
+    for suffix in ("ai", "ad", "au"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+    cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    cursor.execute(f"DROP TABLE IF EXISTS {FTS_TERMS_TABLE}")
+
+
+def ensure_fts_schema(cursor: sqlite3.Cursor) -> bool:
+    """
+    Create the table and triggers. Databases created with another tokenizer
+    or schema version are rebuilt from ``semantic_memories``; returns True
+    when that happened. Requires the ``memory_meta`` table.
+    """
+    cursor.execute("SELECT meta_value FROM memory_meta WHERE meta_key = 'fts_scheme'")
+    row = cursor.fetchone()
+    if row and row[0] == fts_scheme():
+        _create(cursor)
+        return False
+    rebuild_fts(cursor, recreate=True)
+    return True
+
+
+def rebuild_fts(cursor: sqlite3.Cursor, recreate: bool = False):
+    """
+    Repopulate the index from ``semantic_memories``. With ``recreate`` the
+    table and triggers are dropped first (tokenizer change, corrupt index).
+    """
+    if recreate:
+        _drop(cursor)
+    _create(cursor)
+    cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')")
+    cursor.execute(f"INSERT INTO {FTS_TERMS_TABLE}({FTS_TERMS_TABLE}) VALUES ('delete-all')")
+    cursor.execute(f"""
+        INSERT INTO {FTS_TABLE}(rowid, owner, kind, content)
+        SELECT rowid, memory_fts_scope(user_id), memory_fts_scope(memory_type), content FROM semantic_memories
+    """)
+    cursor.execute(f"""
+        INSERT INTO {FTS_TERMS_TABLE}(rowid, owner, kind, terms)
+        SELECT rowid, memory_fts_scope(user_id), memory_fts_scope(memory_type), memory_fts_terms(content)
+        FROM semantic_memories
+    """)
+    cursor.execute(
+        "INSERT OR REPLACE INTO memory_meta (meta_key, meta_value) VALUES ('fts_scheme', ?)",
+        (fts_scheme(),),
+    )
+
+
+def search_fts(
+    cursor: sqlite3.Cursor,
+    fts_query: Optional[str],
+    user_id: str,
+    memory_type: Optional[str],
+    limit: int,
+    table: str = FTS_TABLE,
+) -> List[Tuple[int, float]]:
+    """``(rowid, bm25 rank)`` for one user's best matches in ``table``; lower rank is better."""
+    if not fts_query:
+        return []
+    scope = f'owner : "{fts_scope(user_id)}"'
+    if memory_type:
+        scope += f' AND kind : "{fts_scope(memory_type)}"'
+    # 作用域列不参与打分
+    cursor.execute(
+        f"""
+        SELECT rowid, bm25({table}, 0.0, 0.0, 1.0) AS bm25_rank
+        FROM {table}
+        WHERE {table} MATCH ?
+        ORDER BY bm25_rank LIMIT ?
+        """,
+        (f"{scope} AND ({fts_query})", limit),
+    )
+    return [(int(row[0]), float(row[1])) for row in cursor.fetchall()]
+
@@ -0,0 +1,278 @@
+"""
+Near-duplicate fingerprint index.
+MinHash signatures over character shingles, banded for LSH and stored in
+SQLite next to ``semantic_memories``. A duplicate lookup is one exact-hash
+probe plus one band-key probe; callers verify the few candidates with their
+own similarity function.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import re
+import sqlite3
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Bumped whenever signatures change so stored fingerprints get rebuilt.
+FINGERPRINT_SCHEME = "minhash-ms64-60x20"
+
+
+def normalize_fingerprint_text(text: str) -> str:
+    """Lowercase, punctuation folded to spaces, whitespace collapsed (CJK characters are kept)."""
+    return re.sub(r"[\W_]+", " ", (text or "").lower()).strip()
+
+
+def jaccard_floor(similarity_threshold: float, shingle_size: int = 3, margin: float = 0.15) -> float:
+    """
+    Loose lower bound on shingle Jaccard for texts whose SequenceMatcher ratio
+    is at least ``similarity_threshold``: every unmatched character breaks at
+    most ``shingle_size`` shingles. ``margin`` absorbs MinHash estimation noise.
+    """
+    broken = shingle_size * max(0.0, 1.0 - similarity_threshold)
+    bound = (1.0 - broken) / (1.0 + broken) if broken < 1.0 else 0.0
+    return max(0.0, bound - margin)
+
+
+class Fingerprint:
+    __slots__ = ("content_hash", "signature", "band_keys", "length")
+
+    def __init__(self, content_hash: str, signature: np.ndarray, band_keys: List[int], length: int):
+        self.content_hash = content_hash
+        self.signature = signature
+        self.band_keys = band_keys
+        self.length = length
+
+    def jaccard(self, other_signature: np.ndarray) -> float:
+        """MinHash estimate of shingle Jaccard similarity."""
+        return float(np.mean(self.signature == other_signature))
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index over (user_id, memory_type).
+
+    With the defaults (60 hashes, 20 bands x 3 rows) pairs with shingle
+    Jaccard >= 0.6 collide in at least one band ~99% of the time (0.5: ~93%),
+    which covers texts above the usual SequenceMatcher thresholds.
+    All methods take the caller's cursor so writes share its transaction.
+    """
+
+    def __init__(self, num_hashes: int = 60, bands: int = 20, shingle_size: int = 3, seed: int = 1729):
+        if num_hashes % bands:
+            raise ValueError("num_hashes must be divisible by bands")
+        self.num_hashes = num_hashes
+        self.bands = bands
+        self.rows_per_band = num_hashes // bands
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        # Multiply-shift hashing over 64-bit shingle hashes; uint64 arithmetic wraps mod 2**64.
+        self._a = (rng.randint(0, 1 << 32, size=num_hashes).astype("uint64") << np.uint64(32)) | (
+            rng.randint(0, 1 << 32, size=num_hashes).astype("uint64") | np.uint64(1)
+        )
+        self._b = (rng.randint(0, 1 << 32, size=num_hashes).astype("uint64") << np.uint64(32)) | (
+            rng.randint(0, 1 << 32, size=num_hashes).astype("uint64")
+        )
+
+    def min_shared_bands(self, jaccard: float, recall: float = 0.99) -> int:
+        """
+        Largest m such that a pair with shingle Jaccard ``jaccard`` still shares
+        at least m band keys with probability >= ``recall``.
+        """
+        p = min(1.0, max(0.0, jaccard)) ** self.rows_per_band
+        n = self.bands
+        # P(X >= m) for X ~ Binomial(n, p), accumulated from the top.
+        tail = 0.0
+        for m in range(n, 0, -1):
+            tail += math.comb(n, m) * (p ** m) * ((1 - p) ** (n - m))
+            if tail >= recall:
+                return m
+        return 1
+
+    @staticmethod
+    def ensure_schema(cursor: sqlite3.Cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS memory_fingerprints (
+                memory_id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                memory_type TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                signature BLOB NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_fingerprints_hash
+            ON memory_fingerprints(user_id, memory_type, content_hash)
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS memory_lsh_buckets (
+                user_id TEXT NOT NULL,
+                memory_type TEXT NOT NULL,
+                band_key INTEGER NOT NULL,
+                memory_id TEXT NOT NULL,
+                PRIMARY KEY (user_id, memory_type, band_key, memory_id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_lsh_buckets_memory
+            ON memory_lsh_buckets(memory_id)
+        """)
+
+    def _shingles(self, norm: str) -> Iterable[str]:
+        size = self.shingle_size
+        if len(norm) <= size:
+            return {norm}
+        return {norm[i:i + size] for i in range(len(norm) - size + 1)}
+
+    @staticmethod
+    def _shingle_hash(data: bytes) -> int:
+        return zlib.crc32(data) | (zlib.crc32(data, 0x9E3779B9) << 32)
+
+    def fingerprint(self, text: str) -> Optional[Fingerprint]:
+        norm = normalize_fingerprint_text(text)
+        if not norm:
+            return None
+        hashes = np.fromiter(
+            (self._shingle_hash(shingle.encode("utf-8")) for shingle in self._shingles(norm)),
+            dtype="uint64",
+        )
+        with np.errstate(over="ignore"):
+            permuted = np.outer(self._a, hashes) + self._b[:, None]
+        signature = permuted.min(axis=1).astype("uint64")
+        band_keys = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows_per_band:(band + 1) * self.rows_per_band]
+            digest = hashlib.blake2b(bytes([band]) + rows.tobytes(), digest_size=8).digest()
+            band_keys.append(int.from_bytes(digest, "little", signed=True))
+        content_hash = hashlib.sha256(norm.encode("utf-8")).hexdigest()
+        return Fingerprint(content_hash, signature, band_keys, len(norm))
+
+    def add(
+        self,
+        cursor: sqlite3.Cursor,
+        user_id: str,
+        memory_id: str,
+        memory_type: str,
+        text: str,
+        fingerprint: Optional[Fingerprint] = None,
+    ):
+        fingerprint = fingerprint or self.fingerprint(text)
+        self.remove(cursor, [memory_id])
+        if fingerprint is None:
+            return
+        cursor.execute(
+            """
+            INSERT INTO memory_fingerprints (memory_id, user_id, memory_type, content_hash, length, signature)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (memory_id, user_id, memory_type, fingerprint.content_hash, fingerprint.length,
+             fingerprint.signature.tobytes()),
+        )
+        cursor.executemany(
+            "INSERT OR IGNORE INTO memory_lsh_buckets (user_id, memory_type, band_key, memory_id) VALUES (?, ?, ?, ?)",
+            [(user_id, memory_type, key, memory_id) for key in fingerprint.band_keys],
+        )
+
+    def remove(self, cursor: sqlite3.Cursor, memory_ids: Sequence[str]):
+        ids = [memory_id for memory_id in memory_ids if memory_id]
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" for _ in chunk)
+            cursor.execute(f"DELETE FROM memory_lsh_buckets WHERE memory_id IN ({placeholders})", chunk)
+            cursor.execute(f"DELETE FROM memory_fingerprints WHERE memory_id IN ({placeholders})", chunk)
+
+    def clear_user(self, cursor: sqlite3.Cursor, user_id: str):
+        cursor.execute("DELETE FROM memory_lsh_buckets WHERE user_id = ?", (user_id,))
+        cursor.execute("DELETE FROM memory_fingerprints WHERE user_id = ?", (user_id,))
+
+    def count(self, cursor: sqlite3.Cursor, user_id: str) -> int:
+        cursor.execute("SELECT COUNT(*) FROM memory_fingerprints WHERE user_id = ?", (user_id,))
+        return int(cursor.fetchone()[0])
+
+    def candidates(
+        self,
+        cursor: sqlite3.Cursor,
+        user_id: str,
+        memory_type: str,
+        fingerprint: Fingerprint,
+        limit: int = 32,
+    ) -> List[Tuple[str, float]]:
+        """
+        Return up to ``limit`` ``(memory_id, estimated_jaccard)`` pairs, exact
+        normalized-text matches first, then by estimated similarity.
+        """
+        cursor.execute(
+            """
+            SELECT memory_id FROM memory_fingerprints
+            WHERE user_id = ? AND memory_type = ? AND content_hash = ?
+            LIMIT ?
+            """,
+            (user_id, memory_type, fingerprint.content_hash, limit),
+        )
+        exact = [(row[0], 1.0) for row in cursor.fetchall()]
+        if len(exact) >= limit:
+            return exact
+
+        placeholders = ",".join("?" for _ in fingerprint.band_keys)
+        cursor.execute(
+            f"""
+            SELECT b.memory_id, f.signature, COUNT(*) AS hits
+            FROM memory_lsh_buckets b
+            JOIN memory_fingerprints f ON f.memory_id = b.memory_id
+            WHERE b.user_id = ? AND b.memory_type = ? AND b.band_key IN ({placeholders})
+            GROUP BY b.memory_id
+            ORDER BY hits DESC
+            LIMIT ?
+            """,
+            (user_id, memory_type, *fingerprint.band_keys, limit * 4),
+        )
+        seen = {memory_id for memory_id, _ in exact}
+        scored: List[Tuple[str, float]] = []
+        for memory_id, blob, _ in cursor.fetchall():
+            if memory_id in seen:
+                continue
+            scored.append((memory_id, fingerprint.jaccard(np.frombuffer(blob, dtype="uint64"))))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return exact + scored[:limit - len(exact)]
+
+    @staticmethod
+    def signatures(cursor: sqlite3.Cursor, memory_ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        output: Dict[str, np.ndarray] = {}
+        ids = list(memory_ids)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" for _ in chunk)
+            cursor.execute(
+                f"SELECT memory_id, signature FROM memory_fingerprints WHERE memory_id IN ({placeholders})",
+                chunk,
+            )
+            for memory_id, blob in cursor.fetchall():
+                output[memory_id] = np.frombuffer(blob, dtype="uint64")
+        return output
+
+
+class InMemoryLSH:
+    """Band-key buckets for deduplicating within one batch before it hits SQLite."""
+
+    def __init__(self):
+        self._buckets: Dict[Tuple[str, int], List[int]] = {}
+        self._exact: Dict[Tuple[str, str], List[int]] = {}
+
+    def add(self, position: int, memory_type: str, fingerprint: Fingerprint):
+        self._exact.setdefault((memory_type, fingerprint.content_hash), []).append(position)
+        for key in fingerprint.band_keys:
+            self._buckets.setdefault((memory_type, key), []).append(position)
+
+    def candidates(self, memory_type: str, fingerprint: Fingerprint, limit: int = 32) -> List[int]:
+        """Exact matches first, then positions ordered by shared band count."""
+        exact = self._exact.get((memory_type, fingerprint.content_hash), [])
+        hits: Dict[int, int] = {}
+        for key in fingerprint.band_keys:
+            for position in self._buckets.get((memory_type, key), []):
+                hits[position] = hits.get(position, 0) + 1
+        ranked = sorted(hits, key=lambda position: hits[position], reverse=True)
+        return list(dict.fromkeys([*exact, *ranked]))[:limit]
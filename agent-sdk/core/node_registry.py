@@ -12,6 +12,8 @@ from pathlib import Path
 from threading import RLock
 from typing import Any, Dict, List, Optional
 
+from core import sqlite_storage
+
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
@@ -26,9 +28,7 @@ class NodeRegistry:
         self._init_db()
 
     def _connect(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
-        return conn
+        return sqlite_storage.connect(self.db_path)
 
     def _init_db(self) -> None:
         with self._lock:
@@ -0,0 +1,99 @@
+"""
+Recall result cache.
+Ranked search results are cached per (user, normalized query, filters) in a
+bounded LRU. Each user has a generation counter that every write or delete
+bumps, and a global epoch is bumped for changes that affect every user (the
+embedding model becoming ready, an index swap). A generation is the pair
+(epoch, user counter); entries from an older generation are treated as
+misses, so a cached result never outlives a change to that user's memories
+or to the search setup.
+"""
+
+from __future__ import annotations
+
+import copy
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from core.embedding_cache import normalize_embedding_text
+
+
+def normalize_query(query: str) -> str:
+    """Whitespace-collapsed, NFC, case-folded query text."""
+    return normalize_embedding_text(query).casefold()
+
+
+class RecallCache:
+    """Bounded LRU of search results with per-user generation invalidation."""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max(0, int(max_entries))
+        # key -> (generation, result, cost in seconds)
+        self._entries: "OrderedDict[Tuple, Tuple[Tuple[int, int], Any, float]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self._lock = Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidated": 0, "saved_ms": 0.0}
+
+    @staticmethod
+    def make_key(user_id: str, query: str, *filters: Hashable) -> Tuple:
+        return (user_id, normalize_query(query), *filters)
+
+    def _current(self, user_id: str) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(user_id, 0)
+
+    def generation(self, user_id: str) -> Tuple[int, int]:
+        with self._lock:
+            return self._current(user_id)
+
+    def bump(self, user_id: Optional[str] = None) -> None:
+        """Invalidate one user's entries (or everyone's when ``user_id`` is None)."""
+        with self._lock:
+            if user_id is None:
+                # 全局 epoch 也覆盖还没有计数器的用户：他们正在进行的检索拿到的旧 generation 随之失效
+                self._epoch += 1
+                self._entries.clear()
+                return
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        """Deep copy of the cached result, or None on miss / stale generation."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            generation, result, cost = entry
+            if generation != self._current(key[0]):
+                del self._entries[key]
+                self.stats["invalidated"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            self.stats["saved_ms"] += cost * 1000
+        return copy.deepcopy(result)
+
+    def put(self, key: Tuple, result: Any, generation: Tuple[int, int], cost: float = 0.0) -> None:
+        """Store ``result`` computed at ``generation``; dropped if the user has moved on since."""
+        if not self.max_entries:
+            return
+        stored = copy.deepcopy(result)
+        with self._lock:
+            if generation != self._current(key[0]):
+                return
+            self._entries[key] = (generation, stored, float(cost))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["saved_ms"] = round(stats["saved_ms"], 3)
+        return stats
+
@@ -0,0 +1,56 @@
+"""
+Process pool for bulk re-embedding.
+Each worker process builds its own copy of the embedding model once (from a
+picklable factory) and then encodes whole batches, so model inference for a
+full index rebuild runs on several cores without contending for the GIL or
+for the serving process's model. Workers are spawned rather than forked: the
+parent holds SQLite connections, FAISS indexes and background threads that
+must not be inherited.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+_worker_model = None
+
+
+def _init_worker(factory: Callable[[], object]) -> None:
+    global _worker_model
+    _worker_model = factory()
+
+
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    return np.asarray(_worker_model.encode(texts), dtype="float32")
+
+
+class EmbeddingProcessPool:
+    """Encodes batches of texts in ``workers`` processes, preserving order."""
+
+    def __init__(self, factory: Callable[[], object], workers: int):
+        self.workers = max(1, int(workers))
+        self._pool: Optional[ProcessPoolExecutor] = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(factory,),
+        )
+
+    def encode(self, batches: Sequence[List[str]]) -> List[np.ndarray]:
+        """One ``(len(batch), dim)`` matrix per batch, in input order."""
+        return list(self._pool.map(_encode_batch, batches))
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def __enter__(self) -> "EmbeddingProcessPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
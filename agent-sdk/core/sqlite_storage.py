@@ -0,0 +1,183 @@
+"""
+Shared SQLite storage layer.
+Every store gets its connections from a per-database pool. Connections are
+opened once in WAL mode with tuned pragmas and a statement cache; calling
+``close()`` on a pooled connection rolls back anything uncommitted and hands
+it back to the pool instead of closing the file. SQL functions registered
+with ``register_function`` (e.g. ones that triggers call) are installed on
+every connection the pools open.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+class PooledConnection(sqlite3.Connection):
+    """``sqlite3.Connection`` whose ``close()`` returns it to its pool."""
+
+    _pool: Optional["ConnectionPool"] = None
+    _checked_out = False
+
+    def close(self) -> None:
+        pool = self._pool
+        if pool is None:
+            super().close()
+            return
+        pool.release(self)
+
+    def _close(self) -> None:
+        self._pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """Bounded set of idle connections to one database file."""
+
+    def __init__(
+        self,
+        db_path: Union[str, Path],
+        max_idle: int = 8,
+        busy_timeout_ms: int = 5000,
+        cache_size_kb: int = 16384,
+        mmap_size: int = 256 * 1024 * 1024,
+        cached_statements: int = 256,
+    ):
+        self.db_path = str(db_path)
+        self.max_idle = max(0, int(max_idle))
+        self.busy_timeout_ms = max(0, int(busy_timeout_ms))
+        self.cache_size_kb = int(cache_size_kb)
+        self.mmap_size = max(0, int(mmap_size))
+        self.cached_statements = max(0, int(cached_statements))
+        self._idle: List[PooledConnection] = []
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "reused": 0, "closed": 0}
+
+    def _open(self) -> PooledConnection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000.0,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            factory=PooledConnection,
+        )
+        conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout_ms}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute(f"PRAGMA cache_size = {-abs(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+        for name, (num_params, fn) in _functions.items():
+            conn.create_function(name, num_params, fn, deterministic=True)
+        self.stats["opened"] += 1
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            if conn is not None:
+                self.stats["reused"] += 1
+        if conn is None:
+            conn = self._open()
+        conn._pool = self
+        conn._checked_out = True
+        return conn
+
+    def release(self, conn: PooledConnection) -> None:
+        if not conn._checked_out:
+            return
+        conn._checked_out = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+        except sqlite3.Error:
+            conn._close()
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self.stats["closed"] += 1
+        conn._close()
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn._close()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self.stats, "idle": len(self._idle)}
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+_functions: Dict[str, Tuple[int, Callable]] = {}
+
+
+def register_function(name: str, num_params: int, fn: Callable) -> None:
+    """
+    Install a deterministic SQL function on every pooled connection.
+    Register at import time, before the pools open connections that need it.
+    """
+    _functions[name] = (num_params, fn)
+
+
+def get_pool(db_path: Union[str, Path]) -> ConnectionPool:
+    """Return the shared pool for ``db_path``, creating it on first use."""
+    key = os.path.abspath(str(db_path))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(
+                key,
+                max_idle=_env_int("SQLITE_POOL_MAX_IDLE", 8),
+                busy_timeout_ms=_env_int("SQLITE_BUSY_TIMEOUT_MS", 5000),
+                cache_size_kb=_env_int("SQLITE_CACHE_SIZE_KB", 16384),
+                mmap_size=_env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+                cached_statements=_env_int("SQLITE_CACHED_STATEMENTS", 256),
+            )
+            _pools[key] = pool
+        return pool
+
+
+def connect(db_path: Union[str, Path], row_factory=sqlite3.Row) -> PooledConnection:
+    """Check out a pooled connection; ``close()`` returns it to the pool."""
+    conn = get_pool(db_path).acquire()
+    conn.row_factory = row_factory
+    return conn
+
+
+def close_pool(db_path: Union[str, Path]) -> None:
+    key = os.path.abspath(str(db_path))
+    with _pools_lock:
+        pool = _pools.pop(key, None)
+    if pool is not None:
+        pool.close_all()
+
+
+def close_all_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+def pool_stats() -> Dict[str, Dict]:
+    with _pools_lock:
+        pools = dict(_pools)
+    return {path: pool.get_stats() for path, pool in pools.items()}
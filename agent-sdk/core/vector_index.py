@@ -0,0 +1,677 @@
+"""
+Per-user vector index store.
+Each user owns an ID-mapped FAISS index keyed by the memory rowid, so search,
+reconstruct and delete only touch that user's vectors.
+
+Persistence is write-behind: every add/remove is appended (and fsynced) to a
+per-user journal, and full snapshots are written by a background thread once
+enough records pile up or the snapshot interval elapses. Loading replays the
+journal on top of the last snapshot.
+
+Locking is per user: a user's index, journal and snapshot are guarded by
+that user's own locks, and the store-wide lock only covers the dictionaries
+that map users to them. One user's search never waits for another user's
+cold load, snapshot or journal fsync; the fsync itself runs after the index
+lock is released.
+
+The index type follows the user's vector count (see ``IndexTierPolicy``):
+exact flat search for small corpora, IVF for medium ones and compressed IVF
+(float16 or PQ codes) for very large ones. Tier changes are rebuilt in the
+background and swapped in atomically.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+import os
+import re
+import struct
+import time
+import zlib
+from collections import deque
+from pathlib import Path
+from threading import Event, RLock, Thread
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Journal record: op (1 byte) | count (uint32) | payload length (uint32) | crc32 (uint32) | payload
+_RECORD_HEADER = struct.Struct("<cIII")
+_OP_ADD = b"A"
+_OP_REMOVE = b"R"
+
+TIER_FLAT = "flat"
+TIER_IVF = "ivf"
+TIER_IVF_FP16 = "ivf_fp16"
+TIER_IVF_PQ = "ivf_pq"
+_TIER_RANK = {TIER_FLAT: 0, TIER_IVF: 1, TIER_IVF_FP16: 2, TIER_IVF_PQ: 2}
+
+
+class IndexTierPolicy:
+    """
+    Picks the FAISS index type for a user's vector count.
+
+    - ``flat``: ``IndexIDMap2(IndexFlatL2)``, exact, 4*dim bytes per vector.
+    - ``ivf``: ``IndexIVFFlat``, searches ``nprobe`` of ``nlist`` lists.
+    - ``ivf_fp16`` / ``ivf_pq``: IVF with float16 (2*dim bytes) or PQ codes
+      (``pq_bytes`` bytes) per vector.
+
+    HNSW is not offered: FAISS HNSW indexes cannot delete vectors, and the
+    store removes vectors on every memory delete and compaction. IVF indexes
+    use a hashtable direct map, so ids, deletes and reconstruct keep working.
+    Tiers go up as soon as a threshold is crossed, and only come back down
+    when the count drops below ``hysteresis`` times that threshold.
+    """
+
+    def __init__(
+        self,
+        flat_max: int = 20000,
+        ivf_max: int = 250000,
+        large_tier: str = TIER_IVF_FP16,
+        nprobe: int = 16,
+        pq_bytes: Optional[int] = None,
+        hysteresis: float = 0.5,
+        train_sample: int = 65536,
+    ):
+        if large_tier not in (TIER_IVF_FP16, TIER_IVF_PQ):
+            raise ValueError(f"large_tier must be {TIER_IVF_FP16!r} or {TIER_IVF_PQ!r}")
+        self.flat_max = max(0, int(flat_max))
+        self.ivf_max = max(self.flat_max, int(ivf_max))
+        self.large_tier = large_tier
+        self.nprobe = max(1, int(nprobe))
+        self.pq_bytes = pq_bytes
+        self.hysteresis = min(1.0, max(0.0, float(hysteresis)))
+        self.train_sample = max(1, int(train_sample))
+
+    def _target(self, count: int) -> str:
+        if count <= self.flat_max:
+            return TIER_FLAT
+        if count <= self.ivf_max:
+            return TIER_IVF
+        return self.large_tier
+
+    def tier_for(self, count: int, current: Optional[str] = None) -> str:
+        target = self._target(count)
+        if current is None or _TIER_RANK.get(target, 0) >= _TIER_RANK.get(current, 0):
+            return target
+        floor = self.flat_max if current == TIER_IVF else self.ivf_max
+        return target if count < floor * self.hysteresis else current
+
+    @staticmethod
+    def tier_of(index) -> Optional[str]:
+        if isinstance(index, faiss.IndexIDMap2):
+            return TIER_FLAT
+        if isinstance(index, faiss.IndexIVFFlat):
+            return TIER_IVF
+        if isinstance(index, faiss.IndexIVFScalarQuantizer):
+            return TIER_IVF_FP16
+        if isinstance(index, faiss.IndexIVFPQ):
+            return TIER_IVF_PQ
+        return None
+
+    @staticmethod
+    def nlist_for(count: int) -> int:
+        # ~4*sqrt(n) lists, with enough training points per centroid.
+        return max(1, min(int(4 * math.sqrt(max(count, 1))), count // 39 or 1, 65536))
+
+    def pq_subquantizers(self, dim: int) -> int:
+        """Largest divisor of ``dim`` not above the PQ byte budget (default dim/8)."""
+        budget = max(1, int(self.pq_bytes or dim // 8))
+        return max(m for m in range(1, min(budget, dim) + 1) if dim % m == 0)
+
+    def bytes_per_vector(self, tier: Optional[str], dim: int) -> int:
+        """Approximate resident size of one vector including its id."""
+        if tier == TIER_IVF_FP16:
+            return 2 * dim + 8
+        if tier == TIER_IVF_PQ:
+            return self.pq_subquantizers(dim) + 8
+        return 4 * dim + 8
+
+    def configure(self, index) -> None:
+        """Apply search-time recall settings to a loaded index."""
+        if self.tier_of(index) not in (None, TIER_FLAT):
+            ivf = faiss.extract_index_ivf(index)
+            ivf.nprobe = min(self.nprobe, ivf.nlist)
+
+    def build(self, tier: str, dim: int, ids: np.ndarray, matrix: np.ndarray):
+        """Build and fill an index of ``tier``; IVF tiers are trained on (a sample of) ``matrix``."""
+        if tier == TIER_FLAT or len(ids) == 0:
+            index = faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+            if len(ids):
+                index.add_with_ids(matrix, ids)
+            return index
+
+        nlist = self.nlist_for(len(ids))
+        quantizer = faiss.IndexFlatL2(dim)
+        if tier == TIER_IVF:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_L2)
+        elif tier == TIER_IVF_FP16:
+            index = faiss.IndexIVFScalarQuantizer(
+                quantizer, dim, nlist, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2
+            )
+        elif tier == TIER_IVF_PQ:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, self.pq_subquantizers(dim), 8)
+        else:
+            raise ValueError(f"unknown index tier: {tier}")
+
+        sample = matrix
+        if len(matrix) > self.train_sample:
+            rng = np.random.default_rng(len(matrix))
+            sample = matrix[np.sort(rng.choice(len(matrix), self.train_sample, replace=False))]
+        index.train(np.ascontiguousarray(sample))
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        index.add_with_ids(matrix, ids)
+        self.configure(index)
+        return index
+
+
+def export_vectors(index, dim: int) -> Tuple[np.ndarray, np.ndarray]:
+    """All ``(ids, vectors)`` held by an index built by ``IndexTierPolicy``."""
+    if isinstance(index, faiss.IndexIDMap2):
+        ids = faiss.vector_to_array(index.id_map).astype("int64")
+        matrix = index.index.reconstruct_n(0, index.ntotal) if index.ntotal else np.empty((0, dim), "float32")
+        return ids, matrix
+    ivf = faiss.extract_index_ivf(index)
+    invlists = ivf.invlists
+    parts = []
+    for list_no in range(ivf.nlist):
+        size = invlists.list_size(list_no)
+        if size:
+            parts.append(faiss.rev_swig_ptr(invlists.get_ids(list_no), size).copy())
+    ids = np.concatenate(parts).astype("int64") if parts else np.empty(0, dtype="int64")
+    matrix = index.reconstruct_batch(ids) if len(ids) else np.empty((0, dim), "float32")
+    return ids, np.ascontiguousarray(matrix, dtype="float32")
+
+
+class VectorIndexStore:
+    """
+    Lazily loaded per-user FAISS indexes under one directory, keyed by rowid.
+
+    Each user's index is a flat, IVF, IVF-fp16 or IVF-PQ index picked by
+    ``tiering`` and rebuilt in the background when the vector count crosses a
+    tier boundary. Writes go to the in-memory index plus an fsynced per-user
+    journal; a background thread writes snapshots and rotates the journal.
+    """
+
+    def __init__(
+        self,
+        index_dir: Path,
+        dim: int,
+        snapshot_every: int = 256,
+        snapshot_interval_sec: float = 60.0,
+        fsync: bool = True,
+        tiering: Optional[IndexTierPolicy] = None,
+        auto_retier: bool = True,
+    ):
+        if not FAISS_AVAILABLE:
+            raise RuntimeError("faiss is not installed")
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.dim = int(dim)
+        self.snapshot_every = max(1, int(snapshot_every))
+        self.snapshot_interval_sec = float(snapshot_interval_sec)
+        self.fsync = fsync
+        self.tiering = tiering or IndexTierPolicy()
+        self.auto_retier = auto_retier
+        self._indexes: Dict[str, "faiss.Index"] = {}
+        # user_id -> (index lock, snapshot lock); the store lock only guards these dicts
+        self._user_locks: Dict[str, Tuple[RLock, RLock]] = {}
+        # user_id -> journal records written since the last snapshot
+        self._pending: Dict[str, int] = {}
+        self._journals: Dict[str, object] = {}
+        self._lock = RLock()
+        self._wake = Event()
+        self._stop = Event()
+        self._worker: Optional[Thread] = None
+        # user_id -> writes made while a tier rebuild for that user is running
+        self._retier_deltas: Dict[str, List[Tuple[bytes, np.ndarray, Optional[np.ndarray]]]] = {}
+        self._retier_threads: Dict[str, Thread] = {}
+        self._search_ms: deque = deque(maxlen=2048)
+        self.stats = {"journal_records": 0, "snapshots": 0, "replayed_records": 0, "retiers": 0}
+
+    # ------------------------------------------------------------------
+    # paths / files
+    # ------------------------------------------------------------------
+
+    def _base_for(self, user_id: str) -> Path:
+        slug = re.sub(r"[^A-Za-z0-9_-]+", "_", user_id or "")[:40] or "user"
+        digest = hashlib.sha1((user_id or "").encode("utf-8")).hexdigest()[:10]
+        return self.index_dir / f"{slug}-{digest}"
+
+    def _path_for(self, user_id: str) -> Path:
+        return self._base_for(user_id).with_suffix(".faiss")
+
+    def _journal_path(self, user_id: str) -> Path:
+        return self._base_for(user_id).with_suffix(".journal")
+
+    def _rotated_journal_path(self, user_id: str) -> Path:
+        return self._base_for(user_id).with_suffix(".journal.prev")
+
+    def _new_index(self):
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(self.dim))
+
+    def _locks_for(self, user_id: str) -> Tuple[RLock, RLock]:
+        with self._lock:
+            locks = self._user_locks.get(user_id)
+            if locks is None:
+                locks = self._user_locks[user_id] = (RLock(), RLock())
+            return locks
+
+    def _index_lock(self, user_id: str) -> RLock:
+        """Guards one user's in-memory index and journal handle."""
+        return self._locks_for(user_id)[0]
+
+    def _snapshot_lock(self, user_id: str) -> RLock:
+        """Serializes one user's snapshot writes; taken before the index lock."""
+        return self._locks_for(user_id)[1]
+
+    def _close_journal(self, user_id: str) -> None:
+        handle = self._journals.pop(user_id, None)
+        if handle is not None:
+            handle.close()
+
+    def _append(self, user_id: str, op: bytes, ids: np.ndarray, matrix: Optional[np.ndarray] = None) -> Optional[int]:
+        """
+        Write one journal record. Caller holds the user's index lock. Returns a
+        duplicated descriptor to fsync once that lock is released (None when
+        fsync is off); see ``_sync_journal``.
+        """
+        payload = ids.tobytes() + (matrix.tobytes() if matrix is not None else b"")
+        record = _RECORD_HEADER.pack(op, len(ids), len(payload), zlib.crc32(payload)) + payload
+        handle = self._journals.get(user_id)
+        if handle is None:
+            handle = open(self._journal_path(user_id), "ab")
+            self._journals[user_id] = handle
+        handle.write(record)
+        handle.flush()
+        with self._lock:
+            self._pending[user_id] = self._pending.get(user_id, 0) + 1
+            self.stats["journal_records"] += 1
+            due = self._pending[user_id] >= self.snapshot_every
+        if due:
+            self._wake.set()
+        return os.dup(handle.fileno()) if self.fsync else None
+
+    @staticmethod
+    def _sync_journal(fd: Optional[int]) -> None:
+        # The dup keeps the inode alive even if a snapshot rotates or deletes the journal meanwhile.
+        if fd is None:
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _replay(self, index, path: Path) -> int:
+        """Apply journal records to ``index``; stops at the first torn/corrupt record."""
+        if not path.exists():
+            return 0
+        applied = 0
+        data = path.read_bytes()
+        offset = 0
+        while offset + _RECORD_HEADER.size <= len(data):
+            op, count, length, crc = _RECORD_HEADER.unpack_from(data, offset)
+            start = offset + _RECORD_HEADER.size
+            payload = data[start:start + length]
+            if len(payload) != length or zlib.crc32(payload) != crc:
+                logger.warning(f"Vector journal {path.name} truncated at byte {offset}; ignoring the tail")
+                break
+            ids = np.frombuffer(payload[:count * 8], dtype="int64")
+            index.remove_ids(ids)
+            if op == _OP_ADD:
+                matrix = np.frombuffer(payload[count * 8:], dtype="float32").reshape(count, self.dim)
+                index.add_with_ids(np.ascontiguousarray(matrix), ids)
+            offset = start + length
+            applied += 1
+        return applied
+
+    def _load(self, user_id: str, create: bool):
+        """Return the user's index, reading snapshot + journals on first use. Caller holds the user's index lock."""
+        index = self._indexes.get(user_id)
+        if index is not None:
+            return index
+        path = self._path_for(user_id)
+        journal = self._journal_path(user_id)
+        rotated = self._rotated_journal_path(user_id)
+        if path.exists():
+            try:
+                index = faiss.read_index(str(path))
+            except Exception as e:
+                logger.error(f"Failed to read vector index for {user_id}: {e}")
+                index = None
+        if index is None and not (create or journal.exists() or rotated.exists()):
+            return None
+        if index is None:
+            index = self._new_index()
+        self.tiering.configure(index)
+
+        replayed = self._replay(index, rotated) + self._replay(index, journal)
+        with self._lock:
+            self._indexes[user_id] = index
+        if replayed:
+            with self._lock:
+                self.stats["replayed_records"] += replayed
+            logger.info(f"Recovered vector index for {user_id}: replayed {replayed} journal records")
+            # Fold the journals into a fresh snapshot so at most one rotated journal exists later.
+            self._write(user_id, index)
+        return index
+
+    def _write_snapshot(self, user_id: str, data: np.ndarray) -> None:
+        path = self._path_for(user_id)
+        tmp_path = path.with_suffix(".faiss.tmp")
+        with open(tmp_path, "wb") as handle:
+            handle.write(data.tobytes())
+            handle.flush()
+            if self.fsync:
+                os.fsync(handle.fileno())
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.stats["snapshots"] += 1
+
+    def _write(self, user_id: str, index) -> None:
+        """Write a full snapshot atomically and discard journals it covers. Caller holds the user's locks."""
+        self._write_snapshot(user_id, faiss.serialize_index(index))
+        self._close_journal(user_id)
+        for journal in (self._journal_path(user_id), self._rotated_journal_path(user_id)):
+            if journal.exists():
+                journal.unlink()
+        with self._lock:
+            self._pending.pop(user_id, None)
+
+    def _snapshot(self, user_id: str) -> bool:
+        """
+        Snapshot one user's index without blocking writers on disk I/O:
+        serialize + rotate the journal under the lock, then write the file.
+        """
+        with self._snapshot_lock(user_id):
+            with self._index_lock(user_id):
+                index = self._indexes.get(user_id)
+                if index is None or not self._pending.get(user_id):
+                    return False
+                data = faiss.serialize_index(index)
+                self._close_journal(user_id)
+                journal = self._journal_path(user_id)
+                if journal.exists():
+                    os.replace(journal, self._rotated_journal_path(user_id))
+                with self._lock:
+                    self._pending[user_id] = 0
+
+            self._write_snapshot(user_id, data)
+            rotated = self._rotated_journal_path(user_id)
+            if rotated.exists():
+                rotated.unlink()
+            return True
+
+    # ------------------------------------------------------------------
+    # background snapshots
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Start the background snapshot thread (idempotent)."""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stop.clear()
+        self._worker = Thread(target=self._run, name="vector-index-snapshot", daemon=True)
+        self._worker.start()
+
+    def _run(self) -> None:
+        last_full = time.monotonic()
+        while not self._stop.is_set():
+            self._wake.wait(timeout=max(0.1, self.snapshot_interval_sec))
+            self._wake.clear()
+            interval_due = time.monotonic() - last_full >= self.snapshot_interval_sec
+            with self._lock:
+                due = [
+                    user_id for user_id, pending in self._pending.items()
+                    if pending and (interval_due or pending >= self.snapshot_every)
+                ]
+            for user_id in due:
+                try:
+                    self._snapshot(user_id)
+                except Exception as e:
+                    logger.error(f"Vector index snapshot failed for {user_id}: {e}")
+            if interval_due:
+                last_full = time.monotonic()
+
+    def checkpoint(self) -> int:
+        """Snapshot every user with pending journal records. Returns snapshots written."""
+        with self._lock:
+            users = [user_id for user_id, pending in self._pending.items() if pending]
+        return sum(1 for user_id in users if self._snapshot(user_id))
+
+    def _maybe_retier(self, user_id: str, index) -> None:
+        """Start a background rebuild when the vector count has left the current tier. Caller holds the user's index lock."""
+        if not self.auto_retier or self._stop.is_set():
+            return
+        current = self.tiering.tier_of(index)
+        if self.tiering.tier_for(int(index.ntotal), current) == current:
+            return
+        with self._lock:
+            if user_id in self._retier_threads:
+                return
+            worker = Thread(target=self._retier_in_background, args=(user_id,), name="vector-index-retier", daemon=True)
+            self._retier_threads[user_id] = worker
+        worker.start()
+
+    def _retier_in_background(self, user_id: str) -> None:
+        try:
+            self.retier(user_id)
+        except Exception as e:
+            logger.error(f"Vector index rebuild failed for {user_id}: {e}")
+        finally:
+            with self._lock:
+                self._retier_threads.pop(user_id, None)
+
+    def retier(self, user_id: str, tier: Optional[str] = None) -> Optional[str]:
+        """
+        Rebuild a user's index as ``tier`` (default: what the policy picks for
+        its size). The build runs without holding the store lock; writes made
+        meanwhile are recorded and replayed onto the new index before it is
+        swapped in and snapshotted. Returns the tier in use afterwards.
+        """
+        with self._index_lock(user_id):
+            index = self._load(user_id, create=False)
+            if index is None:
+                return None
+            current = self.tiering.tier_of(index)
+            target = tier or self.tiering.tier_for(int(index.ntotal), current)
+            if target == current:
+                return current
+            if user_id in self._retier_deltas:
+                return current
+            ids, matrix = export_vectors(index, self.dim)
+            self._retier_deltas[user_id] = []
+
+        started = time.perf_counter()
+        try:
+            rebuilt = self.tiering.build(target, self.dim, ids, matrix)
+        except Exception:
+            with self._index_lock(user_id):
+                self._retier_deltas.pop(user_id, None)
+            raise
+
+        with self._snapshot_lock(user_id):
+            with self._index_lock(user_id):
+                deltas = self._retier_deltas.pop(user_id, None)
+                if deltas is None:
+                    # replace() or drop() won the race; keep their result.
+                    return self.tiering.tier_of(self._indexes.get(user_id))
+                for op, delta_ids, delta_matrix in deltas:
+                    rebuilt.remove_ids(delta_ids)
+                    if op == _OP_ADD:
+                        rebuilt.add_with_ids(delta_matrix, delta_ids)
+                with self._lock:
+                    self._indexes[user_id] = rebuilt
+                    self._pending[user_id] = self._pending.get(user_id, 0) + 1
+            self._snapshot(user_id)
+        with self._lock:
+            self.stats["retiers"] += 1
+        logger.info(
+            f"Vector index for {user_id}: {current} -> {target} "
+            f"({int(rebuilt.ntotal)} vectors, {time.perf_counter() - started:.2f}s)"
+        )
+        return target
+
+    def close(self) -> None:
+        """Stop the background threads and fold all journals into snapshots."""
+        self._stop.set()
+        self._wake.set()
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+            self._worker = None
+        with self._lock:
+            rebuilds = list(self._retier_threads.values())
+        for worker in rebuilds:
+            worker.join(timeout=60)
+        self.checkpoint()
+        with self._lock:
+            users = list(self._journals)
+        for user_id in users:
+            with self._index_lock(user_id):
+                self._close_journal(user_id)
+
+    def pending_records(self) -> int:
+        with self._lock:
+            return sum(self._pending.values())
+
+    def get_stats(self) -> Dict:
+        """Journal counters plus per-tier sizes, estimated memory and search latency."""
+        with self._lock:
+            tiers: Dict[str, Dict[str, int]] = {}
+            for index in self._indexes.values():
+                tier = self.tiering.tier_of(index) or "other"
+                entry = tiers.setdefault(tier, {"users": 0, "vectors": 0, "bytes": 0})
+                entry["users"] += 1
+                entry["vectors"] += int(index.ntotal)
+                entry["bytes"] += int(index.ntotal) * self.tiering.bytes_per_vector(tier, self.dim)
+            latencies = sorted(self._search_ms)
+            stats = {
+                **self.stats,
+                "pending_records": sum(self._pending.values()),
+                "rebuilding": sorted(self._retier_threads),
+            }
+        stats["tiers"] = tiers
+        stats["search_p50_ms"] = round(latencies[len(latencies) // 2], 3) if latencies else 0.0
+        stats["search_p99_ms"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 3) if latencies else 0.0
+        return stats
+
+    # ------------------------------------------------------------------
+    # public API
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _as_ids(ids: Iterable[int]) -> np.ndarray:
+        return np.asarray([int(i) for i in ids], dtype="int64")
+
+    def _as_matrix(self, vectors) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype="float32")
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        return np.ascontiguousarray(matrix)
+
+    def count(self, user_id: str) -> int:
+        with self._index_lock(user_id):
+            index = self._load(user_id, create=False)
+            return int(index.ntotal) if index is not None else 0
+
+    def add(self, user_id: str, ids: Sequence[int], vectors) -> None:
+        """Add (or overwrite) vectors for ``ids``; durable once this returns."""
+        if not len(ids):
+            return
+        id_array = self._as_ids(ids)
+        matrix = self._as_matrix(vectors)
+        with self._index_lock(user_id):
+            index = self._load(user_id, create=True)
+            fd = self._append(user_id, _OP_ADD, id_array, matrix)
+            # FAISS allows duplicate ids; drop stale copies first.
+            index.remove_ids(id_array)
+            index.add_with_ids(matrix, id_array)
+            if user_id in self._retier_deltas:
+                self._retier_deltas[user_id].append((_OP_ADD, id_array, matrix))
+            self._maybe_retier(user_id, index)
+        self._sync_journal(fd)
+
+    def remove(self, user_id: str, ids: Sequence[int]) -> int:
+        """Remove vectors by id. Returns the number actually removed."""
+        if not len(ids):
+            return 0
+        id_array = self._as_ids(ids)
+        fd = None
+        with self._index_lock(user_id):
+            index = self._load(user_id, create=False)
+            if index is None:
+                return 0
+            removed = int(index.remove_ids(id_array))
+            if removed:
+                fd = self._append(user_id, _OP_REMOVE, id_array)
+                if user_id in self._retier_deltas:
+                    self._retier_deltas[user_id].append((_OP_REMOVE, id_array, None))
+                self._maybe_retier(user_id, index)
+        self._sync_journal(fd)
+        return removed
+
+    def search(self, user_id: str, query, k: int) -> List[Tuple[int, float]]:
+        """Return ``[(vector_id, l2_distance), ...]`` nearest first."""
+        started = time.perf_counter()
+        with self._index_lock(user_id):
+            index = self._load(user_id, create=False)
+            if index is None or index.ntotal == 0 or k <= 0:
+                return []
+            distances, ids = index.search(self._as_matrix(query), min(int(k), int(index.ntotal)))
+            self._search_ms.append((time.perf_counter() - started) * 1000)
+        return [
+            (int(vector_id), float(distance))
+            for vector_id, distance in zip(ids[0], distances[0])
+            if vector_id != -1
+        ]
+
+    def reconstruct_many(self, user_id: str, ids: Iterable[int]) -> Dict[int, np.ndarray]:
+        """Fetch stored vectors by id; missing ids are skipped."""
+        output: Dict[int, np.ndarray] = {}
+        with self._index_lock(user_id):
+            index = self._load(user_id, create=False)
+            if index is None:
+                return output
+            for vector_id in ids:
+                try:
+                    output[int(vector_id)] = index.reconstruct(int(vector_id))
+                except Exception:
+                    continue
+        return output
+
+    def replace(self, user_id: str, ids: Sequence[int], vectors) -> None:
+        """Build a fresh index (tier picked by size) from scratch and swap it in atomically."""
+        id_array = self._as_ids(ids)
+        matrix = self._as_matrix(vectors) if len(ids) else np.empty((0, self.dim), dtype="float32")
+        index = self.tiering.build(self.tiering.tier_for(len(id_array)), self.dim, id_array, matrix)
+        with self._snapshot_lock(user_id), self._index_lock(user_id):
+            self._retier_deltas.pop(user_id, None)
+            self._write(user_id, index)
+            with self._lock:
+                self._indexes[user_id] = index
+
+    def drop(self, user_id: str) -> None:
+        """Forget a user's index entirely (memory and disk)."""
+        with self._snapshot_lock(user_id), self._index_lock(user_id):
+            with self._lock:
+                self._indexes.pop(user_id, None)
+                self._pending.pop(user_id, None)
+            self._retier_deltas.pop(user_id, None)
+            self._close_journal(user_id)
+            for path in (
+                self._path_for(user_id),
+                self._journal_path(user_id),
+                self._rotated_journal_path(user_id),
+            ):
+                if path.exists():
+                    path.unlink()
@@ -33,10 +33,12 @@ from core.execution_approval import ExecutionApprovalStore
 from core.channel_task_queue import ChannelTaskQueue
 from core.node_registry import NodeRegistry
 from core.autonomy_state import AutonomyStateStore
+from core import sqlite_storage
 from services.feishu_adapter import FeishuAdapter
 from models.request import (
     ChatRequest,
     MemoryRequest,
+    MemoryBulkRequest,
     SkillInstallRequest,
     SkillLocalInstallRequest,
     SkillCreateRequest,
@@ -160,6 +162,18 @@ FEISHU_CONFIG_PATH = DATA_DIR / "feishu_config.json"
 _startup_mark("core_stores_ready")
 
 
+def _on_embedding_warmup(state: str) -> None:
+    """预热线程的进度回调：记入启动剖析，模型就绪（或失败）时再输出一次报告。"""
+    _startup_mark(f"embedding_{state}")
+    if state in {"ready", "failed"}:
+        _startup_report()
+
+
+# 嵌入模型在后台加载并预热，和后续的启动步骤并行；就绪前记忆检索只走关键词召回
+if memory_manager.embedding_warmup and memory_manager.start_embedding_warmup(on_progress=_on_embedding_warmup):
+    _startup_mark("embedding_warmup_started")
+
+
 def _load_feishu_config() -> dict:
     config = {
         "app_id": os.getenv("FEISHU_APP_ID", ""),
@@ -535,6 +549,13 @@ _startup_mark("bootstrap_complete")
 _startup_report()
 
 
+@app.on_event("shutdown")
+async def _flush_on_shutdown():
+    """Fold vector journals into snapshots and close pooled SQLite connections."""
+    memory_manager.close()
+    sqlite_storage.close_all_pools()
+
+
 def _extract_mcp_tools_from_skill_md(skill_path: Path) -> list[str]:
     """Extract MCP tool references from SKILL.md for readiness diagnostics."""
     skill_md = skill_path / "SKILL.md"
@@ -709,6 +730,8 @@ async def root():
         "version": "0.1.0",
         "skills_count": len(skills_loader.skills),
         "skills_snapshot_version": skills_meta.get("version"),
+        # 进程存活即 ok；向量召回要等 embedding.ready 为 true，在此之前只有关键词召回
+        "embedding": memory_manager.get_embedding_status(),
     }
 
 
@@ -821,6 +844,25 @@ async def save_memory(request: MemoryRequest):
         return {"success": False, "error": str(e)}
 
 
+@app.post("/memory/save-bulk")
+async def save_memories_bulk(request: MemoryBulkRequest):
+    """批量保存记忆（批量编码、单事务写入、向量索引只落盘一次）"""
+    try:
+        memory_ids = await memory_manager.save_memories_bulk(
+            user_id=request.user_id,
+            items=[item.model_dump() for item in request.items],
+            batch_size=request.batch_size,
+        )
+        return {
+            "success": True,
+            "memory_ids": memory_ids,
+            "saved": len(set(memory_ids)),
+        }
+    except Exception as e:
+        logger.error(f"批量保存记忆错误: {e}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
 @app.get("/memory/search")
 async def search_memory(user_id: str, query: str, top_k: int = 5):
     """搜索记忆（纯向量搜索）"""
@@ -904,12 +946,18 @@ async def search_memory_v2(
 
 
 @app.get("/memory/get")
-async def get_memory_v2(user_id: str, memory_id: str):
+async def get_memory_v2(user_id: str, memory_id: str = None, memory_ids: str = None):
     """
     Two-stage memory recall (stage 2/get):
-    fetch full memory by id.
+    fetch full memory by id, or several at once with comma-separated memory_ids.
     """
     try:
+        if memory_ids:
+            ids = [item.strip() for item in memory_ids.split(",") if item.strip()]
+            memories = await memory_manager.get_memory_details(user_id=user_id, memory_ids=ids)
+            return {"success": True, "memories": memories, "total": len(memories)}
+        if not memory_id:
+            return {"success": False, "error": "memory_id is required"}
         memory = await memory_manager.get_memory_detail(user_id=user_id, memory_id=memory_id)
         if not memory:
             return {"success": False, "error": "memory_not_found"}
@@ -989,6 +1037,7 @@ async def clear_all_memories(user_id: str, backup: bool = True):
                 import json
                 from datetime import datetime
 
+                await memory_manager.flush_markdown_async()
                 backup_data = memory_manager.markdown_memory.export_to_json()
                 backup_filename = f"memory_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
                 backup_dir = memory_manager.data_dir / "backups"
@@ -1007,28 +1056,15 @@ async def clear_all_memories(user_id: str, backup: bool = True):
                     "message": "为了安全，清空操作已取消"
                 }
 
-        # 3. 清空数据库记忆
-        conn = memory_manager._get_connection()
-        cursor = conn.cursor()
+        # 3. 清空数据库记忆与该用户的 FAISS 索引
+        await memory_manager.clear_memories(user_id)
 
-        # 删除所有该用户的记忆
-        cursor.execute("DELETE FROM semantic_memories WHERE user_id = ?", (user_id,))
-        cursor.execute("DELETE FROM semantic_memories_fts WHERE id IN (SELECT id FROM semantic_memories WHERE user_id = ?)", (user_id,))
-
-        conn.commit()
-        conn.close()
-
-        # 4. 清空 FAISS 索引（重建空索引）
-        if memory_manager.index and memory_manager.embedding_dim:
-            import faiss
-            memory_manager.index = faiss.IndexFlatL2(memory_manager.embedding_dim)
-            faiss.write_index(memory_manager.index, str(memory_manager.index_path))
-
-        # 5. 清空 Markdown 文件
+        # 4. 清空 Markdown 文件
         if memory_manager.markdown_memory:
             try:
-                # 重新初始化 MEMORY.md（覆盖为空模板）
-                memory_manager.markdown_memory._initialize_memory_file()
+                # 重新初始化 MEMORY.md（覆盖为空模板）并删除旧分段；先让排队中的镜像写完，避免清空后又被追加
+                await memory_manager.flush_markdown_async()
+                memory_manager.markdown_memory.clear_long_term()
 
                 # 删除所有每日日志（可选，这里保留日志文件）
                 # 如果要删除日志，取消下面的注释
@@ -1076,6 +1112,63 @@ async def compact_memories(
         return {"success": False, "error": str(e)}
 
 
+@app.get("/memory/maintenance/compact/progress")
+async def compact_memories_progress(user_id: str):
+    """Return progress of the running (or last) compaction for a user."""
+    try:
+        progress = memory_manager.get_compaction_progress(user_id)
+        return {"success": True, "progress": progress}
+    except Exception as e:
+        logger.error(f"Memory compaction progress failed: {e}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
+_reembed_task: asyncio.Task | None = None
+
+
+@app.post("/memory/maintenance/reembed")
+async def reembed_memories(workers: int = None, chunk_size: int = 2048, resume: bool = True):
+    """Start re-encoding every memory into a shadow vector index; poll /memory/maintenance/reembed/progress."""
+    global _reembed_task
+    try:
+        if _reembed_task is not None and not _reembed_task.done():
+            return {"success": False, "error": "a re-embedding job is already running"}
+
+        async def _run():
+            try:
+                await memory_manager.reembed_memories(workers=workers, chunk_size=chunk_size, resume=resume)
+            except Exception as e:
+                logger.error(f"Memory re-embedding failed: {e}", exc_info=True)
+
+        _reembed_task = asyncio.create_task(_run())
+        return {"success": True, "started": True}
+    except Exception as e:
+        logger.error(f"Memory re-embedding start failed: {e}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
+@app.get("/memory/maintenance/reembed/progress")
+async def reembed_memories_progress():
+    """Return progress of the running (or last / interrupted) re-embedding job."""
+    try:
+        progress = memory_manager.get_reembed_progress()
+        return {"success": True, "progress": progress, "stale": memory_manager.vector_index_stale}
+    except Exception as e:
+        logger.error(f"Memory re-embedding progress failed: {e}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
+@app.get("/memory/stats")
+async def memory_stats():
+    """Memory store statistics, including executor queue depth and wait times."""
+    try:
+        stats = await memory_manager.get_stats_async()
+        return {"success": True, "stats": stats}
+    except Exception as e:
+        logger.error(f"Get memory stats failed: {e}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
 @app.get("/memory/conflicts")
 async def list_memory_conflicts(user_id: str, status: str = "pending_review", limit: int = 100):
     """List conflict queue for memory triage."""
@@ -1136,20 +1229,27 @@ async def read_markdown_memory():
         if not memory_manager.markdown_memory:
             return {"success": False, "error": "Markdown 记忆系统未启用"}
 
-        content = memory_manager.markdown_memory.read_memory()
-        memories = memory_manager.markdown_memory.parse_memories()
-
-        return {
-            "success": True,
-            "content": content,
-            "memories": memories,
-            "file_path": str(memory_manager.markdown_memory.memory_file)
-        }
+        result = await memory_manager.read_markdown()
+        return {"success": True, **result}
     except Exception as e:
         logger.error(f"读取 Markdown 记忆错误: {e}", exc_info=True)
         return {"success": False, "error": str(e)}
 
 
+@app.post("/memory/markdown/import")
+async def import_markdown_memory(user_id: str):
+    """把 MEMORY.md 中的记忆批量导入记忆库"""
+    try:
+        if not memory_manager.markdown_memory:
+            return {"success": False, "error": "Markdown 记忆系统未启用"}
+
+        result = await memory_manager.import_markdown_memories(user_id=user_id)
+        return {"success": True, **result}
+    except Exception as e:
+        logger.error(f"导入 Markdown 记忆错误: {e}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
 @app.get("/memory/markdown/daily-log")
 async def read_daily_log(date: str = None):
     """读取每日日志"""
@@ -1157,6 +1257,7 @@ async def read_daily_log(date: str = None):
         if not memory_manager.markdown_memory:
             return {"success": False, "error": "Markdown 记忆系统未启用"}
 
+        await memory_manager.flush_markdown_async()
         content = memory_manager.markdown_memory.read_daily_log(date)
         file_path = str(memory_manager.markdown_memory.daily_dir / f"{date or 'today'}.md")
 
@@ -1171,6 +1272,41 @@ async def read_daily_log(date: str = None):
         return {"success": False, "error": str(e)}
 
 
+@app.get("/memory/markdown/search")
+async def search_markdown_memory(query: str, memory_type: str = None, include_archives: bool = True):
+    """检索 MEMORY.md（可选包含已压缩归档的每日日志）"""
+    try:
+        if not memory_manager.markdown_memory:
+            return {"success": False, "error": "Markdown 记忆系统未启用"}
+
+        found = await memory_manager.search_markdown(
+            query, memory_type=memory_type, include_archives=include_archives
+        )
+        return {
+            "success": True,
+            "results": found["results"],
+            "total": len(found["results"]),
+            "archive": found["archive"],
+        }
+    except Exception as e:
+        logger.error(f"检索 Markdown 记忆错误: {e}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
+@app.post("/memory/markdown/compress-logs")
+async def compress_markdown_logs(days: int = 30):
+    """把超过 days 天的每日日志按月压缩归档"""
+    try:
+        if not memory_manager.markdown_memory:
+            return {"success": False, "error": "Markdown 记忆系统未启用"}
+
+        result = await memory_manager.compress_markdown_logs(days=days)
+        return {"success": True, **result}
+    except Exception as e:
+        logger.error(f"压缩每日日志错误: {e}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
 @app.get("/memory/markdown/recent-logs")
 async def get_recent_logs(days: int = 7):
     """获取最近日志列表"""
@@ -26,6 +26,18 @@ class MemoryRequest(BaseModel):
     metadata: Optional[Dict] = Field(default=None, description="Memory metadata")
 
 
+class MemoryBulkItem(BaseModel):
+    content: str = Field(..., description="Memory content")
+    memory_type: str = Field(default="conversation", description="Memory type")
+    metadata: Optional[Dict] = Field(default=None, description="Memory metadata")
+
+
+class MemoryBulkRequest(BaseModel):
+    user_id: str = Field(..., description="User ID")
+    items: List[MemoryBulkItem] = Field(default_factory=list, description="Memories to save")
+    batch_size: int = Field(default=64, ge=1, le=1024, description="Embedding batch size")
+
+
 class SkillInstallRequest(BaseModel):
     ref: str = Field(..., description="GitHub ref, owner/repo or URL")
 
@@ -0,0 +1,130 @@
+"""
+Benchmark the embedding backends MemoryManager can use: encode throughput
+(texts/s) per batch size, and recall quality against the default PyTorch
+SentenceTransformer model. Recall@k compares each backend's top-k neighbours
+for a set of queries with those of the reference model. Cosine is the mean
+similarity between the backend's vectors and the reference vectors for the
+same text. Use it to pick MEMORY_EMBEDDING_BACKEND, MEMORY_EMBEDDING_QUANTIZE,
+MEMORY_EMBEDDING_BATCH_SIZE and MEMORY_EMBEDDING_THREADS.
+
+The corpus is fixed: either the built-in memory-like sentences below
+(deterministic) or one text per line from --corpus.
+
+Usage:
+    python agent-sdk/scripts/bench_embedding_backends.py
+    python agent-sdk/scripts/bench_embedding_backends.py --corpus memories.txt --batch-size 16 64 --threads 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from core.embedding_backend import ONNX_AVAILABLE, OnnxEmbeddingBackend, SentenceTransformerBackend
+
+SUBJECTS = ["用户", "The user", "我的同事小王", "Our team", "客户张总", "My manager"]
+FACTS = [
+    "prefers replies in Chinese with short bullet points",
+    "喜欢喝美式咖啡，不加糖",
+    "is preparing the Q3 product launch plan",
+    "每周五下午和设计团队开评审会",
+    "uses Python and FastAPI for the backend service",
+    "下个月要去上海出差三天",
+    "asked to be reminded about the dentist appointment",
+    "正在学习日语，目标是通过 N2 考试",
+    "keeps the project budget spreadsheet in the shared drive",
+    "对花生过敏，订餐时需要注意",
+    "wants weekly reports sent every Monday morning",
+    "负责维护公司官网和公众号",
+]
+DETAILS = ["", " since last year", "，这点很重要", " according to the last meeting", "，上周刚确认过"]
+
+
+def builtin_corpus() -> list[str]:
+    return [f"{s} {f}{d}" for s, f, d in itertools.product(SUBJECTS, FACTS, DETAILS)]
+
+
+def throughput(backend, texts: list[str], batch_size: int, rounds: int) -> float:
+    backend.encode(texts[:batch_size], batch_size=batch_size)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        backend.encode(texts, batch_size=batch_size)
+    return len(texts) * rounds / (time.perf_counter() - start)
+
+
+def top_k(corpus_vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> list[set]:
+    scores = query_vectors @ corpus_vectors.T
+    return [set(np.argsort(-row)[:k].tolist()) for row in scores]
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--corpus", type=Path, help="one text per line; defaults to a built-in corpus")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--cache-dir", type=Path, help="where exported ONNX models are kept")
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = [line.strip() for line in args.corpus.read_text(encoding="utf-8").splitlines() if line.strip()]
+    else:
+        corpus = builtin_corpus()
+    rng = np.random.default_rng(42)
+    # 查询取语料中的句子并去掉修饰语，模拟“换个说法问同一件事”
+    queries = [corpus[i].split("，")[0].split(" since")[0].split(" according")[0]
+               for i in rng.choice(len(corpus), min(args.queries, len(corpus)), replace=False)]
+
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        print("sentence-transformers is required for the reference backend")
+        return 1
+
+    cache_dir = args.cache_dir or Path(tempfile.mkdtemp(prefix="embedding_bench_"))
+    backends = [("torch", SentenceTransformerBackend(SentenceTransformer(args.model), threads=args.threads))]
+    if ONNX_AVAILABLE:
+        for quantize in (False, True):
+            start = time.perf_counter()
+            backend = OnnxEmbeddingBackend(args.model, cache_dir, quantize=quantize, threads=args.threads)
+            print(f"prepared {backend.cache_tag} in {time.perf_counter() - start:.1f}s ({backend.model_path})")
+            backends.append((backend.cache_tag, backend))
+    else:
+        print("onnxruntime / transformers not installed: only the torch backend is measured")
+
+    reference = normalize(backends[0][1].encode(corpus))
+    reference_queries = normalize(backends[0][1].encode(queries))
+    truth = top_k(reference, reference_queries, args.top_k)
+
+    print(f"corpus={len(corpus)} queries={len(queries)} top_k={args.top_k} threads={args.threads or 'default'}")
+    header = " | ".join(f"bs={bs:<4} texts/s" for bs in args.batch_size)
+    print(f"{'backend':>10} | {'recall':>6} | {'cosine':>6} | {header}")
+    for name, backend in backends:
+        vectors = normalize(np.asarray(backend.encode(corpus), dtype="float32"))
+        found = top_k(vectors, normalize(np.asarray(backend.encode(queries), dtype="float32")), args.top_k)
+        recall = float(np.mean([len(a & b) / max(1, len(b)) for a, b in zip(found, truth)]))
+        cosine = float(np.mean(np.sum(vectors * reference, axis=1)))
+        rates = " | ".join(
+            f"{throughput(backend, corpus, bs, args.rounds):>15.1f}" for bs in args.batch_size
+        )
+        print(f"{name:>10} | {recall:>6.3f} | {cosine:>6.3f} | {rates}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Benchmark HybridSearchService vector scoring: per-pair cosine loop vs. the
+batched pre-normalized float32 matrix path.
+
+Usage:
+    python agent-sdk/scripts/bench_vector_search.py
+    python agent-sdk/scripts/bench_vector_search.py --sizes 1000 10000 100000 --dim 384 --repeat 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.hybrid_search import HybridSearchService
+
+
+def loop_search(service: HybridSearchService, query, doc_ids, embeddings, top_k: int):
+    """The original per-document implementation, kept here as the baseline."""
+    similarities = []
+    for doc_id, embedding in zip(doc_ids, embeddings):
+        similarity = service.cosine_similarity(query, embedding)
+        if similarity > 0:
+            similarities.append((doc_id, similarity))
+    similarities.sort(key=lambda x: x[1], reverse=True)
+    return similarities[:top_k]
+
+
+def best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    service = HybridSearchService()
+    rng = np.random.default_rng(42)
+    print(f"{'docs':>8} | {'loop ms':>10} | {'matrix ms':>10} | {'build ms':>9} | {'speedup':>8} | same top-k")
+    for size in args.sizes:
+        embeddings = rng.standard_normal((size, args.dim)).astype(np.float32)
+        rows = list(embeddings)
+        doc_ids = [f"doc_{i}" for i in range(size)]
+        query = rng.standard_normal(args.dim).astype(np.float32)
+
+        loop_ms = best_of(args.repeat, lambda: loop_search(service, query, doc_ids, rows, args.top_k))
+        build_ms = best_of(args.repeat, lambda: service.build_embedding_matrix(embeddings))
+        matrix = service.build_embedding_matrix(embeddings)
+        matrix_ms = best_of(
+            args.repeat,
+            lambda: service.vector_search_matrix(query, doc_ids, matrix, top_k=args.top_k),
+        )
+
+        expected = [doc_id for doc_id, _ in loop_search(service, query, doc_ids, rows, args.top_k)]
+        actual = [doc_id for doc_id, _ in service.vector_search_matrix(query, doc_ids, matrix, top_k=args.top_k)]
+        print(
+            f"{size:>8} | {loop_ms:>10.2f} | {matrix_ms:>10.2f} | {build_ms:>9.2f} | "
+            f"{loop_ms / max(matrix_ms, 1e-6):>7.1f}x | {expected == actual}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
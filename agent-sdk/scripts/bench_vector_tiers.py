@@ -0,0 +1,76 @@
+"""
+Benchmark the vector index tiers used by VectorIndexStore: recall@k against
+exact flat search, p50/p99 query latency and approximate bytes per vector.
+Use it to pick MEMORY_VECTOR_NPROBE and the tier thresholds.
+
+Usage:
+    python agent-sdk/scripts/bench_vector_tiers.py
+    python agent-sdk/scripts/bench_vector_tiers.py --size 200000 --dim 384 --nprobe 8 16 32
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from core.vector_index import TIER_FLAT, TIER_IVF, TIER_IVF_FP16, TIER_IVF_PQ, IndexTierPolicy
+
+
+def measure(index, queries: np.ndarray, top_k: int):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(set(int(i) for i in ids[0] if i != -1))
+    latencies.sort()
+    return results, latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    # Clustered data so IVF behaves like it does on real embeddings.
+    centers = rng.standard_normal((64, args.dim)).astype("float32")
+    vectors = centers[rng.integers(0, 64, args.size)] + 0.3 * rng.standard_normal((args.size, args.dim)).astype("float32")
+    ids = np.arange(1, args.size + 1, dtype="int64")
+    queries = vectors[rng.choice(args.size, args.queries, replace=False)] + 0.05 * rng.standard_normal(
+        (args.queries, args.dim)
+    ).astype("float32")
+
+    exact_policy = IndexTierPolicy()
+    exact = exact_policy.build(TIER_FLAT, args.dim, ids, vectors)
+    truth, p50, p99 = measure(exact, queries, args.top_k)
+    print(f"{'tier':>9} | {'nprobe':>6} | {'build s':>7} | {'recall':>6} | {'p50 ms':>7} | {'p99 ms':>7} | bytes/vec")
+    print(f"{'flat':>9} | {'-':>6} | {'-':>7} | {1.0:>6.3f} | {p50:>7.3f} | {p99:>7.3f} | "
+          f"{exact_policy.bytes_per_vector(TIER_FLAT, args.dim)}")
+
+    for tier in (TIER_IVF, TIER_IVF_FP16, TIER_IVF_PQ):
+        for nprobe in args.nprobe:
+            policy = IndexTierPolicy(nprobe=nprobe)
+            start = time.perf_counter()
+            index = policy.build(tier, args.dim, ids, vectors)
+            build_s = time.perf_counter() - start
+            found, p50, p99 = measure(index, queries, args.top_k)
+            recall = float(np.mean([len(a & b) / max(1, len(b)) for a, b in zip(found, truth)]))
+            print(f"{tier:>9} | {nprobe:>6} | {build_s:>7.2f} | {recall:>6.3f} | {p50:>7.3f} | {p99:>7.3f} | "
+                  f"{policy.bytes_per_vector(tier, args.dim)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
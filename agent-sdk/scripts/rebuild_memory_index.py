@@ -0,0 +1,69 @@
+"""
+Rebuild per-user FAISS memory indexes from memories.db.
+
+Re-encodes every stored memory and writes a fresh ID-mapped index per user
+(vector id = memory rowid). With --fts, rebuilds the full-text index and its
+sync triggers instead. With --reembed, runs the resumable re-embedding job:
+all memories are re-encoded by --workers processes into a shadow index that
+replaces the live one when done; rerun the same command to resume after an
+interruption. Run with the backend stopped.
+
+Usage:
+    python agent-sdk/scripts/rebuild_memory_index.py --data-dir ./data
+    python agent-sdk/scripts/rebuild_memory_index.py --data-dir ./data --user-id default-user
+    python agent-sdk/scripts/rebuild_memory_index.py --data-dir ./data --fts
+    python agent-sdk/scripts/rebuild_memory_index.py --data-dir ./data --reembed --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from core.memory import MemoryManager
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data-dir", default=os.getenv("DATA_DIR", "./data"))
+    parser.add_argument("--user-id", default=None, help="only rebuild this user")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--fts", action="store_true", help="rebuild the full-text index instead")
+    parser.add_argument("--reembed", action="store_true", help="re-encode all memories into a new index (resumable)")
+    parser.add_argument("--workers", type=int, default=None, help="encoder processes for --reembed (0 = in-process)")
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    if not (data_dir / "memories.db").exists():
+        print(f"memories.db not found under {data_dir}")
+        return 1
+
+    manager = MemoryManager(data_dir=data_dir)
+    try:
+        if args.fts:
+            report = manager.rebuild_fts_index()
+        elif args.reembed:
+            report = asyncio.run(manager.reembed_memories(
+                workers=args.workers,
+                batch_size=args.batch_size,
+                progress_callback=lambda p: print(f"{p['processed']}/{p['total']} ({p['rate_per_sec']}/s)", flush=True),
+            ))
+        else:
+            report = manager.rebuild_vector_index(user_id=args.user_id, batch_size=args.batch_size)
+    except RuntimeError as e:
+        print(f"rebuild failed: {e}")
+        return 1
+    finally:
+        manager.close()
+    print(json.dumps(report, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,14 +3,17 @@
 基于 OpenClaw 实现，结合 BM25 关键字搜索和向量语义搜索
 
 特性:
-  - BM25 算法 (rank-bm25)
+  - BM25 算法 (rank-bm25 / 持久化增量倒排索引)
   - 向量相似度 (余弦距离)
   - 可配置权重融合
   - 中文分词支持 (jieba)
 """
 
+import math
+import sqlite3
 import numpy as np
-from typing import List, Dict, Optional, Tuple
+from collections import Counter
+from typing import Callable, Iterable, List, Dict, Optional, Tuple
 from dataclasses import dataclass
 import logging
 
@@ -45,6 +48,241 @@ class SearchResult:
     source: str = "hybrid"
 
 
+class PersistentBM25Index:
+    """
+    持久化增量 BM25 倒排索引
+
+    按用户存储在 SQLite 中（与记忆库同一个数据库）：
+      - bm25_postings: (user_id, term, doc_id) -> 词频
+      - bm25_docs:     (user_id, doc_id) -> 文档长度
+      - bm25_terms:    (user_id, term) -> 文档频率
+      - bm25_stats:    user_id -> 文档数 / 总长度
+
+    所有方法都接收调用方的 cursor，便于和记忆写入放在同一个事务里。
+    查询时只对查询分词，不再重新分词任何文档。
+    """
+
+    def __init__(
+        self,
+        tokenize: Callable[[str], List[str]],
+        k1: float = 1.5,
+        b: float = 0.75
+    ):
+        self._tokenize = tokenize
+        self.k1 = k1
+        self.b = b
+
+    @staticmethod
+    def ensure_schema(cursor: sqlite3.Cursor):
+        """创建倒排索引表（幂等）"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS bm25_docs (
+                user_id TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                PRIMARY KEY (user_id, doc_id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS bm25_postings (
+                user_id TEXT NOT NULL,
+                term TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (user_id, term, doc_id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_bm25_postings_doc
+            ON bm25_postings(user_id, doc_id)
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS bm25_terms (
+                user_id TEXT NOT NULL,
+                term TEXT NOT NULL,
+                df INTEGER NOT NULL,
+                PRIMARY KEY (user_id, term)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS bm25_stats (
+                user_id TEXT PRIMARY KEY,
+                doc_count INTEGER NOT NULL DEFAULT 0,
+                total_length INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+
+    def terms(self, text: str) -> List[str]:
+        """索引与查询共用的词元归一化"""
+        return [t.strip().lower() for t in self._tokenize(text or "") if t and t.strip()]
+
+    def add_document(self, cursor: sqlite3.Cursor, user_id: str, doc_id: str, text: str):
+        """索引一篇文档（已存在则先移除旧版本）"""
+        self.remove_documents(cursor, user_id, [doc_id])
+        counts = Counter(self.terms(text))
+        length = sum(counts.values())
+
+        cursor.execute(
+            "INSERT INTO bm25_docs (user_id, doc_id, length) VALUES (?, ?, ?)",
+            (user_id, doc_id, length),
+        )
+        cursor.executemany(
+            "INSERT INTO bm25_postings (user_id, term, doc_id, tf) VALUES (?, ?, ?, ?)",
+            [(user_id, term, doc_id, tf) for term, tf in counts.items()],
+        )
+        cursor.executemany(
+            """
+            INSERT INTO bm25_terms (user_id, term, df) VALUES (?, ?, 1)
+            ON CONFLICT(user_id, term) DO UPDATE SET df = df + 1
+            """,
+            [(user_id, term) for term in counts],
+        )
+        cursor.execute(
+            """
+            INSERT INTO bm25_stats (user_id, doc_count, total_length) VALUES (?, 1, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                doc_count = doc_count + 1,
+                total_length = total_length + excluded.total_length
+            """,
+            (user_id, length),
+        )
+
+    def remove_documents(self, cursor: sqlite3.Cursor, user_id: str, doc_ids: Iterable[str]) -> int:
+        """从索引中移除文档，返回实际移除的数量"""
+        removed = 0
+        touched: set = set()
+        for doc_id in doc_ids:
+            cursor.execute(
+                "SELECT length FROM bm25_docs WHERE user_id = ? AND doc_id = ?",
+                (user_id, doc_id),
+            )
+            row = cursor.fetchone()
+            if row is None:
+                continue
+            length = int(row[0])
+            cursor.execute(
+                "SELECT term FROM bm25_postings WHERE user_id = ? AND doc_id = ?",
+                (user_id, doc_id),
+            )
+            terms = [r[0] for r in cursor.fetchall()]
+            cursor.executemany(
+                "UPDATE bm25_terms SET df = df - 1 WHERE user_id = ? AND term = ?",
+                [(user_id, term) for term in terms],
+            )
+            touched.update(terms)
+            cursor.execute(
+                "DELETE FROM bm25_postings WHERE user_id = ? AND doc_id = ?",
+                (user_id, doc_id),
+            )
+            cursor.execute(
+                "DELETE FROM bm25_docs WHERE user_id = ? AND doc_id = ?",
+                (user_id, doc_id),
+            )
+            cursor.execute(
+                """
+                UPDATE bm25_stats
+                SET doc_count = MAX(0, doc_count - 1), total_length = MAX(0, total_length - ?)
+                WHERE user_id = ?
+                """,
+                (length, user_id),
+            )
+            removed += 1
+        # 只清理本次减过 df 的词，避免每删一篇就扫描该用户的整个词表
+        touched_terms = sorted(touched)
+        for start in range(0, len(touched_terms), 500):
+            part = touched_terms[start:start + 500]
+            placeholders = ",".join("?" for _ in part)
+            cursor.execute(
+                f"DELETE FROM bm25_terms WHERE user_id = ? AND term IN ({placeholders}) AND df <= 0",
+                [user_id, *part],
+            )
+        return removed
+
+    def clear_user(self, cursor: sqlite3.Cursor, user_id: str):
+        """删除某个用户的全部倒排数据"""
+        for table in ("bm25_postings", "bm25_docs", "bm25_terms", "bm25_stats"):
+            cursor.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+
+    @staticmethod
+    def document_count(cursor: sqlite3.Cursor, user_id: str) -> int:
+        cursor.execute("SELECT doc_count FROM bm25_stats WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        return int(row[0]) if row else 0
+
+    def score(
+        self,
+        cursor: sqlite3.Cursor,
+        user_id: str,
+        query: str,
+        doc_ids: Optional[Iterable[str]] = None,
+        top_k: int = 10
+    ) -> List[Tuple[str, float]]:
+        """
+        BM25 打分（原始分数，未归一化）
+
+        Args:
+            cursor: SQLite cursor
+            user_id: 用户 ID
+            query: 查询文本
+            doc_ids: 仅对这些文档打分（候选集），为空时对全部命中文档打分
+            top_k: 返回前 K 个结果
+
+        Returns:
+            [(doc_id, score), ...] 按分数降序
+        """
+        query_counts = Counter(self.terms(query))
+        if not query_counts:
+            return []
+
+        cursor.execute(
+            "SELECT doc_count, total_length FROM bm25_stats WHERE user_id = ?",
+            (user_id,),
+        )
+        stats = cursor.fetchone()
+        if not stats or not stats[0]:
+            return []
+        doc_count = int(stats[0])
+        avg_length = max(1e-9, float(stats[1]) / doc_count)
+
+        terms = list(query_counts)
+        term_marks = ",".join(["?"] * len(terms))
+        cursor.execute(
+            f"SELECT term, df FROM bm25_terms WHERE user_id = ? AND term IN ({term_marks})",
+            [user_id, *terms],
+        )
+        idf = {
+            term: math.log(1.0 + (doc_count - df + 0.5) / (df + 0.5))
+            for term, df in cursor.fetchall()
+        }
+        if not idf:
+            return []
+
+        sql = f"""
+            SELECT p.doc_id, p.term, p.tf, d.length
+            FROM bm25_postings p
+            JOIN bm25_docs d ON d.user_id = p.user_id AND d.doc_id = p.doc_id
+            WHERE p.user_id = ? AND p.term IN ({",".join(["?"] * len(idf))})
+        """
+        params: List = [user_id, *idf.keys()]
+        if doc_ids is not None:
+            doc_ids = list(doc_ids)
+            if not doc_ids:
+                return []
+            sql += f" AND p.doc_id IN ({','.join(['?'] * len(doc_ids))})"
+            params.extend(doc_ids)
+        cursor.execute(sql, params)
+
+        scores: Dict[str, float] = {}
+        for doc_id, term, tf, length in cursor.fetchall():
+            norm = self.k1 * (1 - self.b + self.b * float(length) / avg_length)
+            scores[doc_id] = scores.get(doc_id, 0.0) + (
+                query_counts[term] * idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            )
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:top_k]
+
+
 class HybridSearchService:
     """
     混合搜索服务
@@ -80,6 +318,9 @@ class HybridSearchService:
         self.corpus_documents = []
         self.document_ids = []
 
+        # 持久化增量倒排索引（由调用方提供 SQLite cursor）
+        self.inverted_index = PersistentBM25Index(self.tokenize, k1=bm25_k1, b=bm25_b)
+
         logger.info(f"混合搜索初始化: vector_weight={vector_weight}, text_weight={text_weight}")
 
     def tokenize(self, text: str) -> List[str]:
@@ -152,18 +393,31 @@ class HybridSearchService:
     def bm25_search(
         self,
         query: str,
-        top_k: int = 10
+        top_k: int = 10,
+        cursor: Optional[sqlite3.Cursor] = None,
+        user_id: Optional[str] = None,
+        doc_ids: Optional[Iterable[str]] = None
     ) -> List[Tuple[str, float]]:
         """
         BM25 关键字搜索
 
+        传入 cursor + user_id 时使用持久化倒排索引，否则使用内存中的 BM25Okapi 索引
+
         Args:
             query: 查询文本
             top_k: 返回前 K 个结果
+            cursor: 记忆库 SQLite cursor（持久化索引）
+            user_id: 用户 ID（持久化索引）
+            doc_ids: 候选文档 ID（持久化索引，可选）
 
         Returns:
             [(document_id, score), ...] 按分数降序
         """
+        if cursor is not None and user_id is not None:
+            raw = self.inverted_index.score(cursor, user_id, query, doc_ids=doc_ids, top_k=top_k)
+            max_score = raw[0][1] if raw and raw[0][1] > 0 else 1.0
+            return [(doc_id, float(score / max_score)) for doc_id, score in raw if score > 0]
+
         if not BM25_AVAILABLE or not self.bm25_index:
             logger.warning("BM25 索引不可用")
             return []
@@ -241,16 +495,84 @@ class HybridSearchService:
         if len(query_embedding) == 0 or not document_embeddings:
             return []
 
-        # 计算相似度
-        similarities = []
-        for doc_id, doc_embedding in document_embeddings:
-            similarity = self.cosine_similarity(query_embedding, doc_embedding)
-            if similarity > 0:
-                similarities.append((doc_id, similarity))
+        doc_ids = [doc_id for doc_id, _ in document_embeddings]
+        matrix = self.build_embedding_matrix([emb for _, emb in document_embeddings])
+        return self.vector_search_matrix(query_embedding, doc_ids, matrix, top_k=top_k)
 
-        # 排序并取 top-k
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        return similarities[:top_k]
+    @staticmethod
+    def build_embedding_matrix(embeddings) -> np.ndarray:
+        """
+        把文档向量整理成连续的 float32 矩阵，并按行预先归一化
+
+        零向量保持为零（相似度为 0，会被过滤）；维度不一致时按最短维度截断
+
+        Args:
+            embeddings: 向量列表或二维数组
+
+        Returns:
+            形状为 (n, dim) 的 C 连续 float32 矩阵，每行 L2 范数为 1 或 0
+        """
+        if isinstance(embeddings, np.ndarray) and embeddings.ndim == 2:
+            matrix = np.array(embeddings, dtype=np.float32, order="C", copy=True)
+        else:
+            rows = [np.asarray(emb, dtype=np.float32).ravel() for emb in embeddings]
+            if not rows:
+                return np.zeros((0, 0), dtype=np.float32)
+            dim = min(len(row) for row in rows)
+            matrix = np.ascontiguousarray(np.vstack([row[:dim] for row in rows]), dtype=np.float32)
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def vector_search_matrix(
+        self,
+        query_embedding: np.ndarray,
+        doc_ids: List[str],
+        matrix: np.ndarray,
+        top_k: int = 10
+    ) -> List[Tuple[str, float]]:
+        """
+        批量向量搜索：一次矩阵-向量乘法 + argpartition 选 top-k
+
+        Args:
+            query_embedding: 查询向量
+            doc_ids: 与矩阵行一一对应的文档 ID
+            matrix: build_embedding_matrix 生成的预归一化矩阵
+            top_k: 返回前 K 个结果
+
+        Returns:
+            [(document_id, score), ...] 按相似度降序，仅包含正分
+        """
+        if matrix.size == 0 or top_k <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        dim = min(len(query), matrix.shape[1])
+        if dim == 0:
+            return []
+        query = query[:dim]
+        query_norm = float(np.linalg.norm(query))
+        if query_norm == 0:
+            return []
+        if dim != matrix.shape[1]:
+            # 截断后需要重新归一化文档行
+            matrix = self.build_embedding_matrix(matrix[:, :dim])
+
+        scores = matrix @ (query / query_norm)
+
+        k = min(top_k, len(scores))
+        if k < len(scores):
+            top_indices = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top_indices = np.arange(len(scores))
+        top_indices = top_indices[np.argsort(-scores[top_indices], kind="stable")]
+
+        return [
+            (doc_ids[idx], float(scores[idx]))
+            for idx in top_indices
+            if scores[idx] > 0
+        ]
 
     def merge_results(
         self,
@@ -325,7 +647,9 @@ class HybridSearchService:
         document_embeddings: List[np.ndarray],
         top_k: int = 10,
         min_score: float = 0.0,
-        use_hybrid: bool = True
+        use_hybrid: bool = True,
+        cursor: Optional[sqlite3.Cursor] = None,
+        user_id: Optional[str] = None
     ) -> List[SearchResult]:
         """
         混合搜索主函数
@@ -334,10 +658,12 @@ class HybridSearchService:
             query: 查询文本
             query_embedding: 查询向量
             documents: 文档列表 [{'id', 'content', 'memory_type', 'created_at'}, ...]
-            document_embeddings: 文档向量列表
+            document_embeddings: 文档向量列表或 (n, dim) 矩阵
             top_k: 返回前 K 个结果
             min_score: 最小分数阈值
             use_hybrid: 是否使用混合搜索 (False 则仅向量搜索)
+            cursor: 记忆库 SQLite cursor，与 user_id 一起提供时使用持久化倒排索引
+            user_id: 用户 ID
 
         Returns:
             搜索结果列表
@@ -347,14 +673,17 @@ class HybridSearchService:
 
         # 构建文档字典
         docs_dict = {doc['id']: doc for doc in documents}
-        doc_embeddings_with_id = [(doc['id'], emb) for doc, emb in zip(documents, document_embeddings)]
-
-        # 1. 向量搜索
-        vector_results = self.vector_search(
-            query_embedding,
-            doc_embeddings_with_id,
-            top_k=top_k * 2  # 候选倍数
-        )
+        doc_ids = [doc['id'] for doc in documents]
+
+        # 1. 向量搜索（批量矩阵打分）
+        vector_results = []
+        if len(query_embedding) and len(document_embeddings):
+            vector_results = self.vector_search_matrix(
+                query_embedding,
+                doc_ids,
+                self.build_embedding_matrix(document_embeddings),
+                top_k=top_k * 2  # 候选倍数
+            )
 
         # 如果不使用混合搜索，直接返回向量结果
         if not use_hybrid:
@@ -376,7 +705,11 @@ class HybridSearchService:
 
         # 2. BM25 搜索 (如果可用)
         bm25_results = []
-        if BM25_AVAILABLE and self.bm25_index:
+        if cursor is not None and user_id is not None:
+            bm25_results = self.bm25_search(
+                query, top_k=top_k * 2, cursor=cursor, user_id=user_id, doc_ids=docs_dict.keys()
+            )
+        elif BM25_AVAILABLE and self.bm25_index:
             bm25_results = self.bm25_search(query, top_k=top_k * 2)
 
         # 3. 融合结果
@@ -404,33 +737,69 @@ def bm25_rank_to_score(rank: float) -> float:
     """
     SQLite BM25 排名转换为分数
 
-    SQLite FTS5 的 bm25() 函数返回负数，此函数归一化到 [0, 1]
+    SQLite FTS5 的 bm25() 函数返回负数（越小越相关），此函数单调映射到 [0, 1)，
+    越相关分数越高
 
     Args:
         rank: SQLite BM25 排名值 (通常是负数)
 
     Returns:
-        分数 ∈ [0, 1]
+        分数 ∈ [0, 1)
     """
     # 处理非法值
     if not np.isfinite(rank):
-        normalized = 999
-    else:
-        normalized = max(0, -rank)  # 取绝对值
+        return 0.0
+    relevance = max(0.0, -rank)
+
+    # 转换: score = r / (1 + r)
+    return relevance / (1.0 + relevance)
+
+
+def _trigram_tokens(raw: str) -> Tuple[List[str], List[str]]:
+    """trigram 模式下的 (邮箱, 普通词元)，中文长串拆成重叠的三字片段"""
+    import re
+
+    emails = re.findall(r'[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}', raw)
+    remaining = raw
+    for email in emails:
+        remaining = remaining.replace(email, ' ')
+
+    tokens = []
+    for token in re.findall(r'[^\W\u4e00-\u9fa5]+|[\u4e00-\u9fa5]+', remaining):
+        if re.match(r'[\u4e00-\u9fa5]', token) and len(token) > 3:
+            tokens.extend(token[i:i + 3] for i in range(len(token) - 2))
+        else:
+            tokens.append(token)
+    return emails, tokens
+
+
+def short_fts_terms(raw: str, tokenizer: str = "unicode61") -> List[str]:
+    """
+    主全文索引匹配不到、需要查单字词元表的词元
+
+    trigram 模式下是不足 3 个字符的词元（如 "咖啡"、"Go"，build_fts_query 会丢弃它们）；
+    unicode61 模式下是中文串（整串才算一个词元，子串匹配不到）。
+    """
+    import re
 
-    # 转换: score = 1 / (1 + rank)
-    return 1.0 / (1.0 + normalized)
+    _, tokens = _trigram_tokens(raw)
+    if tokenizer == "trigram":
+        return list(dict.fromkeys(t for t in tokens if len(t) < 3))
+    return list(dict.fromkeys(t for t in tokens if re.match(r'[\u4e00-\u9fa5]', t)))
 
 
-def build_fts_query(raw: str) -> Optional[str]:
+def build_fts_query(raw: str, operator: str = "AND", tokenizer: str = "unicode61") -> Optional[str]:
     """
     构建 FTS5 查询
 
-    从原始文本提取词元，使用 AND 组合
+    从原始文本提取词元，默认使用 AND 组合（召回候选时可用 OR）
     保留邮箱地址等特殊 token
 
     Args:
         raw: 原始查询文本
+        operator: 词元连接符，"AND"（严格匹配）或 "OR"（候选召回）
+        tokenizer: FTS5 表的分词器。"trigram" 时中文串拆成重叠的三字片段，
+            并丢弃不足 3 个字符的词元（trigram 索引无法匹配，见 short_fts_terms）
 
     Returns:
         FTS5 查询字符串，如果无有效词元则返回 None
@@ -443,22 +812,27 @@ def build_fts_query(raw: str) -> Optional[str]:
     """
     import re
 
-    # 先提取完整邮箱地址
-    emails = re.findall(
-        r'[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}',
-        raw
-    )
+    if tokenizer == "trigram":
+        emails, tokens = _trigram_tokens(raw)
+        # trigram 索引只能匹配至少 3 个字符的片段
+        all_tokens = list(dict.fromkeys(t for t in emails + tokens if len(t) >= 3))
+    else:
+        # 先提取完整邮箱地址
+        emails = re.findall(
+            r'[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}',
+            raw
+        )
 
-    # 从原始文本中移除已提取的邮箱，再提取普通词元
-    remaining = raw
-    for email in emails:
-        remaining = remaining.replace(email, ' ')
+        # 从原始文本中移除已提取的邮箱，再提取普通词元
+        remaining = raw
+        for email in emails:
+            remaining = remaining.replace(email, ' ')
 
-    # 提取普通词元 (字母数字、下划线、中文)
-    tokens = re.findall(r'[A-Za-z0-9_\u4e00-\u9fa5]+', remaining)
+        # 提取普通词元 (字母数字、下划线、中文)
+        tokens = re.findall(r'[A-Za-z0-9_\u4e00-\u9fa5]+', remaining)
 
-    # 合并：邮箱 + 普通词元
-    all_tokens = emails + tokens
+        # 合并：邮箱 + 普通词元
+        all_tokens = emails + tokens
 
     if not all_tokens:
         return None
@@ -466,5 +840,6 @@ def build_fts_query(raw: str) -> Optional[str]:
     # 清理和引用
     quoted = ['"{}"'.format(token.replace('"', '')) for token in all_tokens]
 
-    # 使用 AND 连接 (严格匹配)
-    return " AND ".join(quoted)
+    # 默认使用 AND 连接 (严格匹配)
+    joiner = " OR " if operator.strip().upper() == "OR" else " AND "
+    return joiner.join(quoted)
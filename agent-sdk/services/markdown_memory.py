@@ -9,18 +9,68 @@ Markdown 文件记忆系统 - Markdown File Memory System
   - 自动时间戳
   - 日志分割（每日一个文件）
   - 支持元数据和标签
+  - MEMORY.md 按大小滚动为分段文件，每个分段带行偏移索引（.idx），读取按需 seek
+  - 旧分段带字符二元组倒排索引（.postings.json.gz），检索只读命中的条目
+  - 旧日志按月打包压缩（gzip / zstd），带条目偏移表和倒排索引，可直接检索
 """
 
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+import os
 import re
+import gzip
+import bisect
+import time
+import queue
 import logging
 import json
-import shutil
+import threading
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+# 记忆条目头部，格式: ### [memory_type] memory_id + 时间行
+MEMORY_HEADER_PATTERN = re.compile(r"###\s+\[(\w+)\]\s+(mem_[\w]+)\n\n\*\*时间\*\*:\s+([^\n]+)")
+# 条目正文在下一个三级标题或 --- 之前结束
+_ENTRY_END_PATTERN = re.compile(r"\n(###|---)")
+_TAGS_PATTERN = re.compile(r"\*\*标签\*\*:\s+([^\n]+)")
+
+INDEX_SUFFIX = ".idx"
+POSTINGS_SUFFIX = ".postings.json.gz"
+_SEGMENT_NAME = re.compile(r"^MEMORY-(\d+)\.md$")
+DEFAULT_SEGMENT_BYTES = 4 * 1024 * 1024
+
+# 每日日志条目头部，格式: ## [HH:MM:SS] log_type
+LOG_ENTRY_PATTERN = re.compile(r"^## \[(\d{2}:\d{2}:\d{2})\] (\w+)\n", re.MULTILINE)
+_DAILY_LOG_NAME = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+ARCHIVE_MANIFEST = "manifest.json"
+ARCHIVE_POSTINGS = "postings.json.gz"
+
+
+def _archive_grams(text: str) -> set:
+    """倒排索引用的字符二元组（小写，不含空白）；子串命中的条目一定包含查询的全部二元组"""
+    text = text.lower()
+    return {text[i:i + 2] for i in range(len(text) - 1) if not (text[i].isspace() or text[i + 1].isspace())}
+
+
+def _compress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
 
 class MarkdownMemory:
     """
@@ -28,27 +78,44 @@ class MarkdownMemory:
 
     文件结构:
         ~/.cks-lite/workspace/
-        ├── MEMORY.md                 # 长期记忆主文件
+        ├── MEMORY.md                 # 长期记忆主文件（当前分段）
+        ├── MEMORY.md.idx             # 条目偏移索引（JSONL: offset/length/id/type/date）
+        ├── memory_segments/
+        │   ├── MEMORY-0001.md       # 写满后滚动出去的旧分段（只读）
+        │   ├── MEMORY-0001.md.idx
+        │   └── MEMORY-0001.md.postings.json.gz  # 二元组 -> 条目序号
         └── memory/
             ├── 2026-02-05.md        # 今日日志
             ├── 2026-02-04.md        # 昨日日志
             └── ...
     """
 
-    def __init__(self, workspace_dir: Path):
+    def __init__(self, workspace_dir: Path, segment_max_bytes: int = DEFAULT_SEGMENT_BYTES):
         """
         初始化 Markdown 记忆系统
 
         Args:
             workspace_dir: 工作区目录路径
+            segment_max_bytes: MEMORY.md 超过该大小时滚动为新分段
         """
         self.workspace_dir = Path(workspace_dir)
         self.memory_file = self.workspace_dir / "MEMORY.md"
+        self.segments_dir = self.workspace_dir / "memory_segments"
         self.daily_dir = self.workspace_dir / "memory"
         self.archive_dir = self.daily_dir / "archive"
+        self.segment_max_bytes = max(1, int(segment_max_bytes))
+        # 分段文件 -> {"size": 已索引到的字节数, "entries": [索引记录]}
+        self._index: Dict[Path, Dict] = {}
+        # 旧分段 -> (建索引时的文件大小, 二元组倒排表)
+        self._segment_postings_cache: Dict[Path, Tuple[int, Dict]] = {}
+        self._lock = threading.RLock()
+        # 月份目录 -> (manifest mtime, manifest, postings)
+        self._archive_cache: Dict[Path, Tuple[int, Dict, Dict]] = {}
+        self._archive_search_stats = {"searches": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0}
 
         # 确保目录存在
         self.workspace_dir.mkdir(parents=True, exist_ok=True)
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
         self.daily_dir.mkdir(parents=True, exist_ok=True)
         self.archive_dir.mkdir(parents=True, exist_ok=True)
 
@@ -80,9 +147,23 @@ class MarkdownMemory:
 ## 📚 详细记忆
 
 """
-        self.memory_file.write_text(content, encoding="utf-8")
+        with self._lock:
+            self.memory_file.write_text(content, encoding="utf-8")
+            self._index_path(self.memory_file).unlink(missing_ok=True)
+            self._index.pop(self.memory_file, None)
         logger.info(f"创建 MEMORY.md: {self.memory_file}")
 
+    def clear_long_term(self):
+        """清空长期记忆：删除所有旧分段并把 MEMORY.md 重置为模板"""
+        with self._lock:
+            for segment in self._sealed_segments():
+                self._index_path(segment).unlink(missing_ok=True)
+                self._postings_path(segment).unlink(missing_ok=True)
+                segment.unlink(missing_ok=True)
+                self._index.pop(segment, None)
+                self._segment_postings_cache.pop(segment, None)
+            self._initialize_memory_file()
+
     def save_memory(
         self,
         content: str,
@@ -100,10 +181,25 @@ class MarkdownMemory:
         Returns:
             记忆 ID
         """
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        memory_id = f"mem_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        memory_id, entry = self._memory_entry(content, memory_type, tags, datetime.now())
+
+        # 追加到文件末尾（同时更新偏移索引，必要时滚动分段）
+        self.append_text(self.memory_file, entry)
+
+        logger.info(f"保存记忆: {memory_id} ({memory_type})")
+        return memory_id
+
+    @staticmethod
+    def _memory_entry(
+        content: str,
+        memory_type: str,
+        tags: Optional[List[str]],
+        now: datetime,
+    ) -> Tuple[str, str]:
+        """构建 MEMORY.md 条目，返回 (记忆 ID, 条目文本)"""
+        timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
+        memory_id = f"mem_{now.strftime('%Y%m%d_%H%M%S')}"
 
-        # 构建记忆条目
         entry = f"\n### [{memory_type}] {memory_id}\n\n"
         entry += f"**时间**: {timestamp}\n\n"
 
@@ -112,13 +208,7 @@ class MarkdownMemory:
 
         entry += f"{content}\n\n"
         entry += "---\n"
-
-        # 追加到文件末尾
-        with self.memory_file.open("a", encoding="utf-8") as f:
-            f.write(entry)
-
-        logger.info(f"保存记忆: {memory_id} ({memory_type})")
-        return memory_id
+        return memory_id, entry
 
     def save_daily_log(self, content: str, log_type: str = "conversation") -> str:
         """
@@ -131,27 +221,315 @@ class MarkdownMemory:
         Returns:
             日志文件路径
         """
-        # 今日日志文件
-        today = datetime.now().strftime("%Y-%m-%d")
-        daily_file = self.daily_dir / f"{today}.md"
+        daily_file, header, entry = self._daily_log_entry(content, log_type, datetime.now())
 
-        # 如果文件不存在，创建头部
-        if not daily_file.exists():
-            header = f"# CKS Lite - Daily Log\n\n**日期**: {today}\n\n---\n\n"
-            daily_file.write_text(header, encoding="utf-8")
+        # 追加到文件末尾（新文件先写头部）
+        self.append_text(daily_file, entry, header=header)
+
+        logger.info(f"保存日志: {daily_file.name}")
+        return str(daily_file)
 
-        # 构建日志条目
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        entry = f"\n## [{timestamp}] {log_type}\n\n"
+    def _daily_log_entry(self, content: str, log_type: str, now: datetime) -> Tuple[Path, str, str]:
+        """构建每日日志条目，返回 (日志文件, 新文件头部, 条目文本)"""
+        today = now.strftime("%Y-%m-%d")
+        daily_file = self.daily_dir / f"{today}.md"
+        header = f"# CKS Lite - Daily Log\n\n**日期**: {today}\n\n---\n\n"
+
+        entry = f"\n## [{now.strftime('%H:%M:%S')}] {log_type}\n\n"
         entry += f"{content}\n\n"
         entry += "---\n"
+        return daily_file, header, entry
+
+    def append_text(self, path: Path, text: str, header: Optional[str] = None):
+        """
+        追加已格式化的条目文本。写 MEMORY.md 时同步维护偏移索引并按大小滚动分段；
+        其他文件（每日日志）在为空时先写 header。
+        """
+        with self._lock:
+            if path == self.memory_file:
+                self._append_long_term(text)
+                return
+            with path.open("a", encoding="utf-8") as f:
+                if header and f.tell() == 0:
+                    f.write(header)
+                f.write(text)
+
+    def _append_long_term(self, text: str):
+        state = self._load_index(self.memory_file)
+        size = state["size"]
+        data = text.encode("utf-8")
+        if state["entries"] and size + len(data) > self.segment_max_bytes:
+            self._roll_segment()
+            state = self._load_index(self.memory_file)
+            size = state["size"]
+
+        with self.memory_file.open("ab") as f:
+            f.write(data)
+        records = self._scan_entries(text, size)
+        self._write_index_records(self.memory_file, records, append=True)
+        state["entries"].extend(records)
+        state["size"] = size + len(data)
+
+    def _roll_segment(self):
+        """
+        把写满的 MEMORY.md 连同索引移入 memory_segments/，再重建空模板。
+        序号取现有分段的最大序号 + 1（中间的分段被删掉也不会复用），目标已存在时拒绝覆盖。
+        """
+        sealed = self._sealed_segments()
+        sequence = self._segment_sequence(sealed[-1]) + 1 if sealed else 1
+        segment = self.segments_dir / f"MEMORY-{sequence:04d}.md"
+        if segment.exists() or self._index_path(segment).exists():
+            raise FileExistsError(f"分段已存在，拒绝覆盖: {segment}")
+        with self.memory_file.open("ab") as f:
+            os.fsync(f.fileno())
+        os.replace(self.memory_file, segment)
+        index_path = self._index_path(self.memory_file)
+        if index_path.exists():
+            os.replace(index_path, self._index_path(segment))
+        state = self._index.pop(self.memory_file, None)
+        if state is not None:
+            self._index[segment] = state
+        self._initialize_memory_file()
+        self._segment_postings(segment)
+        logger.info(f"MEMORY.md 滚动为分段: {segment.name}")
+
+    @staticmethod
+    def _index_path(segment: Path) -> Path:
+        return segment.with_name(segment.name + INDEX_SUFFIX)
+
+    @staticmethod
+    def _postings_path(segment: Path) -> Path:
+        return segment.with_name(segment.name + POSTINGS_SUFFIX)
+
+    def _segment_postings(self, segment: Path) -> Dict:
+        """
+        旧分段的二元组倒排表（二元组 -> 条目在偏移索引中的序号）。
+        分段只读，文件大小与建表时一致就直接复用；被外部改动过则按条目重建。
+        """
+        with self._lock:
+            size = segment.stat().st_size
+            cached = self._segment_postings_cache.get(segment)
+            if cached and cached[0] == size:
+                return cached[1]
+
+            postings_path = self._postings_path(segment)
+            postings = None
+            if postings_path.exists():
+                try:
+                    data = json.loads(gzip.decompress(postings_path.read_bytes()))
+                    if data.get("size") == size:
+                        postings = data["grams"]
+                except (OSError, ValueError, KeyError):
+                    postings = None
+
+            if postings is None:
+                postings = {}
+                records = self._load_index(segment)["entries"]
+                with segment.open("rb") as f:
+                    for number, record in enumerate(records):
+                        memory = self._parse_chunk(self._read_chunk(f, record))
+                        if not memory:
+                            continue
+                        for gram in _archive_grams(memory["content"]):
+                            postings.setdefault(gram, []).append(number)
+                self._write_json_atomic(postings_path, {"size": size, "grams": postings}, compress=True)
+                logger.info(f"重建分段倒排索引: {segment.name} ({len(records)} 条)")
+
+            self._segment_postings_cache[segment] = (size, postings)
+            return postings
+
+    @staticmethod
+    def _segment_sequence(segment: Path) -> int:
+        match = _SEGMENT_NAME.match(segment.name)
+        return int(match.group(1)) if match else 0
+
+    def _sealed_segments(self) -> List[Path]:
+        """按序号排序的旧分段（序号超过 4 位时按数值而不是文件名排序）"""
+        return sorted(
+            (path for path in self.segments_dir.glob("MEMORY-*.md") if _SEGMENT_NAME.match(path.name)),
+            key=self._segment_sequence,
+        )
+
+    def _segments(self) -> List[Path]:
+        """按时间顺序的所有分段，最后一个是当前的 MEMORY.md"""
+        return [*self._sealed_segments(), self.memory_file]
+
+    @staticmethod
+    def _scan_entries(text: str, base_offset: int) -> List[Dict]:
+        """扫描文本中的条目头部，返回带字节偏移的索引记录（线性扫描）"""
+        matches = list(MEMORY_HEADER_PATTERN.finditer(text))
+        records = []
+        char_pos, byte_pos = 0, base_offset
+        starts = []
+        for match in matches:
+            byte_pos += len(text[char_pos:match.start()].encode("utf-8"))
+            char_pos = match.start()
+            starts.append(byte_pos)
+        end_offset = base_offset + len(text.encode("utf-8"))
+        for i, match in enumerate(matches):
+            end = starts[i + 1] if i + 1 < len(starts) else end_offset
+            records.append({
+                "offset": starts[i],
+                "length": end - starts[i],
+                "id": match.group(2),
+                "type": match.group(1),
+                "timestamp": match.group(3),
+                "date": match.group(3)[:10],
+            })
+        return records
+
+    def _write_index_records(self, segment: Path, records: List[Dict], append: bool):
+        index_path = self._index_path(segment)
+        lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        if append:
+            with index_path.open("a", encoding="utf-8") as f:
+                f.write(lines)
+        else:
+            tmp_path = index_path.with_name(index_path.name + ".tmp")
+            tmp_path.write_text(lines, encoding="utf-8")
+            os.replace(tmp_path, index_path)
+
+    def _read_chunk(self, f, record: Dict) -> str:
+        f.seek(record["offset"])
+        return f.read(record["length"]).decode("utf-8", errors="replace")
+
+    def _load_index(self, segment: Path) -> Dict:
+        """
+        取分段的偏移索引。文件大小与索引覆盖范围一致时直接使用；
+        文件在索引之外被追加时只扫描新增尾部；被改短或内容对不上时整段重建。
+        """
+        with self._lock:
+            try:
+                size = segment.stat().st_size
+            except FileNotFoundError:
+                return {"size": 0, "entries": []}
+            state = self._index.get(segment)
+            if state is not None and state["size"] == size:
+                return state
+
+            if state is None:
+                entries = []
+                index_path = self._index_path(segment)
+                if index_path.exists():
+                    try:
+                        with index_path.open("r", encoding="utf-8") as f:
+                            entries = [json.loads(line) for line in f if line.strip()]
+                    except (OSError, ValueError):
+                        entries = []
+                indexed = entries[-1]["offset"] + entries[-1]["length"] if entries else 0
+                state = {"size": indexed, "entries": entries}
+
+            entries = state["entries"]
+            indexed = state["size"]
+            if entries and indexed <= size and self._index_matches(segment, entries[-1]):
+                if indexed == size:
+                    self._index[segment] = state
+                    return state
+                with segment.open("rb") as f:
+                    f.seek(indexed)
+                    tail = f.read(size - indexed).decode("utf-8", errors="replace")
+                first = MEMORY_HEADER_PATTERN.search(tail)
+                prefix = tail[:first.start()] if first else tail
+                if not prefix.strip():
+                    records = self._scan_entries(tail, indexed)
+                    self._write_index_records(segment, records, append=True)
+                    entries.extend(records)
+                    state["size"] = size
+                    self._index[segment] = state
+                    return state
+
+            # 整段重建
+            text = segment.read_bytes().decode("utf-8", errors="replace")
+            records = self._scan_entries(text, 0)
+            self._write_index_records(segment, records, append=False)
+            state = {"size": size, "entries": records}
+            self._index[segment] = state
+            logger.info(f"重建 Markdown 偏移索引: {segment.name} ({len(records)} 条)")
+            return state
+
+    def _index_matches(self, segment: Path, record: Dict) -> bool:
+        try:
+            with segment.open("rb") as f:
+                match = MEMORY_HEADER_PATTERN.match(self._read_chunk(f, record))
+        except OSError:
+            return False
+        return bool(match) and match.group(2) == record["id"]
+
+    def _read_entries(self, segment: Path, records: List[Dict]) -> List[Dict]:
+        """按索引 seek 读取指定条目"""
+        memories = []
+        if not records:
+            return memories
+        with segment.open("rb") as f:
+            for record in records:
+                memory = self._parse_chunk(self._read_chunk(f, record))
+                if memory:
+                    memories.append(memory)
+        return memories
 
-        # 追加到文件末尾
-        with daily_file.open("a", encoding="utf-8") as f:
-            f.write(entry)
+    @classmethod
+    def _parse_chunk(cls, chunk: str) -> Optional[Dict]:
+        match = MEMORY_HEADER_PATTERN.match(chunk)
+        return cls._entry_from_match(chunk, match) if match else None
+
+    @staticmethod
+    def _entry_from_match(content: str, match) -> Dict:
+        memory_type = match.group(1)
+        memory_id = match.group(2)
+        timestamp = match.group(3)
+
+        # 提取内容（下一个三级标题或 --- 之前）
+        start = match.end()
+        end_match = _ENTRY_END_PATTERN.search(content, start)
+        end = end_match.start() if end_match else len(content)
+        memory_content = content[start:end].strip()
+
+        # 提取标签
+        tags_match = _TAGS_PATTERN.search(memory_content)
+        tags = []
+        if tags_match:
+            tag_str = tags_match.group(1)
+            tags = [t.strip("`") for t in tag_str.split(",")]
+            tags = [t.strip() for t in tags]
+
+        # 移除元数据，只保留正文
+        memory_text = re.sub(r"\*\*时间\*\*:[^\n]+\n+", "", memory_content)
+        memory_text = re.sub(r"\*\*标签\*\*:[^\n]+\n+", "", memory_text)
+        memory_text = memory_text.strip()
 
-        logger.info(f"保存日志: {daily_file.name}")
-        return str(daily_file)
+        return {
+            "id": memory_id,
+            "type": memory_type,
+            "timestamp": timestamp,
+            "content": memory_text,
+            "tags": tags
+        }
+
+    def get_memory(self, memory_id: str) -> Optional[Dict]:
+        """按 ID 读取单条记忆（只 seek 该条目；ID 重复时取最新的一条）"""
+        for segment in reversed(self._segments()):
+            for record in reversed(self._load_index(segment)["entries"]):
+                if record["id"] == memory_id:
+                    found = self._read_entries(segment, [record])
+                    return found[0] if found else None
+        return None
+
+    def get_index_stats(self) -> Dict:
+        """分段数、条目数和磁盘占用"""
+        segments = self._segments()
+        entries = sum(len(self._load_index(segment)["entries"]) for segment in segments)
+        return {
+            "segments": len(segments),
+            "entries": entries,
+            "bytes": sum(segment.stat().st_size for segment in segments if segment.exists()),
+            "index_bytes": sum(
+                path.stat().st_size
+                for segment in segments
+                for path in (self._index_path(segment), self._postings_path(segment))
+                if path.exists()
+            ),
+            "segment_max_bytes": self.segment_max_bytes,
+        }
 
     def read_memory(self) -> str:
         """
@@ -190,57 +568,20 @@ class MarkdownMemory:
         解析 MEMORY.md 为结构化数据
 
         Args:
-            content: Markdown 内容（可选，默认读取 MEMORY.md）
+            content: Markdown 内容（可选，默认按偏移索引读取所有分段）
 
         Returns:
             记忆列表
         """
-        if content is None:
-            content = self.read_memory()
-
-        memories = []
-
-        # 正则匹配记忆条目
-        # 格式: ### [memory_type] memory_id
-        pattern = r"###\s+\[(\w+)\]\s+(mem_[\w]+)\n\n\*\*时间\*\*:\s+([^\n]+)"
-
-        matches = re.finditer(pattern, content)
-
-        for match in matches:
-            memory_type = match.group(1)
-            memory_id = match.group(2)
-            timestamp = match.group(3)
-
-            # 提取内容（下一个三级标题或 --- 之前）
-            start = match.end()
-            end_match = re.search(r"\n(###|---)", content[start:])
-            if end_match:
-                end = start + end_match.start()
-            else:
-                end = len(content)
-
-            memory_content = content[start:end].strip()
-
-            # 提取标签
-            tags_match = re.search(r"\*\*标签\*\*:\s+([^\n]+)", memory_content)
-            tags = []
-            if tags_match:
-                tag_str = tags_match.group(1)
-                tags = [t.strip("`") for t in tag_str.split(",")]
-                tags = [t.strip() for t in tags]
-
-            # 移除元数据，只保留正文
-            memory_text = re.sub(r"\*\*时间\*\*:[^\n]+\n+", "", memory_content)
-            memory_text = re.sub(r"\*\*标签\*\*:[^\n]+\n+", "", memory_text)
-            memory_text = memory_text.strip()
-
-            memories.append({
-                "id": memory_id,
-                "type": memory_type,
-                "timestamp": timestamp,
-                "content": memory_text,
-                "tags": tags
-            })
+        if content is not None:
+            memories = [
+                self._entry_from_match(content, match)
+                for match in MEMORY_HEADER_PATTERN.finditer(content)
+            ]
+        else:
+            memories = []
+            for segment in self._segments():
+                memories.extend(self._read_entries(segment, self._load_index(segment)["entries"]))
 
         logger.info(f"解析记忆: {len(memories)} 条")
         return memories
@@ -248,32 +589,81 @@ class MarkdownMemory:
     def search_memories(
         self,
         query: str,
-        memory_type: Optional[str] = None
+        memory_type: Optional[str] = None,
+        include_archives: bool = False,
     ) -> List[Dict]:
         """
         简单文本搜索记忆
 
+        先用索引按类型过滤。旧分段用二元组倒排表求出候选条目，只 seek 读取这些条目；
+        当前 MEMORY.md（以及单字查询）在原始字节上查找关键词，
+        只解析命中位置所在的条目（查询含非 ASCII 的大小写字母时逐条比较）。
+
         Args:
             query: 搜索关键词
             memory_type: 记忆类型过滤（可选）
+            include_archives: 同时检索已压缩归档的每日日志（见 search_archives）
 
         Returns:
             匹配的记忆列表
         """
-        memories = self.parse_memories()
-
         # 关键词匹配（不区分大小写）
         query_lower = query.lower()
+        byte_scan = bool(query) and not any(ord(c) > 127 and c.lower() != c.upper() for c in query)
+        needle = re.compile(re.escape(query.encode("utf-8")), re.IGNORECASE) if byte_scan else None
+        grams = _archive_grams(query)
         results = []
 
-        for memory in memories:
+        for segment in self._segments():
+            records = self._load_index(segment)["entries"]
+            if grams and segment != self.memory_file:
+                postings = self._segment_postings(segment)
+                lists = sorted((postings.get(gram, []) for gram in grams), key=len)
+                numbers = set(lists[0])
+                for other in lists[1:]:
+                    if not numbers:
+                        break
+                    numbers.intersection_update(other)
+                records = [records[number] for number in sorted(numbers) if number < len(records)]
+                if memory_type:
+                    records = [record for record in records if record["type"] == memory_type]
+                candidates = self._read_entries(segment, records)
+                for memory in candidates:
+                    if query_lower in memory["content"].lower():
+                        results.append(memory)
+                continue
+
             # 类型过滤
-            if memory_type and memory["type"] != memory_type:
+            if memory_type:
+                records = [record for record in records if record["type"] == memory_type]
+            if not records:
                 continue
 
+            if needle is not None:
+                data = segment.read_bytes()
+                offsets = [record["offset"] for record in records]
+                hits = set()
+                for match in needle.finditer(data):
+                    i = bisect.bisect_right(offsets, match.start()) - 1
+                    if i >= 0 and match.start() < offsets[i] + records[i]["length"]:
+                        hits.add(i)
+                candidates = [
+                    self._parse_chunk(
+                        data[records[i]["offset"]:records[i]["offset"] + records[i]["length"]]
+                        .decode("utf-8", errors="replace")
+                    )
+                    for i in sorted(hits)
+                ]
+            else:
+                candidates = self._read_entries(segment, records)
+
             # 内容匹配
-            if query_lower in memory["content"].lower():
-                results.append(memory)
+            for memory in candidates:
+                if memory and query_lower in memory["content"].lower():
+                    results.append(memory)
+
+        if include_archives:
+            results.extend(self.search_archives(query, log_type=memory_type))
 
         logger.info(f"搜索记忆: query='{query}', 找到 {len(results)} 条")
         return results
@@ -308,62 +698,52 @@ class MarkdownMemory:
         logger.info(f"获取最近 {days} 天日志: {len(logs)} 个文件")
         return logs
 
-    def compress_logs(self, days: int = 30):
+    def compress_logs(self, days: int = 30, codec: str = "auto"):
         """
         压缩旧日志（超过指定天数的）
 
+        旧日志按月打包到 archive/YYYY-MM/logs.gz（安装了 zstandard 时为 logs.zst），
+        每天一个独立压缩块，manifest.json 记录每天的块偏移和每条日志在块内的偏移，
+        postings.json.gz 是字符二元组倒排索引，search_archives 只解压命中的那几天。
+        旧版直接移动到 archive/YYYY-MM/ 的 .md 文件也会一并打包。
+
         Args:
             days: 保留天数
+            codec: "gzip" / "zstd" / "auto"（已有归档沿用原来的编码）
         """
         from datetime import timedelta
 
         cutoff_date = datetime.now() - timedelta(days=days)
+        if codec == "auto":
+            codec = "zstd" if ZSTD_AVAILABLE else "gzip"
+        elif codec == "zstd" and not ZSTD_AVAILABLE:
+            logger.warning("zstandard 未安装，改用 gzip 压缩日志")
+            codec = "gzip"
 
-        # 查找所有旧日志文件
+        # 查找所有旧日志文件（含旧版归档目录里未压缩的 .md）
         old_logs = []
-        for log_file in self.daily_dir.glob("*.md"):
+        sources = [*self.daily_dir.glob("*.md"), *self.archive_dir.glob("*/*.md")]
+        for log_file in sources:
             try:
                 # 从文件名提取日期
                 file_date_str = log_file.stem  # 2026-02-05
-                file_date = datetime.strptime(file_date_str, "%Y-%m-%d")
+                match = _DAILY_LOG_NAME.match(file_date_str)
+                file_date = datetime.strptime(match.group(0) if match else file_date_str, "%Y-%m-%d")
 
-                if file_date < cutoff_date:
-                    old_logs.append(log_file)
+                if file_date < cutoff_date or log_file.parent != self.daily_dir:
+                    old_logs.append((file_date, log_file))
             except ValueError:
                 # 文件名不符合日期格式，跳过
                 continue
 
-        moved_logs: List[Dict] = []
-        for log_file in sorted(old_logs):
-            try:
-                file_date = datetime.strptime(log_file.stem, "%Y-%m-%d")
-                month_bucket = file_date.strftime("%Y-%m")
-            except ValueError:
-                month_bucket = "unknown"
-
-            target_dir = self.archive_dir / month_bucket
-            target_dir.mkdir(parents=True, exist_ok=True)
-
-            target_path = target_dir / log_file.name
-            if target_path.exists():
-                # 避免覆盖同名文件
-                target_path = target_dir / f"{log_file.stem}_{int(datetime.now().timestamp())}.md"
+        by_month: Dict[str, List[Tuple[datetime, Path]]] = {}
+        for file_date, log_file in sorted(old_logs):
+            by_month.setdefault(file_date.strftime("%Y-%m"), []).append((file_date, log_file))
 
-            size = 0
-            try:
-                size = log_file.stat().st_size
-            except Exception:
-                pass
-
-            shutil.move(str(log_file), str(target_path))
-            moved_logs.append(
-                {
-                    "date": log_file.stem,
-                    "from": str(log_file),
-                    "to": str(target_path),
-                    "size": size,
-                }
-            )
+        moved_logs: List[Dict] = []
+        with self._lock:
+            for month_bucket, logs in by_month.items():
+                moved_logs.extend(self._pack_month(month_bucket, logs, codec))
 
         if moved_logs:
             index_file = self.archive_dir / "index.jsonl"
@@ -375,6 +755,236 @@ class MarkdownMemory:
         logger.info(f"压缩日志: 找到 {len(old_logs)} 个旧文件, 已归档 {len(moved_logs)} 个")
         return moved_logs
 
+    def _pack_month(self, month_bucket: str, logs: List[Tuple[datetime, Path]], codec: str) -> List[Dict]:
+        """把一个月的日志追加进该月归档；先写数据和索引，最后才删除源文件"""
+        target_dir = self.archive_dir / month_bucket
+        target_dir.mkdir(parents=True, exist_ok=True)
+        manifest, postings = self._load_archive(target_dir)
+        if manifest is None:
+            manifest = {"codec": codec, "days": [], "entries": []}
+            postings = {}
+        codec = manifest["codec"]
+        archive_path = target_dir / ("logs.zst" if codec == "zstd" else "logs.gz")
+
+        packed: List[Dict] = []
+        offset = archive_path.stat().st_size if archive_path.exists() else 0
+        with archive_path.open("ab") as archive:
+            for file_date, log_file in logs:
+                raw = log_file.read_bytes()
+                block = _compress(codec, raw)
+                archive.write(block)
+                day_number = len(manifest["days"])
+                manifest["days"].append({
+                    "date": file_date.strftime("%Y-%m-%d"),
+                    "source": log_file.name,
+                    "offset": offset,
+                    "length": len(block),
+                    "raw_length": len(raw),
+                })
+                offset += len(block)
+
+                text = raw.decode("utf-8", errors="replace")
+                spans = self._log_entry_spans(text)
+                for start, end, char_start, char_end, entry_time, entry_type in spans:
+                    entry_number = len(manifest["entries"])
+                    manifest["entries"].append({
+                        "day": day_number,
+                        "start": start,
+                        "end": end,
+                        "time": entry_time,
+                        "log_type": entry_type,
+                    })
+                    for gram in _archive_grams(text[char_start:char_end]):
+                        postings.setdefault(gram, []).append(entry_number)
+
+                packed.append({
+                    "date": file_date.strftime("%Y-%m-%d"),
+                    "from": str(log_file),
+                    "to": str(archive_path),
+                    "size": len(raw),
+                    "compressed_size": len(block),
+                    "entries": len(spans),
+                })
+            archive.flush()
+            os.fsync(archive.fileno())
+
+        self._write_json_atomic(target_dir / ARCHIVE_POSTINGS, postings, compress=True)
+        self._write_json_atomic(target_dir / ARCHIVE_MANIFEST, manifest)
+        self._archive_cache.pop(target_dir, None)
+        for _, log_file in logs:
+            log_file.unlink(missing_ok=True)
+        return packed
+
+    @staticmethod
+    def _log_entry_spans(text: str) -> List[Tuple[int, int, int, int, str, str]]:
+        """
+        日志条目的 (起始字节, 结束字节, 起始字符, 结束字符, 时间, 类型)。
+        没有条目头部的日志（手写笔记等）整篇作为一条 "log"。
+        """
+        matches = list(LOG_ENTRY_PATTERN.finditer(text))
+        if not matches:
+            return [(0, len(text.encode("utf-8")), 0, len(text), "00:00:00", "log")] if text.strip() else []
+        spans = []
+        char_pos, byte_pos = 0, 0
+        starts = []
+        for match in matches:
+            byte_pos += len(text[char_pos:match.start()].encode("utf-8"))
+            char_pos = match.start()
+            starts.append(byte_pos)
+        total = byte_pos + len(text[char_pos:].encode("utf-8"))
+        for i, match in enumerate(matches):
+            end = starts[i + 1] if i + 1 < len(starts) else total
+            char_end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+            spans.append((starts[i], end, match.start(), char_end, match.group(1), match.group(2)))
+        return spans
+
+    @staticmethod
+    def _write_json_atomic(path: Path, data: Dict, compress: bool = False):
+        payload = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if compress:
+            payload = gzip.compress(payload, mtime=0)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_bytes(payload)
+        os.replace(tmp_path, path)
+
+    def _load_archive(self, month_dir: Path) -> Tuple[Optional[Dict], Dict]:
+        manifest_path = month_dir / ARCHIVE_MANIFEST
+        try:
+            mtime = manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None, {}
+        cached = self._archive_cache.get(month_dir)
+        if cached and cached[0] == mtime:
+            return cached[1], cached[2]
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        postings_path = month_dir / ARCHIVE_POSTINGS
+        postings = json.loads(gzip.decompress(postings_path.read_bytes())) if postings_path.exists() else {}
+        self._archive_cache[month_dir] = (mtime, manifest, postings)
+        return manifest, postings
+
+    def _archive_months(self) -> List[Path]:
+        return sorted(path.parent for path in self.archive_dir.glob(f"*/{ARCHIVE_MANIFEST}"))
+
+    def search_archives(
+        self,
+        query: str,
+        log_type: Optional[str] = None,
+        months: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        检索压缩归档中的日志条目（不区分大小写的子串匹配）
+
+        用倒排索引求出同时包含查询全部二元组的候选条目，只解压候选条目所在的那几天。
+
+        Args:
+            query: 搜索关键词
+            log_type: 日志类型过滤（可选）
+            months: 只检索这些月份（YYYY-MM，可选）
+            limit: 最多返回条数（可选）
+        """
+        started = time.perf_counter()
+        query_lower = query.lower()
+        grams = _archive_grams(query)
+        results: List[Dict] = []
+
+        for month_dir in self._archive_months():
+            if months and month_dir.name not in months:
+                continue
+            if limit is not None and len(results) >= limit:
+                break
+            with self._lock:
+                manifest, postings = self._load_archive(month_dir)
+            if not manifest:
+                continue
+
+            if grams:
+                lists = sorted((postings.get(gram, []) for gram in grams), key=len)
+                candidates = set(lists[0])
+                for other in lists[1:]:
+                    if not candidates:
+                        break
+                    candidates.intersection_update(other)
+            else:
+                candidates = set(range(len(manifest["entries"])))
+
+            by_day: Dict[int, List[int]] = {}
+            for entry_number in sorted(candidates):
+                entry = manifest["entries"][entry_number]
+                if log_type and entry["log_type"] != log_type:
+                    continue
+                by_day.setdefault(entry["day"], []).append(entry_number)
+            if not by_day:
+                continue
+
+            codec = manifest["codec"]
+            archive_path = month_dir / ("logs.zst" if codec == "zstd" else "logs.gz")
+            with archive_path.open("rb") as archive:
+                for day_number, entry_numbers in sorted(by_day.items()):
+                    day = manifest["days"][day_number]
+                    archive.seek(day["offset"])
+                    raw = _decompress(codec, archive.read(day["length"]))
+                    for entry_number in entry_numbers:
+                        entry = manifest["entries"][entry_number]
+                        chunk = raw[entry["start"]:entry["end"]].decode("utf-8", errors="replace")
+                        body = LOG_ENTRY_PATTERN.sub("", chunk, count=1)
+                        body = re.sub(r"\n---\s*$", "", body.rstrip()).strip()
+                        if query_lower not in body.lower():
+                            continue
+                        results.append({
+                            "id": f"log_{day['date'].replace('-', '')}_{entry_number}",
+                            "type": entry["log_type"],
+                            "timestamp": f"{day['date']} {entry['time']}",
+                            "content": body,
+                            "tags": [],
+                            "source": "archive",
+                            "archive": month_dir.name,
+                        })
+                        if limit is not None and len(results) >= limit:
+                            break
+                    if limit is not None and len(results) >= limit:
+                        break
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            stats = self._archive_search_stats
+            stats["searches"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["last_ms"] = elapsed_ms
+        logger.info(f"检索归档日志: query='{query}', 找到 {len(results)} 条 ({elapsed_ms:.1f} ms)")
+        return results
+
+    def get_archive_stats(self) -> Dict:
+        """归档的磁盘占用（原始 / 压缩 / 索引字节数）与检索耗时"""
+        report = {"months": 0, "days": 0, "entries": 0, "raw_bytes": 0, "compressed_bytes": 0, "index_bytes": 0}
+        for month_dir in self._archive_months():
+            with self._lock:
+                manifest, _ = self._load_archive(month_dir)
+            if not manifest:
+                continue
+            report["months"] += 1
+            report["days"] += len(manifest["days"])
+            report["entries"] += len(manifest["entries"])
+            report["raw_bytes"] += sum(day["raw_length"] for day in manifest["days"])
+            for name in ("logs.gz", "logs.zst"):
+                if (month_dir / name).exists():
+                    report["compressed_bytes"] += (month_dir / name).stat().st_size
+            for name in (ARCHIVE_MANIFEST, ARCHIVE_POSTINGS):
+                if (month_dir / name).exists():
+                    report["index_bytes"] += (month_dir / name).stat().st_size
+        stored = report["compressed_bytes"] + report["index_bytes"]
+        report["compression_ratio"] = round(report["raw_bytes"] / stored, 3) if stored else 0.0
+        with self._lock:
+            stats = dict(self._archive_search_stats)
+        report["search"] = {
+            "searches": stats["searches"],
+            "last_ms": round(stats["last_ms"], 3),
+            "max_ms": round(stats["max_ms"], 3),
+            "avg_ms": round(stats["total_ms"] / stats["searches"], 3) if stats["searches"] else 0.0,
+        }
+        return report
+
     def export_to_json(self) -> Dict:
         """
         导出所有记忆为 JSON 格式
@@ -411,6 +1021,184 @@ class MarkdownMemory:
         logger.info(f"导入记忆: {len(memories)} 条")
 
 
+class MarkdownMirrorWriter:
+    """
+    MarkdownMemory 的异步追加写入器
+
+    save_memory / save_daily_log 与 MarkdownMemory 同签名，但只在调用线程里
+    格式化条目（时间戳、记忆 ID 取入队时刻），然后放进有界队列立即返回。
+    后台线程按文件合并一批条目，每个文件一次 open + write；fsync 按间隔执行。
+    队列满时调用方阻塞等待（背压），条目不会丢。
+    """
+
+    def __init__(
+        self,
+        markdown: MarkdownMemory,
+        max_queue: int = 2048,
+        max_batch: int = 256,
+        fsync_interval_sec: float = 1.0,
+    ):
+        self.markdown = markdown
+        self.max_batch = max(1, int(max_batch))
+        self.fsync_interval_sec = max(0.0, float(fsync_interval_sec))
+        # (文件, 新文件头部或 None, 条目文本, 入队时间)
+        self._queue: "queue.Queue[Tuple[Path, Optional[str], str, float]]" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._outstanding = 0
+        self._unsynced: set = set()
+        self._last_fsync = time.monotonic()
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self.stats = {
+            "entries": 0,
+            "batches": 0,
+            "fsyncs": 0,
+            "errors": 0,
+            "blocked_puts": 0,
+            "max_queued": 0,
+            "last_lag_ms": 0.0,
+            "max_lag_ms": 0.0,
+        }
+
+    def start(self):
+        """启动后台写线程（幂等）"""
+        with self._lock:
+            if self._stop.is_set() or (self._worker is not None and self._worker.is_alive()):
+                return
+            self._worker = threading.Thread(target=self._run, name="markdown-mirror", daemon=True)
+            self._worker.start()
+
+    def save_memory(self, content: str, memory_type: str = "knowledge", tags: Optional[List[str]] = None) -> str:
+        memory_id, entry = self.markdown._memory_entry(content, memory_type, tags, datetime.now())
+        self._submit(self.markdown.memory_file, None, entry)
+        return memory_id
+
+    def save_daily_log(self, content: str, log_type: str = "conversation") -> str:
+        daily_file, header, entry = self.markdown._daily_log_entry(content, log_type, datetime.now())
+        self._submit(daily_file, header, entry)
+        return str(daily_file)
+
+    def _submit(self, path: Path, header: Optional[str], entry: str):
+        if self._stop.is_set():
+            # 已关闭：直接同步写，避免条目丢失
+            self._write_batch([(path, header, entry, time.monotonic())], fsync=True)
+            return
+        self.start()
+        with self._lock:
+            self._outstanding += 1
+        item = (path, header, entry, time.monotonic())
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.stats["blocked_puts"] += 1
+            self._queue.put(item)
+        with self._lock:
+            self.stats["max_queued"] = max(self.stats["max_queued"], self._queue.qsize())
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.fsync_interval_sec or 0.5)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                self._maybe_fsync(force=True)
+                continue
+            batch = [first]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+            with self._idle:
+                self._outstanding -= len(batch)
+                if self._outstanding <= 0:
+                    self._idle.notify_all()
+
+    def _write_batch(self, batch: List[Tuple[Path, Optional[str], str, float]], fsync: bool = False):
+        by_file: Dict[Path, List[Tuple[Optional[str], str]]] = {}
+        for path, header, entry, _ in batch:
+            by_file.setdefault(path, []).append((header, entry))
+
+        for path, items in by_file.items():
+            try:
+                self.markdown.append_text(path, "".join(entry for _, entry in items), header=items[0][0])
+                with self._lock:
+                    self._unsynced.add(path)
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                logger.error(f"Markdown 镜像写入失败 {path}: {e}")
+
+        now = time.monotonic()
+        lag_ms = (now - min(item[3] for item in batch)) * 1000
+        with self._lock:
+            self.stats["entries"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["last_lag_ms"] = round(lag_ms, 3)
+            self.stats["max_lag_ms"] = round(max(self.stats["max_lag_ms"], lag_ms), 3)
+        self._maybe_fsync(force=fsync)
+
+    def _maybe_fsync(self, force: bool = False):
+        with self._lock:
+            due = force or time.monotonic() - self._last_fsync >= self.fsync_interval_sec
+            if not due or not self._unsynced:
+                return
+            paths, self._unsynced = self._unsynced, set()
+            self._last_fsync = time.monotonic()
+        for path in paths:
+            try:
+                with path.open("ab") as f:
+                    os.fsync(f.fileno())
+            except Exception as e:
+                logger.warning(f"Markdown 镜像 fsync 失败 {path}: {e}")
+        with self._lock:
+            self.stats["fsyncs"] += 1
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """等待已入队条目全部写入并 fsync；超时返回 False"""
+        deadline = time.monotonic() + max(0.0, timeout)
+        with self._idle:
+            while self._outstanding > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._worker is None or not self._worker.is_alive():
+                    return self._outstanding <= 0
+                self._idle.wait(remaining)
+        self._maybe_fsync(force=True)
+        return True
+
+    def close(self, timeout: float = 5.0):
+        """写完队列中剩余的条目后停止后台线程"""
+        self.flush(timeout)
+        self._stop.set()
+        worker = self._worker
+        if worker is not None:
+            worker.join(timeout=max(1.0, self.fsync_interval_sec * 2))
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover:
+            self._write_batch(leftover)
+            with self._lock:
+                self._outstanding -= len(leftover)
+        self._maybe_fsync(force=True)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["queued"] = self._queue.qsize()
+            stats["outstanding"] = self._outstanding
+            stats["unsynced_files"] = len(self._unsynced)
+            stats["seconds_since_fsync"] = round(time.monotonic() - self._last_fsync, 3)
+        return stats
+
+
 # Utility Functions
 
 def trigger_memory_flush(context: str, threshold: int = 150000) -> bool:
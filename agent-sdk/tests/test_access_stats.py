@@ -0,0 +1,85 @@
+import sqlite3
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from core.access_stats import AccessStatsBuffer
+
+
+class AccessStatsBufferTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db_path = Path(self._tmp.name) / "memories.db"
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            "CREATE TABLE semantic_memories (id TEXT PRIMARY KEY, access_count INTEGER DEFAULT 0, last_accessed_at TEXT)"
+        )
+        conn.executemany("INSERT INTO semantic_memories (id) VALUES (?)", [("a",), ("b",), ("c",)])
+        conn.commit()
+        conn.close()
+        self.statements = []
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.set_trace_callback(self.statements.append)
+        return conn
+
+    def _counts(self):
+        conn = sqlite3.connect(self.db_path)
+        rows = dict(conn.execute("SELECT id, access_count FROM semantic_memories").fetchall())
+        conn.close()
+        return rows
+
+    def test_hits_are_coalesced_into_one_transaction(self):
+        buffer = AccessStatsBuffer(self._connect, flush_interval_sec=60)
+        buffer.record(["a", "b"], accessed_at="2026-01-01T00:00:00")
+        buffer.record(["a"], accessed_at="2026-01-02T00:00:00")
+        buffer.record(["missing"])
+
+        self.assertEqual(self._counts(), {"a": 0, "b": 0, "c": 0})
+        self.assertEqual(buffer.pending(["a", "b", "c"]), {"a": 2, "b": 1})
+
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(self._counts(), {"a": 2, "b": 1, "c": 0})
+        self.assertEqual(sum(1 for sql in self.statements if sql == "COMMIT"), 1)
+        conn = sqlite3.connect(self.db_path)
+        last = conn.execute("SELECT last_accessed_at FROM semantic_memories WHERE id = 'a'").fetchone()[0]
+        conn.close()
+        self.assertEqual(last, "2026-01-02T00:00:00")
+        self.assertEqual(buffer.pending(["a"]), {})
+        buffer.close()
+
+    def test_background_thread_flushes_when_full(self):
+        buffer = AccessStatsBuffer(self._connect, flush_interval_sec=60, max_pending=2)
+        buffer.record(["a", "b"])
+        deadline = time.time() + 5
+        while self._counts()["a"] == 0 and time.time() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(self._counts(), {"a": 1, "b": 1, "c": 0})
+        buffer.close()
+
+    def test_failed_flush_keeps_counts_for_retry(self):
+        healthy = self._connect
+        buffer = AccessStatsBuffer(lambda: sqlite3.connect(Path(self._tmp.name) / "missing" / "x.db"), 60)
+        buffer.record(["a"])
+        with self.assertRaises(sqlite3.Error):
+            buffer.flush()
+        buffer.record(["a"])
+        self.assertEqual(buffer.pending(["a"]), {"a": 2})
+        self.assertEqual(buffer.get_stats()["failed_flushes"], 1)
+
+        buffer._connect = healthy
+        buffer.close()
+        self.assertEqual(self._counts()["a"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
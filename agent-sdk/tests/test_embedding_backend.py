@@ -0,0 +1,75 @@
+import tempfile
+import unittest
+import unittest.mock
+from pathlib import Path
+
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+
+import core.memory as memory_module
+from core.embedding_backend import (
+    ONNX_AVAILABLE,
+    OnnxEmbeddingBackend,
+    SentenceTransformerBackend,
+    hub_model_id,
+    mean_pool,
+)
+from core.memory import MemoryManager
+
+
+class RecordingModel:
+    def __init__(self):
+        self.calls = []
+
+    def get_sentence_embedding_dimension(self):
+        return 3
+
+    def encode(self, texts, **kwargs):
+        self.calls.append(kwargs)
+        return np.ones((len(texts), 3), dtype="float32")
+
+
+class EmbeddingBackendTest(unittest.TestCase):
+    def test_sentence_transformer_backend_applies_batch_size(self):
+        model = RecordingModel()
+        backend = SentenceTransformerBackend(model, batch_size=16)
+        self.assertEqual(backend.encode(["a", "b"]).shape, (2, 3))
+        backend.encode(["a"], batch_size=4)
+        self.assertEqual([call["batch_size"] for call in model.calls], [16, 4])
+        self.assertFalse(model.calls[0]["show_progress_bar"])
+        self.assertEqual(backend.get_sentence_embedding_dimension(), 3)
+
+    def test_mean_pool_ignores_padding_and_normalizes(self):
+        tokens = np.array([[[1.0, 0.0], [3.0, 0.0], [100.0, 100.0]]], dtype="float32")
+        mask = np.array([[1, 1, 0]])
+        np.testing.assert_allclose(mean_pool(tokens, mask, normalize=False), [[2.0, 0.0]])
+        np.testing.assert_allclose(mean_pool(tokens, mask), [[1.0, 0.0]])
+        self.assertEqual(hub_model_id("all-MiniLM-L6-v2"), "sentence-transformers/all-MiniLM-L6-v2")
+        self.assertEqual(hub_model_id("BAAI/bge-small-zh-v1.5"), "BAAI/bge-small-zh-v1.5")
+
+    @unittest.skipIf(ONNX_AVAILABLE, "onnxruntime is installed")
+    def test_onnx_backend_reports_missing_runtime(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(RuntimeError):
+                OnnxEmbeddingBackend("all-MiniLM-L6-v2", Path(tmp))
+
+    def test_quantized_backend_uses_its_own_embedding_cache_namespace(self):
+        memory_module.EMBEDDING_AVAILABLE = False
+        memory_module.HYBRID_SEARCH_AVAILABLE = False
+        memory_module.MARKDOWN_MEMORY_AVAILABLE = False
+        with tempfile.TemporaryDirectory() as tmp:
+            with unittest.mock.patch.dict(
+                "os.environ", {"MEMORY_EMBEDDING_BACKEND": "onnx", "MEMORY_EMBEDDING_QUANTIZE": "int8"}
+            ):
+                manager = MemoryManager(Path(tmp))
+            self.assertEqual(manager.embedding_cache_name, "all-MiniLM-L6-v2#onnx-int8")
+            status = manager.get_embedding_status()
+            self.assertEqual((status["backend"], status["quantized"]), ("onnx", True))
+            manager.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+
+from core.embedding_cache import EmbeddingCache
+
+
+class CountingEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.asarray([[float(len(text)), float(sum(map(ord, text)) % 97)] for text in texts], dtype="float32")
+
+
+class EmbeddingCacheTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db_path = Path(self._tmp.name) / "cache.db"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_repeated_and_whitespace_variant_texts_skip_encoder(self):
+        cache = EmbeddingCache(self.db_path)
+        encoder = CountingEncoder()
+
+        first = cache.encode("model-a", ["hello world", "hello   world ", "other"], encoder)
+        second = cache.encode("model-a", ["hello world"], encoder)
+
+        self.assertEqual(encoder.calls, [["hello world", "other"]])
+        np.testing.assert_array_equal(first[0], first[1])
+        np.testing.assert_array_equal(second[0], first[0])
+        stats = cache.get_stats()
+        self.assertEqual(stats["memory_hits"], 1)
+        self.assertEqual(stats["misses"], 3)
+
+    def test_sqlite_level_survives_new_instance_and_is_keyed_by_model(self):
+        encoder = CountingEncoder()
+        EmbeddingCache(self.db_path).encode("model-a", ["persisted text"], encoder)
+
+        reopened = EmbeddingCache(self.db_path)
+        reopened.encode("model-a", ["persisted text"], encoder)
+        self.assertEqual(len(encoder.calls), 1)
+        self.assertEqual(reopened.get_stats()["db_hits"], 1)
+
+        reopened.encode("model-b", ["persisted text"], encoder)
+        self.assertEqual(len(encoder.calls), 2)
+
+    def test_lru_is_bounded(self):
+        cache = EmbeddingCache(self.db_path, max_entries=2)
+        cache.encode("model-a", ["a", "b", "c"], CountingEncoder())
+        self.assertEqual(cache.get_stats()["memory_entries"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+import sqlite3
+import unittest
+from pathlib import Path
+import sys
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.hybrid_search import (
+    HybridSearchService,
+    PersistentBM25Index,
+    bm25_rank_to_score,
+    build_fts_query,
+    short_fts_terms,
+)
+
+
+def simple_tokenize(text):
+    return text.split()
+
+
+class PersistentBM25IndexTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.cursor = self.conn.cursor()
+        PersistentBM25Index.ensure_schema(self.cursor)
+        self.index = PersistentBM25Index(simple_tokenize)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _df(self, term, user_id="u1"):
+        self.cursor.execute("SELECT df FROM bm25_terms WHERE user_id = ? AND term = ?", (user_id, term))
+        row = self.cursor.fetchone()
+        return row[0] if row else 0
+
+    def test_incremental_add_and_remove_keep_statistics(self):
+        self.index.add_document(self.cursor, "u1", "a", "apple banana apple")
+        self.index.add_document(self.cursor, "u1", "b", "banana cherry")
+        self.index.add_document(self.cursor, "u2", "c", "apple")
+
+        self.assertEqual(self._df("banana"), 2)
+        self.assertEqual(self.index.document_count(self.cursor, "u1"), 2)
+
+        self.index.remove_documents(self.cursor, "u1", ["a"])
+
+        self.assertEqual(self._df("apple"), 0)
+        self.assertEqual(self._df("banana"), 1)
+        self.assertEqual(self.index.document_count(self.cursor, "u1"), 1)
+        self.assertEqual(self.index.document_count(self.cursor, "u2"), 1)
+        self.cursor.execute("SELECT term FROM bm25_terms WHERE user_id = 'u1' ORDER BY term")
+        self.assertEqual([row[0] for row in self.cursor.fetchall()], ["banana", "cherry"])
+
+    def test_bulk_remove_sweeps_only_touched_terms_once(self):
+        for i in range(5):
+            self.index.add_document(self.cursor, "u1", f"d{i}", f"shared unique{i}")
+        self.index.add_document(self.cursor, "u1", "keep", "other words")
+        statements = []
+        self.conn.set_trace_callback(statements.append)
+
+        self.assertEqual(self.index.remove_documents(self.cursor, "u1", [f"d{i}" for i in range(5)]), 5)
+
+        self.conn.set_trace_callback(None)
+        sweeps = [sql for sql in statements if sql.startswith("DELETE FROM bm25_terms")]
+        self.assertEqual(len(sweeps), 1)
+        self.cursor.execute("SELECT term FROM bm25_terms WHERE user_id = 'u1' ORDER BY term")
+        self.assertEqual([row[0] for row in self.cursor.fetchall()], ["other", "words"])
+
+    def test_score_ranks_by_term_frequency_and_is_user_scoped(self):
+        self.index.add_document(self.cursor, "u1", "a", "apple apple pie")
+        self.index.add_document(self.cursor, "u1", "b", "apple tart crust")
+        self.index.add_document(self.cursor, "u1", "c", "cherry tart")
+        self.index.add_document(self.cursor, "u2", "d", "apple apple apple")
+
+        ranked = self.index.score(self.cursor, "u1", "apple", top_k=10)
+
+        self.assertEqual([doc_id for doc_id, _ in ranked], ["a", "b"])
+
+    def test_score_can_be_restricted_to_candidates(self):
+        self.index.add_document(self.cursor, "u1", "a", "apple apple pie")
+        self.index.add_document(self.cursor, "u1", "b", "apple tart")
+
+        ranked = self.index.score(self.cursor, "u1", "apple", doc_ids=["b"], top_k=10)
+
+        self.assertEqual([doc_id for doc_id, _ in ranked], ["b"])
+
+    def test_re_adding_document_replaces_previous_version(self):
+        self.index.add_document(self.cursor, "u1", "a", "apple pie")
+        self.index.add_document(self.cursor, "u1", "a", "cherry pie")
+
+        self.assertEqual(self._df("apple"), 0)
+        self.assertEqual(self._df("pie"), 1)
+        self.assertEqual(self.index.document_count(self.cursor, "u1"), 1)
+
+    def test_service_bm25_search_uses_persistent_index(self):
+        service = HybridSearchService()
+        service.inverted_index = PersistentBM25Index(simple_tokenize)
+        service.inverted_index.add_document(self.cursor, "u1", "a", "apple apple pie")
+        service.inverted_index.add_document(self.cursor, "u1", "b", "apple tart")
+        service.inverted_index.add_document(self.cursor, "u1", "c", "cherry tart")
+
+        results = service.bm25_search("apple", top_k=5, cursor=self.cursor, user_id="u1")
+
+        self.assertEqual(results[0], ("a", 1.0))
+        self.assertEqual(len(results), 2)
+        self.assertLess(results[1][1], 1.0)
+
+
+class VectorSearchMatrixTest(unittest.TestCase):
+    def setUp(self):
+        self.service = HybridSearchService()
+
+    def test_matrix_search_matches_pairwise_cosine(self):
+        rng = np.random.default_rng(7)
+        embeddings = rng.standard_normal((200, 16)).astype(np.float32)
+        doc_ids = [f"d{i}" for i in range(200)]
+        query = rng.standard_normal(16).astype(np.float32)
+
+        expected = sorted(
+            (
+                (doc_id, self.service.cosine_similarity(query, emb))
+                for doc_id, emb in zip(doc_ids, embeddings)
+            ),
+            key=lambda item: item[1],
+            reverse=True,
+        )[:5]
+        actual = self.service.vector_search_matrix(
+            query, doc_ids, self.service.build_embedding_matrix(embeddings), top_k=5
+        )
+
+        self.assertEqual([d for d, _ in actual], [d for d, _ in expected])
+        for (_, got), (_, want) in zip(actual, expected):
+            self.assertAlmostEqual(got, want, places=5)
+
+    def test_build_matrix_is_contiguous_normalized_float32(self):
+        matrix = self.service.build_embedding_matrix([np.array([3.0, 4.0]), np.zeros(2)])
+
+        self.assertEqual(matrix.dtype, np.float32)
+        self.assertTrue(matrix.flags["C_CONTIGUOUS"])
+        np.testing.assert_allclose(matrix[0], [0.6, 0.8], rtol=1e-6)
+        np.testing.assert_array_equal(matrix[1], [0.0, 0.0])
+
+    def test_vector_search_drops_zero_and_negative_scores(self):
+        results = self.service.vector_search(
+            np.array([1.0, 0.0]),
+            [("pos", np.array([1.0, 1.0])), ("zero", np.zeros(2)), ("neg", np.array([-1.0, 0.0]))],
+            top_k=10,
+        )
+
+        self.assertEqual([doc_id for doc_id, _ in results], ["pos"])
+
+
+class FtsHelpersTest(unittest.TestCase):
+    def test_bm25_rank_to_score_rewards_better_ranks(self):
+        self.assertGreater(bm25_rank_to_score(-8.0), bm25_rank_to_score(-1.0))
+        self.assertEqual(bm25_rank_to_score(0.0), 0.0)
+        self.assertEqual(bm25_rank_to_score(float("nan")), 0.0)
+        self.assertLess(bm25_rank_to_score(-1e6), 1.0)
+
+    def test_trigram_query_splits_cjk_and_drops_short_tokens(self):
+        query = build_fts_query("喜欢喝咖啡 ai python", operator="OR", tokenizer="trigram")
+
+        self.assertEqual(query, '"喜欢喝" OR "欢喝咖" OR "喝咖啡" OR "python"')
+        self.assertIsNone(build_fts_query("ai 咖啡", tokenizer="trigram"))
+        self.assertEqual(build_fts_query("hello world"), '"hello" AND "world"')
+
+    def test_short_fts_terms_lists_tokens_the_trigram_query_drops(self):
+        self.assertEqual(short_fts_terms("ai 咖啡 python 喜欢喝咖啡", tokenizer="trigram"), ["ai", "咖啡"])
+        self.assertEqual(short_fts_terms("ai 咖啡 python"), ["咖啡"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,13 @@
 import tempfile
 import unittest
+from unittest import mock
 from datetime import datetime, timedelta
 from pathlib import Path
 import sys
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
-from services.markdown_memory import MarkdownMemory
+from services.markdown_memory import MarkdownMemory, MarkdownMirrorWriter
 
 
 class MarkdownMemoryTest(unittest.TestCase):
@@ -49,6 +50,201 @@ class MarkdownMemoryTest(unittest.TestCase):
         self.assertIn(old_date, content[-1])
 
 
+    def test_mirror_writer_batches_appends_and_matches_sync_format(self):
+        writer = MarkdownMirrorWriter(self.mm, fsync_interval_sec=0.05)
+        before = self.mm.read_memory()
+        # Hold the worker back so everything lands in one batch.
+        writer.start = lambda: None
+        for i in range(20):
+            writer.save_memory(f"async entry {i}", memory_type="knowledge", tags=["t"])
+        log_path = Path(writer.save_daily_log("hello log"))
+        self.assertEqual(self.mm.read_memory(), before)
+        del writer.start
+        writer.start()
+        self.assertTrue(writer.flush(timeout=5))
+
+        memories = self.mm.parse_memories()
+        self.assertEqual([m["content"] for m in memories], [f"async entry {i}" for i in range(20)])
+        self.assertTrue(all(m["tags"] == ["t"] for m in memories))
+        self.assertTrue(self.mm.read_memory().startswith(before))
+        log = log_path.read_text(encoding="utf-8")
+        self.assertTrue(log.startswith("# CKS Lite - Daily Log"))
+        self.assertIn("hello log", log)
+
+        stats = writer.get_stats()
+        self.assertEqual(stats["entries"], 21)
+        self.assertEqual(stats["batches"], 1)
+        self.assertEqual(stats["queued"], 0)
+        self.assertEqual(stats["unsynced_files"], 0)
+        self.assertGreaterEqual(stats["max_lag_ms"], 0.0)
+        writer.close()
+
+    def test_mirror_writer_close_drains_queue_and_writes_after_close(self):
+        writer = MarkdownMirrorWriter(self.mm, max_queue=2)
+        for i in range(10):
+            writer.save_memory(f"entry {i}")
+        writer.close()
+        writer.save_memory("after close")
+
+        contents = [m["content"] for m in self.mm.parse_memories()]
+        self.assertEqual(contents, [f"entry {i}" for i in range(10)] + ["after close"])
+
+    def test_offset_index_matches_full_parse_and_follows_external_edits(self):
+        for i in range(5):
+            self.mm.save_memory(f"entry {i} 中文内容", memory_type="knowledge", tags=[f"t{i}"])
+        index_path = self.mm.memory_file.with_name("MEMORY.md.idx")
+        self.assertTrue(index_path.exists())
+        self.assertEqual(len(index_path.read_text(encoding="utf-8").splitlines()), 5)
+        full = self.mm.parse_memories(content=self.mm.read_memory())
+        self.assertEqual(self.mm.parse_memories(), full)
+
+        # Appended by another tool: only the tail is scanned.
+        with self.mm.memory_file.open("a", encoding="utf-8") as f:
+            f.write("\n### [context] mem_20260101_000000\n\n**时间**: 2026-01-01 00:00:00\n\nexternal\n\n---\n")
+        fresh = MarkdownMemory(self.workspace)
+        self.assertEqual(fresh.parse_memories()[-1]["content"], "external")
+        self.assertEqual(len(index_path.read_text(encoding="utf-8").splitlines()), 6)
+
+        # Hand edit that shifts offsets: the stale index is rebuilt.
+        text = self.mm.read_memory().replace("entry 0 中文内容", "edited")
+        self.mm.memory_file.write_text(text, encoding="utf-8")
+        fresh = MarkdownMemory(self.workspace)
+        parsed = fresh.parse_memories()
+        self.assertEqual(parsed, fresh.parse_memories(content=text))
+        self.assertEqual(parsed[0]["content"], "edited")
+        self.assertEqual(fresh.get_memory("mem_20260101_000000")["content"], "external")
+        self.assertIsNone(fresh.get_memory("mem_missing"))
+
+    def test_memory_file_rolls_over_into_indexed_segments(self):
+        mm = MarkdownMemory(self.workspace / "seg", segment_max_bytes=2048)
+        for i in range(40):
+            mm.save_memory(f"note {i} about Alpha project", memory_type="knowledge" if i % 2 else "context")
+        mm.save_memory("最后一条 中文记忆", memory_type="context")
+
+        sealed = sorted(mm.segments_dir.glob("MEMORY-*.md"))
+        self.assertGreater(len(sealed), 1)
+        self.assertTrue(all(path.stat().st_size <= 2048 for path in sealed))
+        self.assertLessEqual(mm.memory_file.stat().st_size, 2048)
+
+        contents = [m["content"] for m in mm.parse_memories()]
+        self.assertEqual(contents, [f"note {i} about Alpha project" for i in range(40)] + ["最后一条 中文记忆"])
+        self.assertEqual(mm.get_index_stats()["entries"], 41)
+
+        hits = mm.search_memories("ALPHA PROJECT", memory_type="knowledge")
+        self.assertEqual([m["content"] for m in hits], [f"note {i} about Alpha project" for i in range(1, 40, 2)])
+        self.assertEqual(len(mm.search_memories("note 3")), 11)
+        self.assertEqual([m["content"] for m in mm.search_memories("中文")], ["最后一条 中文记忆"])
+        self.assertEqual(mm.search_memories("时间"), [])
+
+        mm.clear_long_term()
+        self.assertEqual(mm.parse_memories(), [])
+        self.assertEqual(list(mm.segments_dir.glob("MEMORY-*")), [])
+
+    def test_segment_roll_uses_next_sequence_and_never_overwrites(self):
+        mm = MarkdownMemory(self.workspace / "seg", segment_max_bytes=1024)
+        mm.save_memory("first", memory_type="context")
+        mm._roll_segment()
+        mm.save_memory("second", memory_type="context")
+        mm._roll_segment()
+        (mm.segments_dir / "MEMORY-0001.md").unlink()
+        (mm.segments_dir / "MEMORY-0001.md.idx").unlink()
+
+        mm.save_memory("third", memory_type="context")
+        mm._roll_segment()
+        names = [path.name for path in mm._sealed_segments()]
+        self.assertEqual(names, ["MEMORY-0002.md", "MEMORY-0003.md"])
+        self.assertEqual([m["content"] for m in mm.parse_memories()], ["second", "third"])
+
+        (mm.segments_dir / "MEMORY-0004.md.idx").write_text("", encoding="utf-8")
+        mm.save_memory("fourth", memory_type="context")
+        with self.assertRaises(FileExistsError):
+            mm._roll_segment()
+        self.assertEqual([m["content"] for m in mm.parse_memories()], ["second", "third", "fourth"])
+
+    def test_sealed_segment_search_reads_only_posting_hits(self):
+        mm = MarkdownMemory(self.workspace / "seg", segment_max_bytes=2048)
+        for i in range(40):
+            mm.save_memory(f"note {i} about project", memory_type="knowledge")
+        mm.save_memory("记得给猫咪买猫粮", memory_type="context")
+        mm._roll_segment()
+        sealed = mm._sealed_segments()
+        self.assertTrue(all(mm._postings_path(path).exists() for path in sealed))
+
+        reopened = MarkdownMemory(self.workspace / "seg", segment_max_bytes=2048)
+        calls = []
+        read_entries = reopened._read_entries
+
+        def spy(segment, records):
+            calls.append((segment.name, len(records)))
+            return read_entries(segment, records)
+
+        with mock.patch.object(reopened, "_read_entries", side_effect=spy):
+            hits = reopened.search_memories("猫粮")
+        self.assertEqual([m["content"] for m in hits], ["记得给猫咪买猫粮"])
+        self.assertEqual([count for name, count in calls if name.startswith("MEMORY-")], [0] * (len(sealed) - 1) + [1])
+        self.assertEqual(len(reopened.search_memories("note 3")), 11)
+        self.assertEqual(reopened.search_memories("note 3", memory_type="context"), [])
+
+    def _write_log(self, date, entries):
+        daily_file, header, _ = self.mm._daily_log_entry("", "conversation", datetime.strptime(date, "%Y-%m-%d"))
+        text = header + "".join(
+            self.mm._daily_log_entry(content, log_type, datetime.strptime(f"{date} 10:00:0{i}", "%Y-%m-%d %H:%M:%S"))[2]
+            for i, (content, log_type) in enumerate(entries)
+        )
+        daily_file.write_text(text, encoding="utf-8")
+        return daily_file, text
+
+    def test_compressed_archive_round_trips_and_is_searchable(self):
+        old = datetime.now() - timedelta(days=60)
+        first = old.strftime("%Y-%m-%d")
+        second = (old + timedelta(days=1)).strftime("%Y-%m-%d")
+        _, first_text = self._write_log(first, [("User asked about Alpha launch", "conversation"),
+                                                ("部署 失败 需要回滚", "error")])
+        self._write_log(second, [("alpha retro notes " * 50, "conversation")])
+
+        moved = self.mm.compress_logs(days=30, codec="gzip")
+
+        self.assertEqual([item["date"] for item in moved], [first, second])
+        archive = Path(moved[0]["to"])
+        self.assertTrue(archive.name.endswith(".gz"))
+        self.assertEqual(list(self.mm.daily_dir.glob("*.md")), [])
+        # Each day is an independent member: the whole archive still decompresses.
+        import gzip
+        self.assertTrue(gzip.decompress(archive.read_bytes()).decode("utf-8").startswith(first_text))
+
+        hits = self.mm.search_archives("ALPHA")
+        self.assertEqual([h["timestamp"] for h in hits], [f"{first} 10:00:00", f"{second} 10:00:00"])
+        self.assertEqual(hits[0]["content"], "User asked about Alpha launch")
+        self.assertEqual([h["content"] for h in self.mm.search_archives("回滚")], ["部署 失败 需要回滚"])
+        self.assertEqual(self.mm.search_archives("alpha", log_type="error"), [])
+        self.assertEqual(self.mm.search_archives("launch", limit=1)[0]["type"], "conversation")
+
+        self.mm.save_memory("alpha in long-term memory")
+        combined = self.mm.search_memories("alpha", include_archives=True)
+        self.assertEqual(combined[0]["content"], "alpha in long-term memory")
+        self.assertEqual(len(combined), 3)
+
+        stats = self.mm.get_archive_stats()
+        self.assertEqual((stats["months"] >= 1, stats["days"], stats["entries"]), (True, 2, 3))
+        self.assertLess(stats["compressed_bytes"], stats["raw_bytes"])
+        self.assertGreaterEqual(stats["search"]["searches"], 5)
+
+    def test_compress_logs_appends_to_month_and_packs_legacy_archives(self):
+        old = datetime.now() - timedelta(days=45)
+        date = old.strftime("%Y-%m-%d")
+        legacy_dir = self.mm.archive_dir / old.strftime("%Y-%m")
+        legacy_dir.mkdir(parents=True)
+        (legacy_dir / f"{date}.md").write_text("legacy moved log about beta", encoding="utf-8")
+
+        self.mm.compress_logs(days=30)
+        self._write_log(date, [("late gamma entry", "conversation")])
+        self.mm.compress_logs(days=30)
+
+        self.assertEqual(list(legacy_dir.glob("*.md")), [])
+        self.assertEqual([h["content"] for h in self.mm.search_archives("beta")], ["legacy moved log about beta"])
+        self.assertEqual([h["content"] for h in self.mm.search_archives("gamma")], ["late gamma entry"])
+        self.assertEqual(self.mm.get_archive_stats()["days"], 2)
+
 if __name__ == "__main__":
     unittest.main()
 
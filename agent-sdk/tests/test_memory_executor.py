@@ -0,0 +1,61 @@
+import asyncio
+import threading
+import time
+import unittest
+from pathlib import Path
+
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from core.memory_executor import MemoryExecutor
+
+
+class MemoryExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.executor = MemoryExecutor(io_workers=2, cpu_workers=1, max_queue=1)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_blocking_work_does_not_stall_event_loop(self):
+        async def scenario():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.005)
+
+            task = asyncio.create_task(ticker())
+            await self.executor.run_io(time.sleep, 0.2)
+            task.cancel()
+            return ticks
+
+        self.assertGreater(asyncio.run(scenario()), 10)
+
+    def test_cpu_calls_from_io_workers_use_cpu_pool(self):
+        def io_job():
+            return self.executor.cpu_call(lambda: threading.current_thread().name)
+
+        name = asyncio.run(self.executor.run_io(io_job))
+        self.assertTrue(name.startswith("memory-cpu"))
+        stats = self.executor.get_stats()
+        self.assertEqual(stats["io"]["completed"], 1)
+        self.assertEqual(stats["cpu"]["completed"], 1)
+
+    def test_queue_is_bounded_and_wait_time_is_recorded(self):
+        async def scenario():
+            await asyncio.gather(*(self.executor.run_io(time.sleep, 0.05) for _ in range(6)))
+
+        asyncio.run(scenario())
+        stats = self.executor.get_stats()["io"]
+        self.assertEqual(stats["completed"], 6)
+        self.assertLessEqual(stats["max_queued"], stats["capacity"])
+        self.assertGreater(stats["max_wait_ms"], 0)
+        self.assertEqual(stats["queued"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
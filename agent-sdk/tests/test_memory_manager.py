@@ -1,18 +1,47 @@
 import asyncio
+import hashlib
 import json
 import os
+import sqlite3
 import tempfile
+import threading
+import time
 import unittest
+from datetime import datetime
 from pathlib import Path
 
 import sys
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
+import numpy as np
+
 import core.memory as memory_module
 from core.memory import MemoryManager
 
 
+class FakeEmbeddingModel:
+    """Deterministic bag-of-words embedding so vector paths run without torch."""
+
+    dim = 32
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def _encode_one(self, text):
+        vector = np.zeros(self.dim, dtype="float32")
+        for token in (text or "").lower().split():
+            slot = int(hashlib.md5(token.encode("utf-8")).hexdigest(), 16) % self.dim
+            vector[slot] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts, **kwargs):
+        if isinstance(texts, str):
+            return self._encode_one(texts)
+        return np.vstack([self._encode_one(text) for text in texts])
+
+
 class MemoryManagerTest(unittest.TestCase):
     def setUp(self):
         self._tmp = tempfile.TemporaryDirectory()
@@ -25,6 +54,54 @@ class MemoryManagerTest(unittest.TestCase):
     def tearDown(self):
         self._tmp.cleanup()
 
+    def test_flush_markdown_async_waits_off_the_event_loop(self):
+        threads = []
+
+        class Writer:
+            def flush(self, timeout):
+                threads.append(threading.current_thread())
+                return True
+
+        self.manager.markdown_writer = Writer()
+        self.assertTrue(asyncio.run(self.manager.flush_markdown_async()))
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.main_thread())
+        self.manager.markdown_writer = None
+
+    def test_markdown_search_and_compress_run_on_the_io_pool(self):
+        markdown = memory_module.MarkdownMemory(Path(self._tmp.name) / "workspace")
+        markdown.save_memory("喜欢喝美式咖啡", memory_type="preference")
+        self.manager.markdown_memory = markdown
+        threads = []
+        search_memories = markdown.search_memories
+
+        def spy(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return search_memories(*args, **kwargs)
+
+        markdown.search_memories = spy
+        found = asyncio.run(self.manager.search_markdown("咖啡", include_archives=False))
+        self.assertEqual([m["content"] for m in found["results"]], ["喜欢喝美式咖啡"])
+        self.assertIsNone(found["archive"])
+        self.assertIsNot(threads[0], threading.main_thread())
+
+        parse_memories = markdown.parse_memories
+
+        def parse_spy():
+            threads.append(threading.current_thread())
+            return parse_memories()
+
+        markdown.parse_memories = parse_spy
+        read = asyncio.run(self.manager.read_markdown())
+        self.assertIn("喜欢喝美式咖啡", read["content"])
+        self.assertEqual(read["file_path"], str(markdown.memory_file))
+        self.assertIsNot(threads[-1], threading.main_thread())
+
+        compressed = asyncio.run(self.manager.compress_markdown_logs(days=30))
+        self.assertEqual(compressed["archived"], [])
+        self.assertEqual(compressed["stats"]["months"], 0)
+        self.manager.markdown_memory = None
+
     def test_save_memory_deduplicates_exact_content(self):
         memory_id_1 = asyncio.run(
             self.manager.save_memory(
@@ -108,6 +185,82 @@ class MemoryManagerTest(unittest.TestCase):
 
         self.assertEqual(memory_id_1, memory_id_2)
 
+    def test_duplicate_lookup_reaches_beyond_recent_window(self):
+        original_id = asyncio.run(
+            self.manager.save_memory(
+                user_id="u3",
+                content="The staging database lives in the Frankfurt region.",
+                memory_type="project",
+            )
+        )
+        items = [
+            {"content": f"Filler note {i}: ticket {i * 7919} reviewed", "memory_type": "project"}
+            for i in range(250)
+        ]
+        asyncio.run(self.manager.save_memories_bulk("u3", items))
+
+        duplicate_id = asyncio.run(
+            self.manager.save_memory(
+                user_id="u3",
+                content="The staging database lives in the Frankfurt region",
+                memory_type="project",
+            )
+        )
+        self.assertEqual(duplicate_id, original_id)
+
+    def test_fingerprints_follow_deletes_and_backfill_existing_rows(self):
+        memory_id = asyncio.run(
+            self.manager.save_memory(user_id="u3", content="Weekly sync moved to Thursday", memory_type="project")
+        )
+        self._wipe_fingerprints()
+
+        progress = self.manager._backfill_fingerprints(chunk_size=1)
+        self.assertEqual(progress["state"], "done")
+        self.assertEqual(progress["added"], 1)
+
+        duplicate_id = asyncio.run(
+            self.manager.save_memory(user_id="u3", content="Weekly sync moved to Thursday.", memory_type="project")
+        )
+        self.assertEqual(duplicate_id, memory_id)
+
+        asyncio.run(self.manager.delete_memory(memory_id))
+        conn = self.manager._get_connection()
+        remaining = conn.execute("SELECT COUNT(*) FROM memory_lsh_buckets").fetchone()[0]
+        conn.close()
+        self.assertEqual(remaining, 0)
+
+    def test_save_does_not_backfill_fingerprints_synchronously(self):
+        asyncio.run(
+            self.manager.save_memory(user_id="u3", content="Release freeze starts on Monday", memory_type="project")
+        )
+        self._wipe_fingerprints()
+
+        asyncio.run(
+            self.manager.save_memory(user_id="u3", content="Invoices are exported every Friday", memory_type="project")
+        )
+        conn = self.manager._get_connection()
+        fingerprinted = conn.execute("SELECT COUNT(*) FROM memory_fingerprints WHERE user_id = 'u3'").fetchone()[0]
+        conn.close()
+        self.assertEqual(fingerprinted, 1)
+
+        self.manager._backfill_fingerprints()
+        conn = self.manager._get_connection()
+        fingerprinted = conn.execute("SELECT COUNT(*) FROM memory_fingerprints WHERE user_id = 'u3'").fetchone()[0]
+        conn.close()
+        self.assertEqual(fingerprinted, 2)
+
+    def _wipe_fingerprints(self):
+        """模拟升级前的旧库：清空指纹并把补齐任务标记为待执行"""
+        if self.manager._fingerprint_backfill_thread is not None:
+            self.manager._fingerprint_backfill_thread.join()
+        conn = self.manager._get_connection()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM memory_fingerprints")
+        cursor.execute("DELETE FROM memory_lsh_buckets")
+        self.manager._set_meta(cursor, self.manager._FINGERPRINT_BACKFILL_KEY, None)
+        conn.commit()
+        conn.close()
+
     def test_save_memory_adds_freshness_metadata(self):
         memory_id = asyncio.run(
             self.manager.save_memory(
@@ -193,6 +346,78 @@ class MemoryManagerTest(unittest.TestCase):
         result = asyncio.run(self.manager.compact_memories(user_id="u6", stale_days=30))
         self.assertGreaterEqual(result["pruned_stale"], 1)
 
+    def _seed_compaction_corpus(self, user_id):
+        conn = self.manager._get_connection()
+        for i in range(12):
+            for copy in range(3):
+                conn.execute(
+                    """
+                    INSERT INTO semantic_memories (id, user_id, content, memory_type, created_at)
+                    VALUES (?, ?, ?, 'project', ?)
+                    """,
+                    (
+                        f"m{i}-{copy}",
+                        user_id,
+                        f"Milestone {i} owner is team {chr(65 + i)} and review is pending",
+                        f"2026-01-{i + 1:02d}T00:00:0{copy}",
+                    ),
+                )
+        conn.commit()
+        conn.close()
+        # 直接插入的行没有指纹，和升级后的旧库一样需要先跑完补齐
+        self._wipe_fingerprints()
+        self.manager._backfill_fingerprints()
+
+    def test_compact_memories_streams_chunks_and_keeps_newest_copy(self):
+        self._seed_compaction_corpus("u9")
+        updates = []
+
+        preview = asyncio.run(
+            self.manager.compact_memories(user_id="u9", dry_run=True, chunk_size=5, progress_callback=updates.append)
+        )
+        self.assertEqual(preview, {
+            "total_before": 36, "deduplicated": 24, "pruned_stale": 0, "total_after": 36, "dry_run": True,
+        })
+        self.assertEqual(updates[-1]["status"], "completed")
+        self.assertEqual(updates[-1]["processed"], 36)
+
+        result = asyncio.run(
+            self.manager.compact_memories(user_id="u9", chunk_size=5, delete_batch_size=4)
+        )
+        self.assertEqual(result["deduplicated"], 24)
+        self.assertEqual(result["total_after"], 12)
+        kept = {row["id"] for row in asyncio.run(self.manager.list_memories("u9", limit=100))}
+        self.assertEqual(kept, {f"m{i}-2" for i in range(12)})
+        self.assertEqual(self.manager.get_compaction_progress("u9")["status"], "completed")
+
+    def test_compact_memories_resumes_from_checkpoint(self):
+        self._seed_compaction_corpus("u10")
+
+        def interrupt(progress):
+            if progress["processed"] >= 10 and progress["status"] == "running":
+                raise RuntimeError("interrupted")
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(self.manager.compact_memories(user_id="u10", chunk_size=10, progress_callback=interrupt))
+
+        conn = self.manager._get_connection()
+        checkpoint = conn.execute(
+            "SELECT meta_value FROM memory_meta WHERE meta_key = 'compact_checkpoint:u10'"
+        ).fetchone()
+        conn.close()
+        self.assertIsNotNone(checkpoint)
+
+        # 维护报告里的预览不应覆盖被中断的真实进度
+        asyncio.run(self.manager.compact_memories(user_id="u10", dry_run=True, chunk_size=10))
+        progress = self.manager.get_compaction_progress("u10")
+        self.assertEqual(progress["status"], "running")
+        self.assertFalse(progress["dry_run"])
+
+        result = asyncio.run(self.manager.compact_memories(user_id="u10", chunk_size=10))
+        self.assertEqual(result["total_before"], 36)
+        self.assertEqual(result["deduplicated"], 24)
+        self.assertEqual(result["total_after"], 12)
+
     def test_resolve_conflict_marks_linked_memories(self):
         first_id = asyncio.run(
             self.manager.save_memory(
@@ -238,6 +463,176 @@ class MemoryManagerTest(unittest.TestCase):
         self.assertGreaterEqual(report["pending_conflicts"], 2)
         self.assertIn("dedupe_candidates", report)
 
+    def test_list_conflicts_is_not_limited_by_recent_rows(self):
+        for content in ("Dana email is dana@old.com", "Dana email is dana@new.com"):
+            asyncio.run(self.manager.save_memory(user_id="u11", content=content, memory_type="user_info"))
+        for i in range(10):
+            asyncio.run(self.manager.save_memory(user_id="u11", content=f"unrelated note {i} about gardening {i * 7}"))
+
+        conflicts = asyncio.run(self.manager.list_conflicts("u11", limit=5))
+
+        self.assertEqual(len(conflicts), 2)
+        self.assertEqual({c["conflict_status"] for c in conflicts}, {"pending_review"})
+        self.assertTrue(all(c["conflict_key"] for c in conflicts))
+
+    def test_maintenance_report_counts_stale_rows_from_indexed_columns(self):
+        rows = [
+            ("s1", "conversation", "2020-01-01T00:00:00", json.dumps({"freshness": {"expires_at": "2020-02-01T00:00:00"}})),
+            ("s2", "project", datetime.now().isoformat(), json.dumps({"freshness": {"expires_at": "2000-01-01T00:00:00"}})),
+            ("s3", "project", "2020-01-01 00:00:00", None),
+            ("s4", "project", datetime.now().isoformat(), "not json"),
+            ("s5", "task", datetime.now().isoformat(), json.dumps({"freshness": {"expires_at": "2999-01-01T00:00:00"}})),
+        ]
+        conn = self.manager._get_connection()
+        conn.executemany(
+            "INSERT INTO semantic_memories (id, user_id, content, memory_type, created_at, metadata) "
+            "VALUES (?, 'u12', ?, ?, ?, ?)",
+            [(memory_id, f"note {memory_id}", memory_type, created_at, metadata)
+             for memory_id, memory_type, created_at, metadata in rows],
+        )
+        conn.commit()
+        conn.close()
+
+        report = asyncio.run(self.manager.get_maintenance_report(user_id="u12"))
+
+        expected = sum(
+            MemoryManager._memory_staleness(memory_type, created_at, MemoryManager._parse_metadata(metadata))[0]
+            for _, memory_type, created_at, metadata in rows
+        )
+        self.assertEqual(expected, 3)
+        self.assertEqual(report["stale_memories"], expected)
+        self.assertEqual(report["total_memories"], 5)
+
+    def test_metadata_columns_are_added_to_existing_databases(self):
+        legacy_dir = Path(self._tmp.name) / "legacy"
+        legacy_dir.mkdir()
+        conn = sqlite3.connect(legacy_dir / "memories.db")
+        conn.execute(
+            "CREATE TABLE semantic_memories (id TEXT PRIMARY KEY, user_id TEXT NOT NULL, content TEXT NOT NULL, "
+            "embedding_index INTEGER, memory_type TEXT DEFAULT 'conversation', source TEXT, "
+            "importance INTEGER DEFAULT 5, access_count INTEGER DEFAULT 0, last_accessed_at TIMESTAMP, "
+            "metadata TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        )
+        conn.execute(
+            "INSERT INTO semantic_memories (id, user_id, content, metadata) VALUES ('old', 'u13', 'legacy', ?)",
+            (json.dumps({"conflict_status": "pending_review", "conflict_key": "fact::x"}),),
+        )
+        conn.commit()
+        conn.close()
+
+        manager = MemoryManager(legacy_dir)
+        conflicts = asyncio.run(manager.list_conflicts("u13"))
+
+        self.assertEqual([(c["id"], c["conflict_key"]) for c in conflicts], [("old", "fact::x")])
+
+    def test_conflict_detection_reaches_facts_far_back_in_history(self):
+        old_id = asyncio.run(
+            self.manager.save_memory(user_id="u14", content="Frank email is frank@old.com", memory_type="user_info")
+        )
+        asyncio.run(self.manager.save_memories_bulk(
+            "u14",
+            [{"content": f"Frank trip log {hashlib.sha1(str(i).encode()).hexdigest()}", "memory_type": "user_info"}
+             for i in range(250)],
+        ))
+
+        new_id = asyncio.run(
+            self.manager.save_memory(user_id="u14", content="Frank email is frank@new.com", memory_type="user_info")
+        )
+
+        conflicts = {c["id"] for c in asyncio.run(self.manager.list_conflicts("u14"))}
+        self.assertEqual(conflicts, {old_id, new_id})
+
+    def test_fact_index_backfills_legacy_rows_and_follows_deletes(self):
+        conn = self.manager._get_connection()
+        conn.execute(
+            "INSERT INTO semantic_memories (id, user_id, content, memory_type) "
+            "VALUES ('legacy', 'u15', 'Grace email is grace@old.com', 'user_info')"
+        )
+        conn.commit()
+        conn.close()
+
+        conflict = self.manager._find_conflicting_memory("u15", "Grace email is grace@new.com", "user_info")
+        self.assertEqual(conflict[0], "legacy")
+
+        asyncio.run(self.manager.delete_memory("legacy"))
+        conn = self.manager._get_connection()
+        remaining = conn.execute("SELECT COUNT(*) FROM memory_facts WHERE user_id = 'u15'").fetchone()[0]
+        conn.close()
+        self.assertEqual(remaining, 0)
+        self.assertIsNone(self.manager._find_conflicting_memory("u15", "Grace email is grace@new.com", "user_info"))
+
+    def test_list_memories_by_types_matches_per_type_listing_in_one_query(self):
+        items = []
+        for memory_type in ("user_config", "personal", "important_info", "conversation"):
+            for i in range(4):
+                items.append({"content": f"{memory_type} entry {i} {hashlib.sha1(f'{memory_type}{i}'.encode()).hexdigest()}",
+                              "memory_type": memory_type})
+        asyncio.run(self.manager.save_memories_bulk(user_id="u1", items=items))
+        asyncio.run(self.manager.save_memory(user_id="u2", content="other user config", memory_type="user_config"))
+
+        queries = []
+        original_connection = self.manager._get_connection
+
+        def tracing_connection():
+            conn = original_connection()
+            conn.set_trace_callback(queries.append)
+            return conn
+
+        self.manager._get_connection = tracing_connection
+        types = ["user_config", "personal", "user_preference", "important_info"]
+        grouped = asyncio.run(self.manager.list_memories_by_types("u1", types, per_type_limit=3))
+        self.assertEqual(len([q for q in queries if q.lstrip().upper().startswith("SELECT")]), 1)
+        self.manager._get_connection = original_connection
+
+        self.assertEqual(list(grouped), types)
+        self.assertEqual(grouped["user_preference"], [])
+        for memory_type in types:
+            expected = asyncio.run(self.manager.list_memories("u1", memory_type=memory_type, limit=3))
+            self.assertEqual([m["id"] for m in grouped[memory_type]], [m["id"] for m in expected])
+
+    def test_save_memories_bulk_dedupes_against_batch_and_store(self):
+        stored_id = asyncio.run(
+            self.manager.save_memory(user_id="u10", content="Team offsite is in May", memory_type="project")
+        )
+
+        ids = asyncio.run(
+            self.manager.save_memories_bulk(
+                "u10",
+                [
+                    {"content": "Budget review on Friday", "memory_type": "project"},
+                    {"content": "team offsite is in may", "memory_type": "project"},
+                    {"content": "  budget review on friday  ", "memory_type": "project"},
+                    {"content": "Budget review on Friday", "memory_type": "task"},
+                ],
+            )
+        )
+
+        self.assertEqual(ids[1], stored_id)
+        self.assertEqual(ids[0], ids[2])
+        self.assertNotEqual(ids[0], ids[3])
+        rows = asyncio.run(self.manager.list_memories("u10"))
+        self.assertEqual(len(rows), 3)
+        by_id = {row["id"]: row for row in rows}
+        self.assertEqual(by_id[ids[0]]["metadata"]["duplicate_hits"], 1)
+        self.assertEqual(by_id[stored_id]["metadata"]["duplicate_hits"], 1)
+
+    def test_save_memories_bulk_flags_conflicts_inside_batch(self):
+        ids = asyncio.run(
+            self.manager.save_memories_bulk(
+                "u11",
+                [
+                    {"content": "Dana email is dana@old.com", "memory_type": "user_info"},
+                    {"content": "Dana email is dana@new.com", "memory_type": "user_info"},
+                ],
+            )
+        )
+
+        rows = {row["id"]: row for row in asyncio.run(self.manager.list_memories("u11"))}
+        self.assertEqual(rows[ids[0]]["conflict_status"], "pending_review")
+        self.assertEqual(rows[ids[1]]["conflict_status"], "pending_review")
+        self.assertEqual(rows[ids[1]]["metadata"]["conflict_with"], [ids[0]])
+        self.assertEqual(rows[ids[0]]["metadata"]["conflict_with"], [ids[1]])
+
     def test_run_scheduled_maintenance_skips_if_not_due(self):
         asyncio.run(
             self.manager.save_memory(
@@ -253,5 +648,911 @@ class MemoryManagerTest(unittest.TestCase):
         self.assertFalse(second["ran"])
 
 
+@unittest.skipUnless(memory_module.FAISS_AVAILABLE, "faiss not installed")
+class MemoryVectorIndexTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        memory_module.EMBEDDING_AVAILABLE = False
+        memory_module.HYBRID_SEARCH_AVAILABLE = False
+        memory_module.MARKDOWN_MEMORY_AVAILABLE = False
+        self.manager = self._make_manager()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _make_manager(self):
+        manager = MemoryManager(Path(self._tmp.name))
+        manager.embedding_model = FakeEmbeddingModel()
+        manager.embedding_dim = FakeEmbeddingModel.dim
+        manager._init_vector_store()
+        return manager
+
+    def _save(self, user_id, content, memory_type="project"):
+        return asyncio.run(self.manager.save_memory(user_id=user_id, content=content, memory_type=memory_type))
+
+    def test_vectors_are_isolated_per_user(self):
+        self._save("alice", "alpha launch plan for spring")
+        self._save("bob", "alpha launch plan for spring release")
+        self._save("bob", "quarterly budget review")
+
+        self.assertEqual(self.manager.vector_store.count("alice"), 1)
+        self.assertEqual(self.manager.vector_store.count("bob"), 2)
+
+        results = asyncio.run(
+            self.manager.search_memories("alice", "alpha launch plan", top_k=5, use_hybrid=False)
+        )
+        self.assertTrue(results)
+        self.assertTrue(all(r["content"] == "alpha launch plan for spring" for r in results))
+
+    def test_failed_vector_write_leaves_embedding_index_null(self):
+        ok_id = self._save("alice", "vector write succeeds")
+
+        def broken_add(user_id, ids, vectors):
+            raise OSError("disk full")
+
+        original_add = self.manager.vector_store.add
+        self.manager.vector_store.add = broken_add
+        failed_id = self._save("alice", "vector write fails")
+        self.manager.vector_store.add = original_add
+
+        conn = self.manager._get_connection()
+        rows = {
+            row["id"]: (row["rowid"], row["embedding_index"])
+            for row in conn.execute("SELECT rowid, id, embedding_index FROM semantic_memories").fetchall()
+        }
+        conn.close()
+        self.assertEqual(rows[ok_id][1], rows[ok_id][0])
+        self.assertIsNone(rows[failed_id][1])
+
+    def test_repeated_query_and_resaved_content_skip_model(self):
+        calls = []
+        original_encode = self.manager.embedding_model.encode
+
+        def counting_encode(texts, **kwargs):
+            calls.append(texts)
+            return original_encode(texts, **kwargs)
+
+        self.manager.embedding_model.encode = counting_encode
+        # Exercise the embedding cache itself, not the recall cache in front of it.
+        self.manager.recall_cache.max_entries = 0
+        self._save("alice", "alpha launch plan for spring")
+        self._save("alice", "alpha launch plan for spring")
+        for _ in range(3):
+            asyncio.run(self.manager.search_memories("alice", "alpha launch", top_k=3, use_hybrid=False))
+
+        self.assertEqual(len(calls), 2)
+        cache_stats = self.manager.get_stats()["embedding_cache"]
+        self.assertEqual(cache_stats["misses"], 2)
+        self.assertEqual(cache_stats["memory_hits"], 2)
+
+    def test_repeated_recall_is_served_from_cache_until_user_writes(self):
+        searches = []
+        original_search = self.manager._search_memories_legacy
+
+        def counting_search(*args, **kwargs):
+            searches.append(args)
+            return original_search(*args, **kwargs)
+
+        self.manager._search_memories_legacy = counting_search
+        memory_id = self._save("alice", "alpha launch plan for spring")
+        self._save("bob", "alpha launch plan for autumn")
+
+        first = asyncio.run(self.manager.search_memories("alice", "alpha launch", top_k=3, use_hybrid=False))
+        again = asyncio.run(self.manager.search_memories("alice", "  Alpha   LAUNCH ", top_k=3, use_hybrid=False))
+        self.assertEqual(len(searches), 1)
+        self.assertEqual([r["id"] for r in again], [r["id"] for r in first])
+        # A different filter set is a different entry.
+        asyncio.run(self.manager.search_memories("alice", "alpha launch", top_k=5, use_hybrid=False))
+        self.assertEqual(len(searches), 2)
+
+        # Another user's write leaves alice's entry alone; her own write invalidates it.
+        self._save("bob", "quarterly budget review")
+        asyncio.run(self.manager.search_memories("alice", "alpha launch", top_k=3, use_hybrid=False))
+        self.assertEqual(len(searches), 2)
+        self._save("alice", "alpha launch retro notes")
+        refreshed = asyncio.run(self.manager.search_memories("alice", "alpha launch", top_k=3, use_hybrid=False))
+        self.assertEqual(len(searches), 3)
+        self.assertEqual(len(refreshed), 2)
+
+        asyncio.run(self.manager.delete_memory(memory_id))
+        after_delete = asyncio.run(self.manager.search_memories("alice", "alpha launch", top_k=3, use_hybrid=False))
+        self.assertEqual(len(searches), 4)
+        self.assertNotIn(memory_id, [r["id"] for r in after_delete])
+
+        stats = self.manager.get_stats()["recall_cache"]
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["invalidated"], 2)
+        self.assertAlmostEqual(stats["hit_rate"], 2 / 6, places=3)
+
+    def test_global_bump_invalidates_in_flight_search_for_new_user(self):
+        from core.recall_cache import RecallCache
+
+        cache = RecallCache()
+        key = cache.make_key("alice", "alpha launch", 3)
+        # 检索开始时 alice 还没有计数器；模型就绪触发全局失效后检索才结束
+        generation = cache.generation("alice")
+        cache.bump()
+        cache.put(key, ["keyword-only"], generation)
+        self.assertIsNone(cache.get(key))
+
+        cache.put(key, ["hybrid"], cache.generation("alice"))
+        self.assertEqual(cache.get(key), ["hybrid"])
+        cache.bump()
+        self.assertIsNone(cache.get(key))
+
+    def test_cached_recall_still_counts_access_and_is_a_copy(self):
+        memory_id = self._save("alice", "alpha launch plan for spring")
+        first = asyncio.run(self.manager.search_memories("alice", "alpha launch", top_k=3, use_hybrid=False))
+        first[0]["content"] = "mutated by caller"
+        again = asyncio.run(self.manager.search_memories("alice", "alpha launch", top_k=3, use_hybrid=False))
+
+        self.assertEqual(again[0]["content"], "alpha launch plan for spring")
+        detail = asyncio.run(self.manager.get_memory_detail("alice", memory_id))
+        self.assertEqual(detail["access_count"], 2)
+
+    def test_memory_details_are_fetched_in_one_query(self):
+        first = self._save("alice", "alpha launch plan for spring")
+        second = self._save("alice", "quarterly budget review")
+        other = self._save("bob", "bob private note")
+
+        queries = []
+        original_connection = self.manager._get_connection
+
+        def tracing_connection():
+            conn = original_connection()
+            conn.set_trace_callback(queries.append)
+            return conn
+
+        self.manager._get_connection = tracing_connection
+        details = asyncio.run(
+            self.manager.get_memory_details("alice", [second, "missing", first, other, second])
+        )
+        self.assertEqual([d["id"] for d in details], [second, first])
+        self.assertEqual(len([q for q in queries if q.lstrip().upper().startswith("SELECT")]), 1)
+        self.assertEqual(details[1], asyncio.run(self.manager.get_memory_detail("alice", first)))
+
+    def test_snippets_with_detail_skip_the_get_stage(self):
+        memory_id = self._save("alice", "alpha launch plan for spring")
+        snippets = asyncio.run(
+            self.manager.search_memory_snippets("alice", "alpha launch", top_k=3, use_hybrid=False, with_detail=True)
+        )
+        self.assertEqual(snippets[0]["id"], memory_id)
+        detail = snippets[0]["memory"]
+        expected = asyncio.run(self.manager.get_memory_detail("alice", memory_id))
+        self.assertEqual(set(detail), set(expected))
+        self.assertEqual(detail["content"], expected["content"])
+        self.assertEqual(detail["updated_at"], expected["updated_at"])
+
+        plain = asyncio.run(self.manager.search_memory_snippets("alice", "alpha launch", top_k=3, use_hybrid=False))
+        self.assertNotIn("memory", plain[0])
+
+    def test_delete_memory_removes_vector(self):
+        memory_id = self._save("alice", "alpha launch plan for spring")
+        self._save("alice", "quarterly budget review")
+        self.assertEqual(self.manager.vector_store.count("alice"), 2)
+
+        asyncio.run(self.manager.delete_memory(memory_id))
+
+        self.assertEqual(self.manager.vector_store.count("alice"), 1)
+        reloaded = self._make_manager()
+        self.assertEqual(reloaded.vector_store.count("alice"), 1)
+
+    def test_clear_memories_drops_user_index_only(self):
+        self._save("alice", "alpha launch plan for spring")
+        self._save("bob", "quarterly budget review")
+
+        cleared = asyncio.run(self.manager.clear_memories("alice"))
+
+        self.assertEqual(cleared, 1)
+        self.assertEqual(self.manager.vector_store.count("alice"), 0)
+        self.assertEqual(self.manager.vector_store.count("bob"), 1)
+
+    def test_rebuild_vector_index_restores_missing_vectors(self):
+        self._save("alice", "alpha launch plan for spring")
+        self._save("alice", "quarterly budget review")
+        self.manager.vector_store.drop("alice")
+
+        report = self.manager.rebuild_vector_index(user_id="alice")
+
+        self.assertEqual(report, {"users": 1, "vectors": 2})
+        self.assertEqual(self.manager.vector_store.count("alice"), 2)
+
+    def test_save_memories_bulk_encodes_in_batches_and_flushes_index_once(self):
+        encode_calls = []
+        original_encode = self.manager.embedding_model.encode
+
+        def counting_encode(texts, **kwargs):
+            encode_calls.append(len(texts) if not isinstance(texts, str) else 1)
+            return original_encode(texts, **kwargs)
+
+        writes = []
+        original_append = self.manager.vector_store._append
+
+        def counting_append(user_id, op, ids, matrix=None):
+            writes.append(user_id)
+            return original_append(user_id, op, ids, matrix)
+
+        self.manager.embedding_model.encode = counting_encode
+        self.manager.vector_store._append = counting_append
+
+        words = ["apple", "birch", "cobalt", "dune", "ember", "fjord", "granite", "harbor", "iris", "juniper"]
+        items = [{"content": f"{word} planning notes", "memory_type": "project"} for word in words]
+        ids = asyncio.run(self.manager.save_memories_bulk("alice", items, batch_size=4))
+
+        self.assertEqual(len(set(ids)), 10)
+        self.assertEqual(encode_calls, [4, 4, 2])
+        self.assertEqual(writes, ["alice"])
+        self.assertEqual(self.manager.vector_store.count("alice"), 10)
+
+    def test_legacy_global_index_is_migrated(self):
+        import faiss
+
+        legacy_dir = Path(self._tmp.name) / "legacy"
+        legacy_dir.mkdir()
+        manager = MemoryManager(legacy_dir)
+        model = FakeEmbeddingModel()
+        legacy = faiss.IndexFlatL2(model.dim)
+        conn = manager._get_connection()
+        for position, (user_id, content) in enumerate([("alice", "alpha plan"), ("bob", "beta plan")]):
+            legacy.add(model.encode([content]))
+            conn.execute(
+                "INSERT INTO semantic_memories (id, user_id, content, embedding_index) VALUES (?, ?, ?, ?)",
+                (f"m{position}", user_id, content, position),
+            )
+        conn.execute("DELETE FROM memory_meta")
+        conn.commit()
+        conn.close()
+        faiss.write_index(legacy, str(manager.index_path))
+
+        manager.embedding_model = model
+        manager.embedding_dim = model.dim
+        manager._init_vector_store()
+
+        self.assertFalse(manager.index_path.exists())
+        self.assertEqual(manager.vector_store.count("alice"), 1)
+        self.assertEqual(manager.vector_store.count("bob"), 1)
+        conn = manager._get_connection()
+        row = conn.execute("SELECT rowid, embedding_index FROM semantic_memories WHERE id = 'm1'").fetchone()
+        conn.close()
+        self.assertEqual(row["rowid"], row["embedding_index"])
+
+
+@unittest.skipUnless(memory_module.FAISS_AVAILABLE, "faiss not installed")
+class ReembedJobTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        memory_module.EMBEDDING_AVAILABLE = False
+        memory_module.HYBRID_SEARCH_AVAILABLE = False
+        memory_module.MARKDOWN_MEMORY_AVAILABLE = False
+        self.manager = self._make_manager()
+        for i in range(7):
+            user_id = "alice" if i % 2 else "bob"
+            asyncio.run(self.manager.save_memory(user_id=user_id, content=f"note {i} about topic{i}", memory_type="project"))
+
+    def tearDown(self):
+        self.manager.close()
+        self._tmp.cleanup()
+
+    def _make_manager(self, dim=FakeEmbeddingModel.dim, model_name="fake-32"):
+        manager = MemoryManager(Path(self._tmp.name))
+        manager.embedding_cache_name = model_name
+        manager.embedding_model = FakeEmbeddingModel()
+        manager.embedding_model.dim = dim
+        manager.embedding_dim = dim
+        manager._init_vector_store()
+        return manager
+
+    def _meta(self, key):
+        conn = self.manager._get_connection()
+        row = conn.execute("SELECT meta_value FROM memory_meta WHERE meta_key = ?", (key,)).fetchone()
+        conn.close()
+        return json.loads(row[0]) if row else None
+
+    def test_changed_dimension_is_detected_and_rebuilt_into_a_fresh_index(self):
+        self.manager.close()
+        self.manager = self._make_manager(dim=16, model_name="fake-16")
+        self.assertTrue(self.manager.vector_index_stale)
+        self.assertIsNone(self.manager.vector_store)
+        # 重建期间的新记忆也要进入新索引
+        asyncio.run(self.manager.save_memory(user_id="alice", content="late arrival memo", memory_type="project"))
+
+        progress = self.manager._reembed_memories_sync(workers=0, chunk_size=3)
+
+        self.assertEqual(progress["status"], "completed")
+        self.assertEqual(progress["processed"], 8)
+        self.assertFalse(self.manager.vector_index_stale)
+        self.assertEqual(self.manager.vector_store.dim, 16)
+        self.assertEqual(self.manager.vector_store.count("alice") + self.manager.vector_store.count("bob"), 8)
+        self.assertEqual(self._meta("vector_profile"), {"model": "fake-16", "dim": 16})
+        self.assertIsNone(self._meta("reembed_checkpoint"))
+        self.assertFalse(self.manager.reembed_dir.exists())
+        results = asyncio.run(self.manager.search_memories("alice", "late arrival memo", use_hybrid=False))
+        self.assertEqual(results[0]["content"], "late arrival memo")
+
+    def test_interrupted_job_resumes_from_checkpoint(self):
+        self.manager.embedding_cache_name = "fake-v2"
+
+        def crash_after_first_chunk(progress):
+            raise RuntimeError("worker crashed")
+
+        with self.assertRaises(RuntimeError):
+            self.manager._reembed_memories_sync(workers=0, chunk_size=3, progress_callback=crash_after_first_chunk)
+        checkpoint = self._meta("reembed_checkpoint")
+        self.assertEqual((checkpoint["phase"], checkpoint["processed"]), ("encode", 3))
+        self.assertEqual(self.manager.get_reembed_progress()["processed"], 3)
+        # 旧索引仍在服务
+        self.assertEqual(self._meta("vector_profile")["model"], "fake-32")
+
+        seen = []
+        progress = self.manager._reembed_memories_sync(workers=0, chunk_size=3, progress_callback=seen.append)
+        self.assertEqual(seen[0]["processed"], 6)
+        self.assertEqual(progress["status"], "completed")
+        self.assertEqual(self._meta("vector_profile")["model"], "fake-v2")
+        self.assertEqual(self.manager.vector_store.count("alice") + self.manager.vector_store.count("bob"), 7)
+
+    def test_rows_deleted_while_encoding_stay_out_of_the_new_index(self):
+        self.manager.embedding_cache_name = "fake-v2"
+        conn = self.manager._get_connection()
+        victim = conn.execute("SELECT id FROM semantic_memories WHERE user_id = 'alice' ORDER BY rowid LIMIT 1").fetchone()[0]
+        conn.close()
+        embed_texts = self.manager._embed_texts
+        deleted = []
+
+        def embed_then_delete(texts, **kwargs):
+            if not deleted:
+                self.manager._delete_memory_sync(victim)
+                asyncio.run(self.manager.clear_memories("bob"))
+                deleted.append(victim)
+            return embed_texts(texts, **kwargs)
+
+        self.manager._embed_texts = embed_then_delete
+        progress = self.manager._reembed_memories_sync(workers=0, chunk_size=10)
+
+        self.assertEqual(progress["status"], "completed")
+        self.assertEqual(self.manager.vector_store.count("bob"), 0)
+        self.assertEqual(self.manager.vector_store.count("alice"), 2)
+
+    def test_only_rows_written_to_the_shadow_get_an_embedding_index(self):
+        self.manager.embedding_cache_name = "fake-v2"
+        conn = self.manager._get_connection()
+        changed = conn.execute("SELECT rowid FROM semantic_memories ORDER BY rowid LIMIT 1").fetchone()[0]
+        conn.execute("UPDATE semantic_memories SET embedding_index = NULL WHERE rowid = ?", (changed,))
+        conn.commit()
+        conn.close()
+        embed_texts = self.manager._embed_texts
+
+        def embed_then_rewrite(texts, **kwargs):
+            conn = self.manager._get_connection()
+            conn.execute("UPDATE semantic_memories SET content = 'rewritten' WHERE rowid = ?", (changed,))
+            conn.commit()
+            conn.close()
+            return embed_texts(texts, **kwargs)
+
+        self.manager._embed_texts = embed_then_rewrite
+        progress = self.manager._reembed_memories_sync(workers=0, chunk_size=10)
+
+        self.assertEqual(progress["status"], "completed")
+        conn = self.manager._get_connection()
+        rows = {row["rowid"]: row["embedding_index"] for row in conn.execute(
+            "SELECT rowid, embedding_index FROM semantic_memories"
+        )}
+        leftover = conn.execute("SELECT COUNT(*) FROM memory_reembed_rows").fetchone()[0]
+        conn.close()
+        self.assertIsNone(rows.pop(changed))
+        self.assertEqual(rows, {rowid: rowid for rowid in rows})
+        self.assertEqual(leftover, 0)
+
+    def test_process_pool_matches_in_process_encoding(self):
+        progress = self.manager._reembed_memories_sync(workers=2, chunk_size=4, batch_size=2, encoder_factory=FakeEmbeddingModel)
+        self.assertEqual(progress["status"], "completed")
+
+        conn = self.manager._get_connection()
+        rows = conn.execute("SELECT rowid, user_id, content FROM semantic_memories").fetchall()
+        conn.close()
+        model = FakeEmbeddingModel()
+        for row in rows:
+            stored = self.manager.vector_store.reconstruct_many(row["user_id"], [row["rowid"]])[row["rowid"]]
+            np.testing.assert_allclose(stored, model.encode([row["content"]])[0], rtol=1e-6)
+
+
+class EmbeddingWarmupTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        memory_module.EMBEDDING_AVAILABLE = False
+        memory_module.HYBRID_SEARCH_AVAILABLE = False
+        memory_module.MARKDOWN_MEMORY_AVAILABLE = False
+        self.manager = MemoryManager(Path(self._tmp.name))
+        asyncio.run(self.manager.save_memory(user_id="u1", content="alpha launch plan", memory_type="project"))
+
+        self.release = threading.Event()
+        self.fail_load = False
+        self.warmup_calls = []
+        test = self
+
+        class SlowModel(FakeEmbeddingModel):
+            def __init__(self, name):
+                if test.fail_load:
+                    raise RuntimeError("model download failed")
+                test.release.wait(5)
+
+            def encode(self, texts, **kwargs):
+                test.warmup_calls.append(list(texts))
+                return super().encode(texts, **kwargs)
+
+        self._original_model_cls = getattr(memory_module, "SentenceTransformer", None)
+        memory_module.SentenceTransformer = SlowModel
+        memory_module.EMBEDDING_AVAILABLE = True
+
+    def tearDown(self):
+        self.release.set()
+        if self.manager._warmup_thread is not None:
+            self.manager._warmup_thread.join(timeout=5)
+        self.manager.close()
+        memory_module.EMBEDDING_AVAILABLE = False
+        if self._original_model_cls is None:
+            del memory_module.SentenceTransformer
+        else:
+            memory_module.SentenceTransformer = self._original_model_cls
+        self._tmp.cleanup()
+
+    def test_search_uses_keywords_until_model_is_warm(self):
+        states = []
+        self.assertTrue(self.manager.start_embedding_warmup(on_progress=states.append))
+        self.assertFalse(self.manager.start_embedding_warmup())
+
+        started = time.perf_counter()
+        results = asyncio.run(self.manager.search_memories("u1", "alpha launch", use_hybrid=False))
+        self.assertLess(time.perf_counter() - started, 2)
+        self.assertEqual([r["content"] for r in results], ["alpha launch plan"])
+        self.assertEqual(self.manager.get_embedding_status()["state"], "loading")
+        self.assertIsNone(self.manager.embedding_model)
+
+        self.release.set()
+        self.manager._warmup_thread.join(timeout=5)
+        status = self.manager.get_stats()["embedding"]
+        self.assertTrue(status["ready"])
+        self.assertEqual(status["state"], "ready")
+        self.assertIsNotNone(status["warmup_ms"])
+        self.assertEqual(states, ["loading", "warming", "ready"])
+        self.assertEqual(self.warmup_calls[0], ["warmup"])
+        self.assertIsNotNone(self.manager.vector_store)
+
+    def test_failed_warmup_is_reported_and_search_still_answers(self):
+        self.fail_load = True
+        self.manager.start_embedding_warmup()
+        self.manager._warmup_thread.join(timeout=10)
+
+        status = self.manager.get_embedding_status()
+        self.assertEqual(status["state"], "failed")
+        self.assertIn("download failed", status["error"])
+        self.assertFalse(status["ready"])
+        results = asyncio.run(self.manager.search_memories("u1", "alpha", use_hybrid=False))
+        self.assertEqual(len(results), 1)
+
+    def test_failed_warmup_backs_off_before_retrying(self):
+        self.fail_load = True
+        self.manager.start_embedding_warmup()
+        self.manager._warmup_thread.join(timeout=10)
+        failed_thread = self.manager._warmup_thread
+
+        for _ in range(3):
+            asyncio.run(self.manager.search_memories("u1", "alpha", use_hybrid=False))
+        self.assertFalse(self.manager.start_embedding_warmup())
+        self.assertIs(self.manager._warmup_thread, failed_thread)
+        status = self.manager.get_embedding_status()
+        self.assertEqual((status["state"], status["failures"]), ("failed", 1))
+        self.assertIsNotNone(status["failed_at"])
+        self.assertGreater(status["retry_at"], status["failed_at"])
+
+        # 退避期过后下一次检索重新加载
+        self.fail_load = False
+        self.release.set()
+        self.manager._embedding_retry_at = 0.0
+        asyncio.run(self.manager.search_memories("u1", "alpha", use_hybrid=False))
+        self.assertIsNot(self.manager._warmup_thread, failed_thread)
+        self.manager._warmup_thread.join(timeout=5)
+        status = self.manager.get_embedding_status()
+        self.assertEqual((status["state"], status["failures"], status["retry_at"]), ("ready", 0, None))
+
+
+class VectorJournalTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.index_dir = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _store(self, **kwargs):
+        from core.vector_index import VectorIndexStore
+
+        kwargs.setdefault("snapshot_every", 1000)
+        return VectorIndexStore(self.index_dir, FakeEmbeddingModel.dim, **kwargs)
+
+    def _vectors(self, *texts):
+        return FakeEmbeddingModel().encode(list(texts))
+
+    def test_acknowledged_writes_survive_crash_without_snapshot(self):
+        store = self._store()
+        store.add("alice", [1, 2, 3], self._vectors("alpha", "beta", "gamma"))
+        store.remove("alice", [2])
+        self.assertFalse(store._path_for("alice").exists())
+
+        # No close(): simulate a crash and recover from the journal alone.
+        recovered = self._store()
+        self.assertEqual(recovered.count("alice"), 2)
+        self.assertEqual(recovered.search("alice", self._vectors("gamma"), 1)[0][0], 3)
+        self.assertEqual(recovered.stats["replayed_records"], 2)
+        self.assertTrue(recovered._path_for("alice").exists())
+        self.assertFalse(recovered._journal_path("alice").exists())
+
+    def test_users_do_not_block_each_other_and_fsync_runs_unlocked(self):
+        store = self._store()
+        store.add("alice", [1], self._vectors("alpha"))
+        store.add("bob", [2], self._vectors("beta"))
+
+        # A slow cold load / write for alice must not stall bob's search.
+        alice_lock = store._index_lock("alice")
+        alice_lock.acquire()
+        try:
+            results = []
+            worker = threading.Thread(target=lambda: results.append(store.search("bob", self._vectors("beta"), 1)))
+            worker.start()
+            worker.join(timeout=2)
+            self.assertFalse(worker.is_alive())
+            self.assertEqual(results[0][0][0], 2)
+        finally:
+            alice_lock.release()
+
+        held_during_fsync = []
+        original_fsync = os.fsync
+
+        def try_lock(probe):
+            lock = store._index_lock("alice")
+            probe.append(lock.acquire(timeout=0.5))
+            if probe[0]:
+                lock.release()
+
+        def probing_fsync(fd):
+            probe = []
+            thread = threading.Thread(target=try_lock, args=(probe,))
+            thread.start()
+            thread.join()
+            held_during_fsync.append(not probe[0])
+            return original_fsync(fd)
+
+        os.fsync = probing_fsync
+        try:
+            store.add("alice", [3], self._vectors("gamma"))
+        finally:
+            os.fsync = original_fsync
+        self.assertEqual(held_during_fsync, [False])
+        store.close()
+
+    def test_torn_journal_tail_is_ignored(self):
+        store = self._store()
+        store.add("alice", [1], self._vectors("alpha"))
+        store.add("alice", [2], self._vectors("beta"))
+        journal = store._journal_path("alice")
+        store._close_journal("alice")
+        with open(journal, "r+b") as handle:
+            handle.truncate(journal.stat().st_size - 5)
+
+        recovered = self._store()
+        self.assertEqual(recovered.count("alice"), 1)
+
+    def test_snapshot_after_threshold_truncates_journal(self):
+        store = self._store(snapshot_every=2, snapshot_interval_sec=0.05)
+        store.start()
+        try:
+            store.add("alice", [1], self._vectors("alpha"))
+            store.add("alice", [2], self._vectors("beta"))
+            for _ in range(100):
+                if store.stats["snapshots"]:
+                    break
+                time.sleep(0.02)
+        finally:
+            store.close()
+
+        self.assertGreaterEqual(store.stats["snapshots"], 1)
+        self.assertFalse(store._journal_path("alice").exists())
+        self.assertEqual(self._store().count("alice"), 2)
+
+    def test_close_checkpoints_pending_records(self):
+        store = self._store()
+        store.add("alice", [1, 2], self._vectors("alpha", "beta"))
+        store.close()
+
+        self.assertEqual(store.pending_records(), 0)
+        self.assertFalse(store._journal_path("alice").exists())
+        reloaded = self._store()
+        self.assertEqual(reloaded.count("alice"), 2)
+        self.assertEqual(reloaded.stats["replayed_records"], 0)
+
+
+@unittest.skipUnless(memory_module.FAISS_AVAILABLE, "faiss not installed")
+class VectorTieringTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.index_dir = Path(self._tmp.name)
+        self.rng = np.random.default_rng(11)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _store(self, **kwargs):
+        from core.vector_index import IndexTierPolicy, VectorIndexStore
+
+        kwargs.setdefault("auto_retier", False)
+        kwargs.setdefault("tiering", IndexTierPolicy(flat_max=50, ivf_max=200, nprobe=64))
+        return VectorIndexStore(self.index_dir, FakeEmbeddingModel.dim, snapshot_every=1000, **kwargs)
+
+    def _random(self, count):
+        return self.rng.standard_normal((count, FakeEmbeddingModel.dim)).astype("float32")
+
+    def test_policy_upgrades_immediately_and_downgrades_with_hysteresis(self):
+        from core.vector_index import IndexTierPolicy
+
+        policy = IndexTierPolicy(flat_max=100, ivf_max=1000, hysteresis=0.5)
+
+        self.assertEqual(policy.tier_for(100), "flat")
+        self.assertEqual(policy.tier_for(101, "flat"), "ivf")
+        self.assertEqual(policy.tier_for(1001, "ivf"), "ivf_fp16")
+        self.assertEqual(policy.tier_for(80, "ivf"), "ivf")
+        self.assertEqual(policy.tier_for(49, "ivf"), "flat")
+        self.assertLess(policy.bytes_per_vector("ivf_fp16", 384), policy.bytes_per_vector("flat", 384))
+
+    def test_retier_keeps_ids_search_delete_and_persistence(self):
+        store = self._store()
+        vectors = self._random(120)
+        store.add("alice", list(range(1, 121)), vectors)
+
+        self.assertEqual(store.retier("alice"), "ivf")
+
+        self.assertEqual(store.search("alice", vectors[9], 1)[0][0], 10)
+        np.testing.assert_allclose(store.reconstruct_many("alice", [10])[10], vectors[9], rtol=1e-5)
+        self.assertEqual(store.remove("alice", [10]), 1)
+        store.add("alice", [500], self._random(1))
+        store.close()
+
+        reloaded = self._store()
+        self.assertEqual(reloaded.count("alice"), 120)
+        self.assertEqual(reloaded.get_stats()["tiers"]["ivf"]["vectors"], 120)
+        self.assertNotEqual(reloaded.search("alice", vectors[9], 1)[0][0], 10)
+
+    def test_writes_during_rebuild_are_replayed_before_swap(self):
+        store = self._store()
+        store.add("alice", list(range(1, 301)), self._random(300))
+        late = self._random(1)
+        original_build = store.tiering.build
+
+        def build_with_concurrent_writes(*args, **kwargs):
+            store.add("alice", [999], late)
+            store.remove("alice", [1, 2])
+            return original_build(*args, **kwargs)
+
+        store.tiering.build = build_with_concurrent_writes
+        self.assertEqual(store.retier("alice"), "ivf_fp16")
+
+        self.assertEqual(store.count("alice"), 299)
+        self.assertEqual(store.search("alice", late[0], 1)[0][0], 999)
+        self.assertEqual(store.reconstruct_many("alice", [1, 2]), {})
+        store.close()
+
+    def test_growth_triggers_background_rebuild(self):
+        store = self._store(auto_retier=True)
+        for start in range(0, 80, 20):
+            store.add("alice", list(range(start, start + 20)), self._random(20))
+        for _ in range(100):
+            if store.get_stats()["tiers"].get("ivf") and not store.get_stats()["rebuilding"]:
+                break
+            time.sleep(0.05)
+
+        stats = store.get_stats()
+        self.assertEqual(stats["tiers"]["ivf"]["vectors"], 80)
+        self.assertGreaterEqual(stats["retiers"], 1)
+        store.close()
+
+
+@unittest.skipUnless(memory_module.FAISS_AVAILABLE, "faiss not installed")
+class HybridCandidateSearchTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        memory_module.EMBEDDING_AVAILABLE = False
+        memory_module.MARKDOWN_MEMORY_AVAILABLE = False
+        memory_module.HYBRID_SEARCH_AVAILABLE = True
+        os.environ["MEMORY_CANDIDATE_POOL"] = "8"
+        self.manager = MemoryManager(Path(self._tmp.name))
+        if self.manager.hybrid_search is None:
+            self.skipTest("hybrid search service not available")
+        self.manager.embedding_model = FakeEmbeddingModel()
+        self.manager.embedding_dim = FakeEmbeddingModel.dim
+        self.manager._init_vector_store()
+
+    def tearDown(self):
+        memory_module.HYBRID_SEARCH_AVAILABLE = False
+        del os.environ["MEMORY_CANDIDATE_POOL"]
+        self._tmp.cleanup()
+
+    def _save(self, user_id, content, memory_type="project"):
+        return asyncio.run(self.manager.save_memory(user_id=user_id, content=content, memory_type=memory_type))
+
+    def test_hybrid_search_scores_bounded_candidate_set(self):
+        for i in range(40):
+            self._save("alice", f"filler note number {i} about topic{i}")
+        target_id = self._save("alice", "zebra migration schedule for the wildlife report")
+        self._save("bob", "zebra migration schedule for the wildlife report copy")
+
+        scored_sizes = []
+        original_search = self.manager.hybrid_search.search
+
+        def recording_search(*args, **kwargs):
+            scored_sizes.append(len(kwargs["documents"]))
+            return original_search(*args, **kwargs)
+
+        self.manager.hybrid_search.search = recording_search
+        results = asyncio.run(self.manager.search_memories("alice", "zebra migration", top_k=3))
+
+        self.assertEqual(results[0]["id"], target_id)
+        self.assertTrue(all(r["content"] != "zebra migration schedule for the wildlife report copy" for r in results))
+        pool = MemoryManager._candidate_pool_size(3)
+        self.assertLessEqual(scored_sizes[0], 2 * pool + 3)
+        self.assertLess(scored_sizes[0], 41)
+
+    def test_keyword_index_tracks_saves_and_deletes(self):
+        keep_id = self._save("alice", "walrus feeding notes")
+        drop_id = self._save("alice", "walrus tank cleaning")
+
+        asyncio.run(self.manager.delete_memory(drop_id))
+
+        conn = self.manager._get_connection()
+        doc_ids = [row["doc_id"] for row in conn.execute("SELECT doc_id FROM bm25_docs WHERE user_id = 'alice'")]
+        conn.close()
+        self.assertEqual(doc_ids, [keep_id])
+
+    def test_keyword_index_backfills_existing_rows(self):
+        conn = self.manager._get_connection()
+        conn.execute(
+            "INSERT INTO semantic_memories (id, user_id, content) VALUES ('old1', 'carol', 'legacy walrus note')"
+        )
+        conn.commit()
+        conn.close()
+
+        results = asyncio.run(self.manager.search_memories("carol", "walrus", top_k=3))
+
+        self.assertEqual([r["id"] for r in results], ["old1"])
+        self.assertGreater(results[0]["text_score"], 0)
+
+    def test_fts_lookup_is_scoped_inside_the_match(self):
+        for i in range(20):
+            self._save("bob", f"kiwi harvest log {i}")
+        alice_id = self._save("alice", "kiwi harvest log for alice")
+
+        conn = self.manager._get_connection()
+        tables = set()
+
+        def record(action, table, *args):
+            if action == sqlite3.SQLITE_READ:
+                tables.add(table)
+            return sqlite3.SQLITE_OK
+
+        conn.set_authorizer(record)
+        hits = memory_module.search_fts(conn.cursor(), '"kiwi"', "alice", None, 5)
+        conn.set_authorizer(None)
+        row = conn.execute("SELECT id FROM semantic_memories WHERE rowid = ?", (hits[0][0],)).fetchone()
+        conn.close()
+
+        self.assertEqual((len(hits), row["id"]), (1, alice_id))
+        self.assertNotIn("semantic_memories", tables)
+
+    def test_fts_candidates_are_scoped_to_user_and_type(self):
+        self._save("alice", "kiwi orchard budget", memory_type="project")
+        self._save("alice", "kiwi smoothie recipe", memory_type="manual")
+        self._save("bob", "kiwi orchard budget", memory_type="project")
+
+        conn = self.manager._get_connection()
+        rowids = [rowid for rowid, _ in MemoryManager._fts_candidates(conn.cursor(), "alice", "kiwi", "project", 10)]
+        rows = conn.execute(
+            f"SELECT user_id, memory_type FROM semantic_memories WHERE rowid IN ({','.join('?' * len(rowids))})",
+            rowids,
+        ).fetchall()
+        conn.close()
+
+        self.assertEqual([(r["user_id"], r["memory_type"]) for r in rows], [("alice", "project")])
+
+    def _fts_ids(self, user_id, query):
+        conn = self.manager._get_connection()
+        hits = MemoryManager._fts_candidates(conn.cursor(), user_id, query, None, 10)
+        ids = [
+            conn.execute("SELECT id FROM semantic_memories WHERE rowid = ?", (rowid,)).fetchone()["id"]
+            for rowid, _ in hits
+        ]
+        conn.close()
+        return ids
+
+    def test_fts_triggers_follow_raw_writes_and_bulk_deletes(self):
+        conn = self.manager._get_connection()
+        conn.execute("INSERT INTO semantic_memories (id, user_id, content) VALUES ('m1', 'dave', 'pelican survey')")
+        conn.execute("INSERT INTO semantic_memories (id, user_id, content) VALUES ('m2', 'dave', 'pelican feeding')")
+        conn.execute("UPDATE semantic_memories SET content = 'heron feeding' WHERE id = 'm2'")
+        conn.commit()
+        conn.close()
+
+        self.assertEqual(self._fts_ids("dave", "pelican"), ["m1"])
+        self.assertEqual(self._fts_ids("dave", "heron"), ["m2"])
+
+        asyncio.run(self.manager.clear_memories("dave"))
+        self.assertEqual(self._fts_ids("dave", "pelican heron"), [])
+
+    def test_fts_matches_cjk_substrings_and_ranks_keyword_hits(self):
+        if memory_module.fts_tokenizer() != "trigram":
+            self.skipTest("SQLite build without the trigram tokenizer")
+        tea_id = self._save("alice", "我每天早上都喜欢喝咖啡")
+        self._save("alice", "周末去公园散步")
+
+        self.assertEqual(self._fts_ids("alice", "喜欢喝咖啡吗"), [tea_id])
+        results = asyncio.run(self.manager.search_memories("alice", "喝咖啡", top_k=2))
+        text_scores = {r["id"]: r["text_score"] for r in results}
+        self.assertGreater(text_scores[tea_id], 0)
+
+    def test_short_terms_are_found_without_trigram_matches(self):
+        coffee_id = self._save("alice", "我每天早上喜欢喝咖啡")
+        go_id = self._save("alice", "Backend services are written in Go")
+        self._save("alice", "周末去公园散步")
+        self._save("bob", "早上也喝咖啡")
+
+        self.assertEqual(self._fts_ids("alice", "咖啡"), [coffee_id])
+        self.assertEqual(self._fts_ids("alice", "早上"), [coffee_id])
+        self.assertEqual(self._fts_ids("alice", "go"), [go_id])
+        results = asyncio.run(self.manager.search_memories("alice", "咖啡", top_k=2))
+        self.assertEqual([r["id"] for r in results][:1], [coffee_id])
+
+    def test_short_terms_are_indexed_for_old_rows_and_fold_unicode_case(self):
+        conn = self.manager._get_connection()
+        conn.execute("INSERT INTO semantic_memories (id, user_id, content) VALUES ('old', 'alice', 'Öl 咖啡 notes')")
+        conn.executemany(
+            "INSERT INTO semantic_memories (id, user_id, content) VALUES (?, 'alice', 'filler row')",
+            [(f"f{i}",) for i in range(6000)],
+        )
+        conn.commit()
+        conn.close()
+
+        self.assertEqual(self._fts_ids("alice", "咖啡"), ["old"])
+        self.assertEqual(self._fts_ids("alice", "öl"), ["old"])
+
+    def test_legacy_fts_table_is_rebuilt_on_startup(self):
+        conn = self.manager._get_connection()
+        cursor = conn.cursor()
+        for suffix in ("ai", "ad", "au"):
+            cursor.execute(f"DROP TRIGGER semantic_memories_fts_{suffix}")
+        cursor.execute("DROP TABLE semantic_memories_fts")
+        cursor.execute(
+            "CREATE VIRTUAL TABLE semantic_memories_fts USING fts5("
+            "id UNINDEXED, content, content='semantic_memories', content_rowid='rowid')"
+        )
+        cursor.execute("DELETE FROM memory_meta WHERE meta_key = 'fts_scheme'")
+        cursor.execute("INSERT INTO semantic_memories (id, user_id, content) VALUES ('old1', 'erin', 'legacy osprey nest')")
+        conn.commit()
+        conn.close()
+        self.assertEqual(self._fts_ids("erin", "osprey"), [])
+
+        self.manager._init_database()
+
+        self.assertEqual(self._fts_ids("erin", "osprey"), ["old1"])
+
+    def test_rebuild_fts_index_repairs_out_of_sync_index(self):
+        keep_id = self._save("alice", "lighthouse maintenance log")
+        conn = self.manager._get_connection()
+        conn.execute("INSERT INTO semantic_memories_fts(semantic_memories_fts) VALUES ('delete-all')")
+        conn.commit()
+        conn.close()
+        self.assertEqual(self._fts_ids("alice", "lighthouse"), [])
+
+        report = self.manager.rebuild_fts_index()
+
+        self.assertEqual(report["documents"], 1)
+        self.assertEqual(self._fts_ids("alice", "lighthouse"), [keep_id])
+
+
 if __name__ == "__main__":
     unittest.main()
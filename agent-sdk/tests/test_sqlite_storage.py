@@ -0,0 +1,64 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from core import sqlite_storage
+
+
+class SqliteStorageTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db_path = Path(self._tmp.name) / "store.db"
+        conn = sqlite_storage.connect(self.db_path)
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        sqlite_storage.close_pool(self.db_path)
+        self._tmp.cleanup()
+
+    def test_connections_are_reused_with_wal_pragmas(self):
+        pool = sqlite_storage.get_pool(self.db_path)
+        conn = sqlite_storage.connect(self.db_path)
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)
+        conn.close()
+
+        again = sqlite_storage.connect(self.db_path)
+        self.assertIs(again, conn)
+        again.close()
+        self.assertEqual(pool.get_stats()["opened"], 1)
+
+    def test_close_rolls_back_uncommitted_work_and_resets_row_factory(self):
+        conn = sqlite_storage.connect(self.db_path)
+        conn.execute("INSERT INTO items (name) VALUES ('draft')")
+        conn.close()
+        conn.close()
+
+        raw = sqlite_storage.connect(self.db_path, row_factory=None)
+        self.assertEqual(raw.execute("SELECT COUNT(*) FROM items").fetchone(), (0,))
+        raw.close()
+
+    def test_reader_is_not_blocked_by_open_write_transaction(self):
+        writer = sqlite_storage.connect(self.db_path)
+        reader = sqlite_storage.connect(self.db_path)
+        try:
+            writer.execute("INSERT INTO items (name) VALUES ('pending')")
+            self.assertTrue(writer.in_transaction)
+            count = reader.execute("SELECT COUNT(*) AS count FROM items").fetchone()["count"]
+            self.assertEqual(count, 0)
+            writer.commit()
+            count = reader.execute("SELECT COUNT(*) AS count FROM items").fetchone()["count"]
+            self.assertEqual(count, 1)
+        finally:
+            writer.close()
+            reader.close()
+
+
+if __name__ == "__main__":
+    unittest.main()